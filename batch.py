@@ -0,0 +1,100 @@
+# batch.py - /summarize_batch helpers: parse JSON/NDJSON batches, fan out with bounded concurrency
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Tuple
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # Analyses in flight per batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+
+def parse_item(raw, index: int) -> dict:
+    """Normalize one batch entry: a transcript string or {"id", "transcript", "use_docs"}"""
+    if isinstance(raw, str):
+        raw = {"transcript": raw}
+    if not isinstance(raw, dict):
+        return {"id": str(index), "index": index, "error": "Item must be a string or an object"}
+    item = {
+        "id": str(raw.get("id", index)),
+        "index": index,
+        "transcript": str(raw.get("transcript") or "").strip(),
+        "use_docs": raw.get("use_docs"),
+    }
+    if not item["transcript"]:
+        item["error"] = "No transcript provided"
+    return item
+
+
+def parse_batch(body: bytes, content_type: str = "") -> List[dict]:
+    """
+    Accepts JSON ({"items": [...], "use_docs": ...} or a bare list) or NDJSON (one item per line)
+    Unparseable NDJSON lines become error items rather than failing the whole batch.
+    """
+    text = body.decode("utf-8")
+    defaults = {}
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        raw_items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raw_items.append(None)
+                print(f"Bad NDJSON line in batch: {e}")
+    else:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            defaults = {"use_docs": data.get("use_docs", True)}
+            data = data.get("items")
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON list or {"items": [...]}')
+        raw_items = data
+
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch too large: {len(raw_items)} items (max {BATCH_MAX_ITEMS})")
+
+    items = []
+    for index, raw in enumerate(raw_items):
+        item = parse_item(raw, index) if raw is not None else {"id": str(index), "index": index,
+                                                               "error": "Invalid JSON line"}
+        if item.get("use_docs") is None:
+            item["use_docs"] = defaults.get("use_docs", True)
+        items.append(item)
+    return items
+
+
+def run_batch(items: List[dict], analyze: Callable[[str, bool], Tuple[dict, bool]],
+              concurrency: int = BATCH_CONCURRENCY) -> Iterator[dict]:
+    """
+    Yield one record per item in completion order, then a final {"status": "complete", ...} record
+    analyze(transcript, include_docs) -> (result, cache_hit); a failing item is reported, never raised.
+    """
+    ok = failed = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    try:
+        futures = {}
+        for item in items:
+            if "error" in item:
+                failed += 1
+                yield {"id": item["id"], "index": item["index"], "status": "error", "error": item["error"]}
+            else:
+                futures[pool.submit(analyze, item["transcript"], item["use_docs"])] = item
+
+        for future in as_completed(futures):
+            item = futures[future]
+            record = {"id": item["id"], "index": item["index"]}
+            try:
+                result, hit = future.result()
+                record.update(status="ok", cached=hit, result=result)
+                ok += 1
+            except Exception as e:
+                print(f"Batch item {item['id']} failed: {e}")
+                record.update(status="error", error=str(e))
+                failed += 1
+            yield record
+    finally:
+        # Client went away (generator closed) or batch finished: drop anything not yet started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    yield {"status": "complete", "items": len(items), "ok": ok, "failed": failed}
@@ -0,0 +1,97 @@
+# batch_summarize.py - Backfill many transcripts through /summarize_batch
+#
+#   python batch_summarize.py meetings/*.txt -o results.ndjson
+#   python batch_summarize.py archive.ndjson --api https://Tharusha614.pythonanywhere.com --concurrency 4
+#
+# Inputs: .txt files (one transcript each, id = file name) and/or .json / .ndjson batch files.
+import os
+import sys
+import json
+import argparse
+from typing import List
+
+import requests
+
+API_BASE = os.getenv("API_BASE", "http://localhost:5000")
+
+
+def load_items(paths: List[str]) -> List[dict]:
+    items = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        if path.endswith((".ndjson", ".jsonl")):
+            items.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        elif path.endswith(".json"):
+            data = json.loads(text)
+            items.extend(data.get("items", []) if isinstance(data, dict) else data)
+        else:
+            items.append({"id": os.path.basename(path), "transcript": text})
+    return items
+
+
+def post_chunk(api: str, chunk: List[dict], concurrency: int, timeout: float):
+    """POST one chunk as NDJSON and yield result records as the server streams them"""
+    body = "\n".join(json.dumps(item) for item in chunk)
+    with requests.post(f"{api}/summarize_batch", params={"concurrency": concurrency},
+                       data=body.encode("utf-8"), stream=True, timeout=(10, timeout),
+                       headers={"Content-Type": "application/x-ndjson"}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many meeting transcripts via /summarize_batch")
+    parser.add_argument("inputs", nargs="+", help=".txt transcripts or .json/.ndjson batch files")
+    parser.add_argument("--api", default=API_BASE, help=f"API base URL (default {API_BASE})")
+    parser.add_argument("-o", "--output", help="Write NDJSON results here (default stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Analyses in flight on the server")
+    parser.add_argument("--chunk-size", type=int, default=50,
+                        help="Items per request, keeps each request well inside the server's worker timeout")
+    parser.add_argument("--no-docs", action="store_true", help="Skip RAG context for every item")
+    parser.add_argument("--timeout", type=float, default=300, help="Read timeout per streamed line (seconds)")
+    args = parser.parse_args()
+
+    items = [item if isinstance(item, dict) else {"transcript": item} for item in load_items(args.inputs)]
+    for index, item in enumerate(items):
+        item.setdefault("id", str(index))  # The server would number items per chunk
+        if args.no_docs:
+            item["use_docs"] = False
+    print(f"Analyzing {len(items)} transcripts via {args.api}", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    ok = failed = 0
+    try:
+        for start in range(0, len(items), args.chunk_size):
+            chunk = items[start:start + args.chunk_size]
+            seen = 0
+            try:
+                for record in post_chunk(args.api, chunk, args.concurrency, args.timeout):
+                    if record.get("status") == "complete":
+                        continue
+                    record["index"] += start  # Position in the whole input, not the chunk
+                    seen += 1
+                    if record["status"] == "ok":
+                        ok += 1
+                        print(f"✓ {record['id']}", file=sys.stderr)
+                    else:
+                        failed += 1
+                        print(f"✗ {record['id']}: {record['error']}", file=sys.stderr)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+            except requests.RequestException as e:
+                # A failed request only loses its own chunk; keep going with the rest
+                failed += len(chunk) - seen
+                print(f"✗ {len(chunk) - seen} items from {start} to {start + len(chunk) - 1} lost: {e}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Done: {ok} ok, {failed} failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# benchmark.py - Offline latency / throughput / memory benchmark of the API variants
+#
+#   python benchmark.py                                   # every app, default sizes, stub latency 0.1s
+#   python benchmark.py --apps meeting_minder_groq --concurrency 1 8 --requests 40 -o benchmarks/groq.json
+#   python benchmark.py --tokens-per-second 250 --error-rate 0.05   # slower, flakier upstream
+#   python benchmark.py --compare benchmarks/baseline.json benchmarks/groq.json
+#
+# Each app runs as its own server process against stub_server.py (no network, no API keys), with
+# caches and quota limits off, so the numbers measure this code plus the configured upstream latency.
+# meeting_minder.py embeds locally and needs the sentence-transformers model already downloaded.
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import requests
+
+from stub_server import add_arguments
+
+HERE = os.path.dirname(os.path.abspath(__file__))  # The apps and the stub are run from here
+APPS = ["meeting_minder_groq", "meeting_minder_lite", "meeting_minder"]
+APP_RUNNER = ("import sys, importlib; "
+              "importlib.import_module(sys.argv[1]).app.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)")
+STARTUP_TIMEOUT = 180  # Seconds for an app to answer GET / (meeting_minder imports torch)
+SPEAKERS = ["Sarah", "John", "Lisa", "Mike", "Priya", "Tom"]
+WORDS = ("release plan api budget launch customer dashboard testing migration schedule review design "
+         "staging rollout metrics latency database cache onboarding contract vendor feedback roadmap "
+         "security audit mobile support pricing hiring sprint backlog incident deadline documentation "
+         "integration analytics deploy invoice quarter forecast training survey partner").split()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_docs(count: int, tokens: int, seed: int = 0) -> List[dict]:
+    """Synthetic company documents of ~tokens tokens each, in paragraphs"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        paragraphs, size = [], 0
+        while size < tokens:
+            paragraph = " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(3, 6)))
+            paragraphs.append(paragraph)
+            size += len(paragraph) // 4
+        docs.append({"id": f"doc-{i}", "text": "\n\n".join(paragraphs)})
+    return docs
+
+
+def make_transcript(tokens: int, seed: int) -> str:
+    """A synthetic transcript of ~tokens tokens; every seed gives a different one (no cache hits)"""
+    rng = random.Random(seed)
+    lines, size = [f"Meeting {seed}"], 0
+    while size < tokens:
+        line = f"{rng.choice(SPEAKERS)}: " + " ".join(sentence(rng, rng.randint(6, 16)) for _ in range(rng.randint(1, 3)))
+        lines.append(line)
+        size += len(line) // 4
+    return "\n".join(lines)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile (p in 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and its descendants (gunicorn workers), from /proc"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of the server (all its processes); None where /proc is unavailable"""
+    total = None
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return round(total, 1) if total is not None else None
+
+
+class RssSampler:
+    """Peak RSS of a process tree while a scenario runs"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.start = self.peak = rss_mb(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = rss_mb(self.pid)
+            if current is not None and (self.peak is None or current > self.peak):
+                self.peak = current
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self) -> dict:
+        return {"start": self.start, "peak": self.peak, "end": rss_mb(self.pid)}
+
+
+class Stub:
+    """stub_server.py in its own process, so it doesn't compete with the load generator for the GIL"""
+
+    def __init__(self, stub_args: List[str]):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        command = [sys.executable, os.path.join(HERE, "stub_server.py"), "--port", str(self.port), *stub_args]
+        self.process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+        wait_until_up(self.url + "/stats", 30, self.process)
+
+    def stats(self) -> dict:
+        return requests.get(self.url + "/stats", timeout=5).json()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class AppServer:
+    """One variant as a server process with isolated state (fresh index dir, caches and quotas off)"""
+
+    def __init__(self, module: str, stub: Stub, workers: int, log_path: str):
+        self.module = module
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.state_dir = tempfile.mkdtemp(prefix=f"bench-{module}-")
+        env = dict(os.environ,
+                   GROQ_BASE=f"{stub.url}/openai/v1", HF_BASE=f"{stub.url}/models",
+                   GROQ_API_KEY="bench", HF_TOKEN="bench",
+                   GROQ_RPM="0", GROQ_TPM="0", RATE_LIMIT_DB="",
+                   INDEX_DIR=os.path.join(self.state_dir, "index_store"),
+                   EMBED_CACHE_PATH="", RESULT_CACHE_DB="", JOB_DB="",
+                   METRICS_DB=os.path.join(self.state_dir, "metrics.sqlite3"),
+                   PROMPT_TOKENIZER="", EMBED_PRELOAD="0", PYTHONUNBUFFERED="1")
+        if workers > 0:
+            command = ["gunicorn", "-w", str(workers), "-k", "gthread", "--threads", "8",
+                       "-b", f"127.0.0.1:{self.port}", f"{module}:app"]
+        else:
+            command = [sys.executable, "-c", APP_RUNNER, module, str(self.port)]
+        self.log = open(log_path, "w")
+        try:
+            self.process = subprocess.Popen(command, cwd=HERE, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        except OSError:
+            self.log.close()
+            raise
+        try:
+            wait_until_up(self.url + "/", STARTUP_TIMEOUT, self.process)
+        except RuntimeError:
+            self.stop()
+            raise
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+
+def wait_until_up(url: str, timeout: float, process: subprocess.Popen):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before answering {url}")
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"No answer from {url} within {timeout:.0f}s")
+
+
+def run_load(call: Callable[[int], requests.Response], count: int, concurrency: int) -> dict:
+    """count calls, concurrency at a time: latency percentiles, errors and throughput"""
+    latencies, errors = [], []
+
+    def one(i: int):
+        started = time.perf_counter()
+        try:
+            response = call(i)
+            ok = response.status_code < 400
+            error = None if ok else f"HTTP {response.status_code}: {response.text[:200]}"
+        except requests.RequestException as e:
+            error = str(e)
+        elapsed = time.perf_counter() - started
+        return elapsed, error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, error in pool.map(one, range(count)):
+            latencies.append(elapsed * 1000)
+            if error:
+                errors.append(error)
+    duration = time.perf_counter() - started
+    return {
+        "requests": count,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "latency_ms": {"p50": round(percentile(latencies, 50), 1), "p95": round(percentile(latencies, 95), 1),
+                       "p99": round(percentile(latencies, 99), 1), "mean": round(sum(latencies) / len(latencies), 1),
+                       "max": round(max(latencies), 1)},
+        "throughput_rps": round(count / duration, 2),
+        "duration_s": round(duration, 2),
+    }
+
+
+def counts_delta(before: dict, after: dict) -> dict:
+    return {key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)}
+
+
+def benchmark_app(module: str, stub: Stub, args) -> List[dict]:
+    """Every corpus size x transcript size x concurrency scenario for one app"""
+    log_path = os.path.join(tempfile.gettempdir(), f"bench-{module}.log")
+    print(f"\n🚀 {module} (server log: {log_path})")
+    try:
+        server = AppServer(module, stub, args.workers, log_path)
+    except (RuntimeError, OSError) as e:  # OSError: e.g. gunicorn not installed
+        print(f"⚠️  {module} did not start: {e}")
+        return [{"app": module, "error": str(e)}]
+
+    results = []
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency)))
+
+    def record(endpoint: str, corpus_docs: int, transcript_tokens: Optional[int], concurrency: int,
+               call: Callable[[int], requests.Response], count: int):
+        before = stub.stats()
+        with RssSampler(server.process.pid) as rss:
+            result = run_load(call, count, concurrency)
+        result = {"app": module, "endpoint": endpoint, "corpus_docs": corpus_docs,
+                  "transcript_tokens": transcript_tokens, "concurrency": concurrency, **result,
+                  "rss_mb": rss.report(), "upstream": counts_delta(before, stub.stats())}
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"   {endpoint:<11} docs={corpus_docs:<5} tokens={transcript_tokens or '-':<6} c={concurrency:<3} "
+              f"p50={latency['p50']:>8.1f}ms p95={latency['p95']:>8.1f}ms p99={latency['p99']:>8.1f}ms "
+              f"{result['throughput_rps']:>7.2f} req/s  rss={result['rss_mb']['peak']}MB"
+              + (f"  ⚠️ {result['errors']} errors" if result["errors"] else ""))
+
+    try:
+        # Warm up (lazy model loads, first connections) outside the measurements
+        session.post(server.url + "/upload_docs", json={"docs": make_docs(2, 200, seed=99)}, timeout=args.timeout)
+        session.post(server.url + "/summarize", json={"transcript": make_transcript(200, -1)}, timeout=args.timeout)
+
+        seed = 0
+        for corpus_docs in args.corpus_sizes:
+            docs = make_docs(corpus_docs, args.doc_tokens)
+            # Uploads replace the namespace, so they are measured one at a time
+            record("upload_docs", corpus_docs, None, 1,
+                   lambda i: session.post(server.url + "/upload_docs", json={"docs": docs}, timeout=args.timeout),
+                   args.upload_repeats)
+            for transcript_tokens in args.transcript_sizes:
+                for concurrency in args.concurrency:
+                    base = seed
+                    seed += args.requests
+                    record("summarize", corpus_docs, transcript_tokens, concurrency,
+                           lambda i: session.post(server.url + "/summarize", timeout=args.timeout,
+                                                  json={"transcript": make_transcript(transcript_tokens, base + i)}),
+                           args.requests)
+    finally:
+        server.stop()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result: dict) -> tuple:
+    return (result["app"], result.get("endpoint"), result.get("corpus_docs"), result.get("transcript_tokens"),
+            result.get("concurrency"))
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """Print p95 / throughput changes per scenario; exit code 1 if any p95 grew more than threshold %"""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"] if "latency_ms" in r}
+    with open(current_path) as f:
+        current = [r for r in json.load(f)["results"] if "latency_ms" in r]
+
+    regressions = 0
+    for result in current:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        old_p95, new_p95 = old["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        change = (new_p95 - old_p95) / old_p95 * 100 if old_p95 else 0.0
+        flag = "⚠️ " if change > threshold else "✓ "
+        regressions += change > threshold
+        app, endpoint, docs, tokens, concurrency = result_key(result)
+        print(f"{flag}{app} {endpoint} docs={docs} tokens={tokens or '-'} c={concurrency}: "
+              f"p95 {old_p95:.1f} -> {new_p95:.1f}ms ({change:+.1f}%), "
+              f"{old['throughput_rps']:.2f} -> {result['throughput_rps']:.2f} req/s")
+    print(f"\n{regressions} regression(s) over {threshold:.0f}% p95")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /upload_docs and /summarize against a local stub LLM")
+    parser.add_argument("--apps", nargs="+", default=APPS, choices=APPS, help="Variants to run (default all)")
+    parser.add_argument("--corpus-sizes", nargs="+", type=int, default=[10, 100, 1000],
+                        help="Documents uploaded per scenario (default 10 100 1000)")
+    parser.add_argument("--doc-tokens", type=int, default=400, help="Approximate tokens per document")
+    parser.add_argument("--transcript-sizes", nargs="+", type=int, default=[500, 3000, 12000],
+                        help="Approximate transcript tokens (default 500 3000 12000)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4], help="Requests in flight (default 1 4)")
+    parser.add_argument("--requests", type=int, default=20, help="/summarize requests per scenario")
+    parser.add_argument("--upload-repeats", type=int, default=3, help="/upload_docs requests per corpus size")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run under gunicorn with this many workers (default 0: Flask's threaded server)")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout (seconds)")
+    parser.add_argument("-o", "--output", help="Results file (default benchmarks/<app-or-all>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=10, help="p95 increase (%%) counted as a regression")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    stub_args = ["--latency", str(args.latency), "--jitter", str(args.jitter),
+                 "--tokens-per-second", str(args.tokens_per_second), "--error-rate", str(args.error_rate),
+                 "--error-status", str(args.error_status), "--dim", str(args.dim), "--seed", str(args.seed)]
+    stub = Stub(stub_args)
+    print(f"✓ Stub upstream on {stub.url} (latency {args.latency}s +{args.jitter}s, "
+          f"{args.tokens_per_second or 'instant'} tokens/s, {args.error_rate:.0%} errors)")
+    results = []
+    try:
+        for module in args.apps:
+            results.extend(benchmark_app(module, stub, args))
+    finally:
+        stub.stop()
+
+    report = {
+        "meta": {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "args": vars(args)},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "benchmarks", f"{args.apps[0] if len(args.apps) == 1 else 'all'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# documents.py - Document payload parsing and token-bounded chunking shared by all variants
+import os
+import re
+import hashlib
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from segments import estimate_tokens
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))  # Chunk budget (the bge models read at most 512 tokens)
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))  # Tokens of trailing sentences repeated in the next chunk
+MIN_CHUNK_CHARS = 20  # A document shorter than this is noise, not context
+MAX_PARAGRAPH_CHARS = 64 * 1024  # Streamed text without paragraph breaks is cut here
+CHARS_PER_TOKEN = 4  # Same estimate as segments.estimate_tokens
+
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n")  # Single line breaks (lists, headings) also end a unit
+
+Unit = Tuple[str, bool, int]  # (sentence, starts a paragraph, tokens)
+
+
+def iter_spans(text: str, pattern: re.Pattern) -> Iterator[str]:
+    """Non-empty pieces of text between matches of pattern, found lazily"""
+    start = 0
+    for match in pattern.finditer(text):
+        piece = text[start:match.start()].strip()
+        if piece:
+            yield piece
+        start = match.end()
+    piece = text[start:].strip()
+    if piece:
+        yield piece
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Paragraphs of a document arriving in pieces (e.g. upload reads), holding at most one at a time"""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        for match in PARAGRAPH_RE.finditer(buffer):
+            if match.end() == len(buffer):
+                break  # The break may continue in the next piece
+            if buffer[start:match.start()].strip():
+                yield buffer[start:match.start()].strip()
+            start = match.end()
+        buffer = buffer[start:]
+        while len(buffer) > MAX_PARAGRAPH_CHARS:
+            cut = buffer.rfind(" ", 0, MAX_PARAGRAPH_CHARS)
+            cut = cut if cut > 0 else MAX_PARAGRAPH_CHARS
+            yield buffer[:cut].strip()
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def split_long(sentence: str, max_tokens: int) -> Iterator[str]:
+    """Cut a sentence over the budget at word boundaries (mid-word only for a single huge token)"""
+    max_chars = max(1, max_tokens - 1) * CHARS_PER_TOKEN
+    while estimate_tokens(sentence) > max_tokens:
+        cut = sentence.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        yield sentence[:cut].strip()
+        sentence = sentence[cut:].strip()
+    if sentence:
+        yield sentence
+
+
+def iter_sentences(paragraphs: Iterable[str], max_tokens: int = CHUNK_TOKENS) -> Iterator[Unit]:
+    """Walk a document paragraph by paragraph, sentence by sentence"""
+    for paragraph in paragraphs:
+        first = True
+        for sentence in iter_spans(paragraph, SENTENCE_END_RE):
+            for piece in split_long(sentence, max_tokens):
+                yield piece, first, estimate_tokens(piece)
+                first = False
+
+
+def join_units(units: List[Unit]) -> str:
+    return "".join(("\n\n" if starts and i else " " if i else "") + sentence
+                   for i, (sentence, starts, _) in enumerate(units))
+
+
+def overlap_tail(units: List[Unit], overlap: int) -> List[Unit]:
+    """The trailing sentences of a chunk that fit in the overlap budget"""
+    tail, used = [], 0
+    for unit in reversed(units):
+        if used + unit[2] > overlap:
+            break
+        tail.insert(0, unit)
+        used += unit[2]
+    return tail
+
+
+def iter_chunks(text: Union[str, Iterable[str]], max_tokens: int = CHUNK_TOKENS,
+                overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Pack whole sentences of a document (a string, or text pieces as they arrive) into chunks of at most max_tokens
+    A chunk that is at least half full ends at the next paragraph break. Otherwise it ends
+    when full and the next chunk starts with its last ~overlap tokens of sentences.
+    """
+    paragraphs = iter_spans(text, PARAGRAPH_RE) if isinstance(text, str) else iter_paragraphs(text)
+    window: List[Unit] = []
+    used = fresh = 0  # Tokens in the window; sentences in it not yet part of an emitted chunk
+    held: Optional[str] = None  # Last finished chunk, held back so a tiny remainder can join it
+    for unit in iter_sentences(paragraphs, max_tokens):
+        at_break = unit[1] and used >= max_tokens // 2
+        if fresh and (at_break or used + unit[2] > max_tokens):
+            if held is not None:
+                yield held
+            held = join_units(window)
+            window = [] if at_break else overlap_tail(window, min(overlap, max_tokens - unit[2]))
+            used, fresh = sum(u[2] for u in window), 0
+        window.append(unit)
+        used += unit[2]
+        fresh += 1
+
+    # The last chunk keeps its overlap like every other; only a tiny remainder is folded into the held chunk
+    tail = join_units(window[len(window) - fresh:]) if fresh else ""
+    rest = join_units(window) if fresh else ""
+    if held is not None and tail and len(tail) < MIN_CHUNK_CHARS:
+        held, rest = held + ("\n\n" if window[-fresh][1] else " ") + tail, ""
+    if held is not None:
+        yield held
+    if rest and (held is not None or len(rest) >= MIN_CHUNK_CHARS):
+        yield rest
+
+
+def iter_doc_chunks(docs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """(doc_id, chunk) pairs, produced lazily document by document"""
+    for doc_id, text in docs:
+        for chunk in iter_chunks(text):
+            yield doc_id, chunk
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Consecutive lists of up to size items from any iterable"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def flatten_chunks(doc_chunks: Dict[str, List[str]]) -> Tuple[List[str], List[str]]:
+    """Split per-document chunks into parallel text and doc ID lists"""
+    texts = [c for chunks in doc_chunks.values() for c in chunks]
+    doc_ids = [doc_id for doc_id, chunks in doc_chunks.items() for _ in chunks]
+    return texts, doc_ids
+
+
+def content_doc_id(text: str) -> str:
+    """Stable ID for documents uploaded without one, so re-uploads are idempotent"""
+    return "doc-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def parse_docs(docs: list) -> List[Tuple[str, str]]:
+    """
+    Normalize a "docs" payload into (doc_id, text) pairs
+    Accepts plain strings or objects: { "id": "handbook", "text": "..." }
+    """
+    parsed: Dict[str, str] = {}
+    for d in docs:
+        if isinstance(d, str):
+            parsed[content_doc_id(d)] = d
+        elif isinstance(d, dict) and isinstance(d.get("text"), str):
+            doc_id = str(d.get("id") or content_doc_id(d["text"]))
+            parsed[doc_id] = d["text"]
+        else:
+            raise ValueError("Each document must be a string or an object with a 'text' field")
+    return list(parsed.items())
+
+
+def chunk_docs(docs: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """Chunk each document, keeping the chunks grouped by document ID"""
+    grouped: Dict[str, List[str]] = {doc_id: [] for doc_id, _ in docs}
+    for doc_id, chunk in iter_doc_chunks(docs):
+        grouped[doc_id].append(chunk)
+    return grouped
@@ -0,0 +1,120 @@
+# embedding_cache.py - Persistent embedding cache keyed by (model, chunk-text hash)
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from metrics import CACHE_LOOKUPS
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3")  # Empty disables the cache
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+EVICT_TO = 0.9  # After eviction the cache is at most 90% of its budget
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """SQLite table of raw float32 vectors, evicted least-recently-used once over its size budget"""
+
+    def __init__(self, model: str, path: str = EMBED_CACHE_PATH, max_mb: float = EMBED_CACHE_MAX_MB):
+        self.model = model
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _db(self) -> sqlite3.Connection:
+        """Per-thread, per-process connection (sqlite3 connections must not cross threads or forks)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA recursive_triggers = ON")  # So rows dropped by INSERT OR REPLACE are counted
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                         "model TEXT NOT NULL, hash BLOB NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL, "
+                         "last_used REAL NOT NULL, PRIMARY KEY (model, hash))")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            # Running size of the table in one row, kept by triggers so eviction never has to scan
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings_size ("
+                         "id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL, rows INTEGER NOT NULL)")
+            if conn.execute("SELECT 1 FROM embeddings_size").fetchone() is None:  # New, or from before it was kept
+                conn.execute("INSERT INTO embeddings_size SELECT 0, COALESCE(SUM(LENGTH(vec)), 0), COUNT(*) "
+                             "FROM embeddings")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS embeddings_added AFTER INSERT ON embeddings BEGIN "
+                         "UPDATE embeddings_size SET bytes = bytes + LENGTH(NEW.vec), rows = rows + 1; END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS embeddings_removed AFTER DELETE ON embeddings BEGIN "
+                         "UPDATE embeddings_size SET bytes = bytes - LENGTH(OLD.vec), rows = rows - 1; END")
+            conn.commit()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors in input order (None for misses)"""
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        try:
+            conn = self._db()
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), 500):  # Stay under SQLite's bound-parameter limit
+                batch = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [self.model, *batch]).fetchall()
+                found.update((h, np.frombuffer(vec, dtype=np.float32)) for h, vec in rows)
+            if found:
+                with conn:
+                    now = time.time()
+                    conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                                     [(now, self.model, h) for h in found])
+        except sqlite3.Error as e:
+            print(f"Embedding cache read failed: {e}")
+        results = [found.get(h) for h in hashes]
+        hit_count = sum(v is not None for v in results)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        CACHE_LOOKUPS.inc(hit_count, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(results) - hit_count, cache="embedding", result="miss")
+        return results
+
+    def put_many(self, texts: List[str], vectors):
+        """Store vectors for texts, then evict LRU rows if over budget"""
+        if not self.enabled or not len(texts):
+            return
+        now = time.time()
+        rows = []
+        for text, vec in zip(texts, vectors):
+            vec = np.asarray(vec, dtype=np.float32).ravel()
+            rows.append((self.model, text_hash(text), len(vec), vec.tobytes(), now))
+        try:
+            conn = self._db()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, dim, vec, last_used) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        used, count = conn.execute("SELECT bytes, rows FROM embeddings_size").fetchone()
+        if used <= self.max_bytes or not count:
+            return
+        # Rows are about the same size, so drop the oldest fraction needed to get back under budget
+        drop = int(count * (1 - EVICT_TO * self.max_bytes / used)) + 1
+        with conn:
+            conn.execute("DELETE FROM embeddings WHERE rowid IN "
+                         "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)", (drop,))
+        print(f"✓ Embedding cache evicted {drop} least-recently-used vectors")
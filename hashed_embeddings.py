@@ -0,0 +1,145 @@
+# hashed_embeddings.py - Local TF-IDF embeddings by the hashing trick: retrieval with no network and no model
+import os
+import zlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from keyword_index import tokenize
+from segments import STOPWORDS
+from vector_store import VectorStore
+
+HASHED_DIM = int(os.getenv("HASHED_DIM", "1024"))  # Buckets per vector (bge-large's size); more = fewer collisions
+HASHED_NGRAMS = int(os.getenv("HASHED_NGRAMS", "2"))  # Word n-grams hashed as features (1 = single words)
+STORE_FILE = "hashed_vectors.npz"  # Not vectors.npz: hashed and model-embedded stores must never be mixed
+SIGN_BIT = 1 << 31
+FEATURES_VERSION = 1  # Bump when terms() or the weighting change: saved stores are then re-embedded
+EMBED_BLOCK = 256  # Texts expanded into one dense block at a time
+
+
+def terms(text: str) -> List[str]:
+    """Lowercase words without stopwords, plurals folded ("customers" -> "customer")"""
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in tokenize(text) if w not in STOPWORDS]
+
+
+class HashedEmbedder:
+    """
+    Word n-grams hashed into dim buckets with a hashed sign, weighted 1 + log(tf)
+    crc32 is stable across processes and restarts (unlike hash()), so saved vectors stay valid.
+    """
+
+    def __init__(self, dim: int = HASHED_DIM, ngrams: int = HASHED_NGRAMS):
+        self.dim = dim
+        self.ngrams = max(1, ngrams)
+
+    def settings(self) -> Dict[str, int]:
+        """Everything the vectors depend on; rows embedded with other settings are not comparable"""
+        return {"dim": self.dim, "ngrams": self.ngrams, "features": FEATURES_VERSION}
+
+    def features(self, text: str) -> List[int]:
+        """crc32 of every word and word n-gram"""
+        words = terms(text)
+        hashes = [zlib.crc32(word.encode("utf-8")) for word in words]
+        for n in range(2, self.ngrams + 1):
+            hashes.extend(zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) for i in range(len(words) - n + 1))
+        return hashes
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 rows, not normalized"""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BLOCK):
+            block = texts[start:start + EMBED_BLOCK]
+            features = [self.features(text) for text in block]
+            hashes = np.fromiter((h for row in features for h in row), dtype=np.uint32,
+                                 count=sum(map(len, features)))
+            rows = np.repeat(np.arange(len(block)), [len(row) for row in features])
+            signs = np.where(hashes & SIGN_BIT, -1.0, 1.0)
+            # Scatter-add into one flat (block x dim) array: a sparse-to-dense sum in a single pass
+            tf = np.bincount(rows * self.dim + hashes % self.dim, weights=signs,
+                             minlength=len(block) * self.dim).reshape(len(block), self.dim)
+            magnitude = np.abs(tf)
+            nonzero = magnitude > 0
+            out[start:start + len(block)][nonzero] = np.sign(tf[nonzero]) * (1 + np.log(magnitude[nonzero]))
+        return out
+
+
+class HashedIndex:
+    """
+    Chunks embedded with HashedEmbedder in a VectorStore, searched by text (the BM25Index interface)
+    Weighting is lnc.ltc: stored rows carry log tf only, so they never go stale as documents come and
+    go; the IDF, taken from the store's bucket document frequencies, is applied to the query.
+    """
+
+    def __init__(self, embedder: Optional[HashedEmbedder] = None):
+        self.embedder = embedder or HashedEmbedder()
+        self.vectors = VectorStore()
+        self.vectors.settings = self.embedder.settings()
+        self._idf: Tuple[int, Optional[np.ndarray]] = (-1, None)  # (store version, weights)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def version(self) -> int:
+        return self.vectors.version
+
+    def clear(self):
+        self.vectors.clear()
+
+    def rebuild(self, texts: List[str], doc_ids: List[str]):
+        """Atomically replace the whole index"""
+        self.vectors.rebuild(self.embedder.embed(texts), texts, doc_ids)
+
+    def add(self, texts: List[str], doc_ids: List[str], replace=()):
+        """Embed and append chunks; rows of documents listed in `replace` are dropped in the same step"""
+        self.vectors.add(self.embedder.embed(texts), texts, doc_ids, replace=replace)
+
+    def remove_docs(self, doc_ids) -> List[str]:
+        return self.vectors.remove_docs(doc_ids)
+
+    def documents(self) -> Dict[str, int]:
+        return self.vectors.documents()
+
+    def memory_bytes(self) -> int:
+        return self.vectors.memory_bytes()
+
+    def save(self, path: str):
+        self.vectors.save(path, STORE_FILE)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedIndex":
+        """Index saved at path, or an empty one; re-embedded if it was saved with other embedder settings"""
+        index = cls()
+        index.vectors = VectorStore.load(path, STORE_FILE)
+        saved, current = index.vectors.settings, index.embedder.settings()
+        index.vectors.settings = current
+        if len(index.vectors) and saved != current:
+            print(f"  Re-embedding {len(index.vectors)} chunks: saved with {saved or 'unrecorded settings'}, "
+                  f"now {current}")
+            index.rebuild(*index.vectors.chunks())
+        return index
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency per bucket, recomputed only when the store changes"""
+        with self._lock:
+            version, weights = self._idf
+            if version != self.vectors.version or weights is None:
+                version = self.vectors.version
+                df = self.vectors.document_frequencies()
+                weights = (np.log((1 + len(self.vectors)) / (1 + df)) + 1).astype(np.float32)
+                self._idf = (version, weights)
+            return weights
+
+    def search_batch(self, queries: List[str], k: int = 3) -> List[List[Tuple[float, str]]]:
+        """Top-k (score, text) per query, from one matrix-matrix product; chunks sharing no terms are left out"""
+        if not len(self.vectors) or not queries:
+            return [[] for _ in queries]
+        hits = self.vectors.search_batch(self.embedder.embed(queries) * self.idf(), k)
+        return [[(score, text) for score, text in row if score > 0] for row in hits]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[float, str]]:
+        """Top-k (score, text) chunks by TF-IDF cosine similarity"""
+        return self.search_batch([query], k)[0]
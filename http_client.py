@@ -0,0 +1,88 @@
+# http_client.py - Pooled keep-alive HTTP client with retries, shared by the HF and Groq helpers
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # Hosts kept in the pool cache
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # Keep-alive sockets per host
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))  # Seconds, doubled per attempt
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session: Optional[requests.Session] = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return this process's pooled session (recreated after fork, so workers never share sockets)"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def post(url: str, read_timeout: float, max_retries: int = HTTP_MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    POST over the pooled session, retrying 429/5xx and connection errors
+    Honors Retry-After; returns the last response (callers still call raise_for_status()).
+    """
+    timeout = (HTTP_CONNECT_TIMEOUT, read_timeout)
+    host = urlsplit(url).netloc
+    for attempt in range(max_retries + 1):
+        try:
+            response = get_session().post(url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            UPSTREAM_RESPONSES.inc(host=host, status="error")
+            if attempt == max_retries:
+                raise
+            UPSTREAM_RETRIES.inc(host=host, reason=type(e).__name__)
+            delay = backoff_delay(attempt)
+            print(f"  HTTP {type(e).__name__} from {url}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+        else:
+            UPSTREAM_RESPONSES.inc(host=host, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            UPSTREAM_RETRIES.inc(host=host, reason=response.status_code)
+            delay = retry_after_seconds(response)
+            delay = min(HTTP_BACKOFF_MAX, delay) if delay is not None else backoff_delay(attempt)
+            print(f"  HTTP {response.status_code} from {url}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            response.close()
+        time.sleep(delay)
@@ -0,0 +1,144 @@
+# index_manager.py - Per-namespace document indexes, loaded lazily and LRU-evicted under a memory budget
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server runs a single process, no file lock needed
+    fcntl = None
+
+INDEX_MEMORY_MB = float(os.getenv("INDEX_MEMORY_MB", "256"))  # Resident index budget per worker
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_HEADER = "X-Namespace"
+NAMESPACE_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+LOCK_NAME = ".namespace.lock"
+
+
+def validate_namespace(namespace: Optional[str]) -> str:
+    namespace = (namespace or DEFAULT_NAMESPACE).strip()
+    if not NAMESPACE_RE.match(namespace):
+        raise ValueError(f"Invalid namespace {namespace!r}: use 1-64 letters, digits, '.', '_' or '-'")
+    return namespace
+
+
+def namespace_from_request(req) -> str:
+    """Namespace from the X-Namespace header, a "namespace" body field or ?namespace=, else the default"""
+    body = req.get_json(silent=True) if req.is_json else None
+    return validate_namespace(req.headers.get(NAMESPACE_HEADER)
+                              or (body.get("namespace") if isinstance(body, dict) else None)
+                              or req.args.get("namespace"))
+
+
+class IndexManager:
+    """
+    namespace -> store, each persisted in root/<namespace>/
+    Stores provide save(path), memory_bytes() and a loader open_store(path); in-memory stores are
+    re-read when another worker has saved a newer copy (watch=True).
+    """
+
+    def __init__(self, root: str, open_store: Callable[[str], object], max_mb: float = INDEX_MEMORY_MB,
+                 watch: bool = True):
+        self.root = root
+        self.open_store = open_store
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.watch = watch
+        os.makedirs(root, exist_ok=True)
+        self._entries: "OrderedDict[str, list]" = OrderedDict()  # namespace -> [store, stamp, bytes]
+        self._lock = threading.RLock()
+        self._edit_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def path(self, namespace: str) -> str:
+        return os.path.join(self.root, validate_namespace(namespace))
+
+    def _stamp(self, namespace: str):
+        """Identifies the on-disk copy: changes whenever any worker saves the namespace"""
+        if not self.watch:
+            return None
+        try:
+            return max((st.st_mtime_ns, st.st_size, st.st_ino) for st in
+                       (os.stat(entry.path) for entry in os.scandir(self.path(namespace)) if entry.is_file()
+                        and entry.name != LOCK_NAME))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get(self, namespace: str = DEFAULT_NAMESPACE):
+        """The namespace's store, loading (or reloading a stale copy) from disk as needed"""
+        namespace = validate_namespace(namespace)
+        stamp = self._stamp(namespace)
+        with self._lock:
+            entry = self._entries.get(namespace)
+            if entry is None or entry[1] != stamp:
+                store = self.open_store(self.path(namespace))
+                entry = [store, stamp, store.memory_bytes()]
+                self._entries[namespace] = entry
+                self.loads += 1
+            self._entries.move_to_end(namespace)
+            self._evict(keep=namespace)
+            return entry[0]
+
+    @contextmanager
+    def edit(self, namespace: str = DEFAULT_NAMESPACE):
+        """Exclusive (cross-worker) read-modify-save of one namespace"""
+        namespace = validate_namespace(namespace)
+        os.makedirs(self.path(namespace), exist_ok=True)
+        with self._file_lock(namespace):
+            store = self.get(namespace)
+            yield store
+            store.save(self.path(namespace))
+            with self._lock:
+                self._entries[namespace] = [store, self._stamp(namespace), store.memory_bytes()]
+                self._entries.move_to_end(namespace)
+                self._evict(keep=namespace)
+
+    def namespaces(self) -> Dict[str, bool]:
+        """Every namespace on disk or in memory -> whether it is currently loaded"""
+        names = {entry.name: False for entry in os.scandir(self.root)
+                 if entry.is_dir() and NAMESPACE_RE.match(entry.name)}
+        with self._lock:
+            names.update({namespace: True for namespace in self._entries})
+        return dict(sorted(names.items()))
+
+    def loaded(self) -> Dict[str, object]:
+        """namespace -> store, for the namespaces currently in memory"""
+        with self._lock:
+            return {namespace: entry[0] for namespace, entry in self._entries.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = {namespace: entry[2] for namespace, entry in self._entries.items()}
+        return {"loaded": loaded, "memory_bytes": sum(loaded.values()), "max_bytes": self.max_bytes,
+                "loads": self.loads, "evictions": self.evictions}
+
+    def _evict(self, keep: str):
+        """Drop least-recently-used namespaces (never the one in use) until under budget"""
+        used = sum(entry[2] for entry in self._entries.values())
+        for namespace in list(self._entries):
+            if used <= self.max_bytes:
+                break
+            if namespace == keep:
+                continue
+            used -= self._entries.pop(namespace)[2]
+            self.evictions += 1
+            print(f"✓ Evicted index namespace '{namespace}' from memory")
+
+    @contextmanager
+    def _file_lock(self, namespace: str):
+        """One editor per namespace: a thread lock within this worker, a file lock across workers"""
+        with self._lock:
+            edit_lock = self._edit_locks.setdefault(namespace, threading.Lock())
+        with edit_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path(namespace), LOCK_NAME), "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,516 @@
+# index_store.py - Versioned on-disk FAISS index shared across worker processes
+import os
+import json
+import mmap
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server runs a single process, no file lock needed
+    fcntl = None
+
+# Layout of an index directory:
+#   manifest.json             -> {"format": 2, "version": N, "dir": "v0000000N", "index": {type, quant, ...}, ...}
+#   v0000000N/vectors.faiss    -> IndexIDMap2 keyed by chunk ID, mmapped read-only by every worker
+#   v0000000N/vectors.f32      -> raw float32 vector of each row, on disk only (retraining and re-ranking)
+#   v0000000N/texts.bin        -> UTF-8 chunk texts, append-only between compactions
+#   v0000000N/offsets.npy      -> int64 byte offsets into texts.bin (len = rows + 1)
+#   v0000000N/ids.npy          -> int64 chunk ID of each row (ascending)
+#   v0000000N/tombstones.npy   -> chunk IDs deleted but not yet compacted away
+#   v0000000N/docs.json        -> {doc_id: [chunk IDs]}
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+FORMAT_VERSION = 2
+KEEP_VERSIONS = 2  # Current + previous, so a worker mid-reload never loses its files
+COMPACT_RATIO = float(os.getenv("INDEX_COMPACT_RATIO", "0.2"))  # Compact once 20% of rows are dead
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+# Index selection: exact search while small, a graph or inverted lists with compressed codes when large
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")  # auto | flat | hnsw | ivf
+INDEX_QUANT = os.getenv("INDEX_QUANT", "auto")  # auto | none | fp16 | int8 | pq
+INDEX_RECALL = os.getenv("INDEX_RECALL", "balanced")  # fast | balanced | accurate (search effort per query)
+FLAT_MAX = int(os.getenv("INDEX_FLAT_MAX", "20000"))  # Up to this many chunks: exact flat scan
+HNSW_MAX = int(os.getenv("INDEX_HNSW_MAX", "200000"))  # Up to this many: HNSW graph; beyond: IVF
+AUTO_QUANT = {"flat": "none", "hnsw": "int8", "ivf": "pq"}  # 1x, ~3x (codes + graph) and 16x smaller
+HNSW_M = 32
+PQ_MIN_TRAIN = 39 * 256  # FAISS wants 39 training points per centroid; PQ codebooks have 256
+TRAIN_MAX = 131072  # Training sample cap
+RETRAIN_GROWTH = 4.0  # Retrain once the corpus is 4x the size the index was trained on
+ADD_BATCH = 65536
+RECALL_PRESETS = {
+    # nprobe: fraction of IVF lists scanned, ef_search: HNSW candidate list, rerank: exact re-scoring factor
+    "fast": {"nprobe": 0.01, "ef_search": 32, "rerank": 1},
+    "balanced": {"nprobe": 0.04, "ef_search": 96, "rerank": 2},
+    "accurate": {"nprobe": 0.15, "ef_search": 256, "rerank": 4},
+}
+LEGACY_SPEC = {"type": "flat", "quant": "none"}  # Manifests written before index selection
+# IVF-PQ lookup tables are nlist * M * 256 floats per worker; above this FAISS computes them per query
+faiss.cvar.precomputed_table_max_bytes = 64 * 1024 * 1024
+
+DocChunks = Dict[str, Tuple[np.ndarray, List[str]]]  # doc_id -> (vectors, chunk texts)
+
+
+def choose_index(count: int, dim: int, kind: str = INDEX_TYPE, quant: str = INDEX_QUANT) -> dict:
+    """Index parameters for a corpus of `count` vectors (stored in the manifest with the index)"""
+    if kind == "auto":
+        kind = "flat" if count <= FLAT_MAX else "hnsw" if count <= HNSW_MAX else "ivf"
+    if kind not in AUTO_QUANT:
+        raise ValueError(f"Unknown INDEX_TYPE {kind!r}: use auto, flat, hnsw or ivf")
+    if quant == "auto":
+        quant = AUTO_QUANT[kind]
+    if quant not in ("none", "fp16", "int8", "pq"):
+        raise ValueError(f"Unknown INDEX_QUANT {quant!r}: use auto, none, fp16, int8 or pq")
+    if quant == "pq" and count < PQ_MIN_TRAIN:
+        quant = "int8"  # Too few vectors to train PQ codebooks; switches once the corpus grows
+    spec = {"type": kind, "quant": quant, "dim": dim}
+    if quant == "pq":
+        # ~4 dimensions per one-byte code: 16x smaller than float32
+        spec["pq_m"] = max(m for m in range(1, max(1, dim // 4) + 1) if dim % m == 0)
+    if kind == "ivf":
+        spec["nlist"] = max(1, min(65536, 4 * int(np.sqrt(count)), count // 39))
+    if kind == "hnsw":
+        spec["hnsw_m"] = HNSW_M
+    return spec
+
+
+def factory_string(spec: dict) -> str:
+    codes = {"none": "Flat", "fp16": "SQfp16", "int8": "SQ8", "pq": f"PQ{spec.get('pq_m')}"}[spec["quant"]]
+    if spec["type"] == "hnsw":
+        return f"HNSW{spec['hnsw_m']}" if codes == "Flat" else f"HNSW{spec['hnsw_m']}_{codes}"
+    if spec["type"] == "ivf":
+        return f"IVF{spec['nlist']},{codes}"
+    return codes
+
+
+def search_settings(spec: dict, recall: str = INDEX_RECALL) -> dict:
+    """Per-query search effort for an index, from the INDEX_RECALL preset"""
+    if recall not in RECALL_PRESETS:
+        raise ValueError(f"Unknown INDEX_RECALL {recall!r}: use {', '.join(RECALL_PRESETS)}")
+    preset = RECALL_PRESETS[recall]
+    settings = {"recall": recall, "rerank": preset["rerank"] if spec["quant"] in ("int8", "pq") else 1}
+    if spec["type"] == "ivf":
+        settings["nprobe"] = min(spec["nlist"], max(4, round(spec["nlist"] * preset["nprobe"])))
+    if spec["type"] == "hnsw":
+        settings["ef_search"] = preset["ef_search"]
+    return settings
+
+
+def needs_rebuild(spec: dict, target: dict, index, count: int) -> bool:
+    """Whether the next publish must train a new index instead of adding to the current one"""
+    if (spec["type"], spec["quant"]) != (target["type"], target["quant"]) or not index.is_trained:
+        return True
+    return spec.get("trained_on", 0) > 0 and count > RETRAIN_GROWTH * spec["trained_on"]
+
+
+class IndexSnapshot:
+    """Read-only, memory-mapped view of one published index version"""
+
+    def __init__(self, manifest: dict, path: str):
+        self.version = manifest["version"]
+        self.path = path
+        self.spec = manifest.get("index", LEGACY_SPEC)
+        self.settings = search_settings(self.spec)
+        self.index = faiss.read_index(os.path.join(path, "vectors.faiss"), MMAP_FLAGS)
+        # Set once per snapshot, before it is published to query threads
+        inner = faiss.downcast_index(self.index.index)
+        if "nprobe" in self.settings:
+            inner.nprobe = self.settings["nprobe"]
+        if "ef_search" in self.settings:
+            inner.hnsw.efSearch = self.settings["ef_search"]
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.raw = None
+        raw_path = os.path.join(path, "vectors.f32")
+        if self.settings["rerank"] > 1 and len(self.ids) and os.path.exists(raw_path):
+            self.raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.index.d))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.tombstones = set(np.load(os.path.join(path, "tombstones.npy")).tolist())
+        with open(os.path.join(path, "texts.bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live (non-deleted) chunks"""
+        return self.index.ntotal - len(self.tombstones)
+
+    def text(self, chunk_id: int) -> str:
+        """Return the text of a chunk by its ID"""
+        row = int(np.searchsorted(self.ids, chunk_id))
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.blob[start:end].decode("utf-8")
+
+    def search(self, query_vectors: np.ndarray, k: int) -> List[str]:
+        """Return the texts of the k nearest live chunks to the first query vector"""
+        return self.search_batch(query_vectors[:1], k)[0]
+
+    def search_batch(self, query_vectors: np.ndarray, k: int) -> List[List[str]]:
+        """Texts of the k nearest live chunks to each query vector, from one FAISS search call"""
+        if self.ntotal == 0:
+            return [[] for _ in range(len(query_vectors))]
+        # Over-fetch by the tombstone count (bounded by compaction) so k live hits remain,
+        # and by the rerank factor so compressed codes only have to get the right chunks near the top
+        rerank = self.settings["rerank"] if self.raw is not None else 1
+        fetch = min((k + len(self.tombstones)) * rerank, self.index.ntotal)
+        queries = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        _, I = self.index.search(queries, fetch)
+        results = []
+        for query, row in zip(queries, I):
+            hits = [int(chunk_id) for chunk_id in row if chunk_id >= 0 and chunk_id not in self.tombstones]
+            if rerank > 1 and len(hits) > k:
+                # Exact distances from the raw vectors on disk; only these rows are paged in
+                rows = np.searchsorted(self.ids, hits)
+                distances = ((self.raw[rows] - query) ** 2).sum(axis=1)
+                hits = [hits[i] for i in np.argsort(distances, kind="stable")]
+            results.append([self.text(chunk_id) for chunk_id in hits[:k]])
+        return results
+
+    def info(self) -> dict:
+        """Index type, quantization and search settings, with the vector codes' size per chunk"""
+        bytes_per_vector = os.path.getsize(os.path.join(self.path, "vectors.faiss")) / max(1, self.index.ntotal)
+        return {**self.spec, **self.settings, "chunks": self.ntotal, "bytes_per_vector": round(bytes_per_vector, 1)}
+
+    def memory_bytes(self) -> int:
+        vectors = os.path.getsize(os.path.join(self.path, "vectors.faiss"))  # Codes, graph / lists and ID map
+        return vectors + self.ids.nbytes + self.offsets.nbytes + len(self.blob) + 64 * len(self.tombstones)
+
+    def documents(self) -> Dict[str, int]:
+        """Return {doc_id: chunk count} for every indexed document"""
+        with open(os.path.join(self.path, "docs.json")) as f:
+            return {doc_id: len(chunk_ids) for doc_id, chunk_ids in json.load(f).items()}
+
+
+class IndexStore:
+    """Directory-backed FAISS index, published by one writer and mmapped by all workers"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._manifest_stat = None
+        self._reload_lock = threading.Lock()
+
+    # ----- reading -----
+    def current(self) -> Optional[IndexSnapshot]:
+        """Return the latest published snapshot, reloading if another worker published"""
+        try:
+            st = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            return self._snapshot
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stamp == self._manifest_stat:
+            return self._snapshot
+
+        with self._reload_lock:
+            if stamp != self._manifest_stat:
+                manifest = self._read_manifest()
+                snapshot = self._snapshot
+                if manifest and (snapshot is None or snapshot.version != manifest["version"]):
+                    snapshot = IndexSnapshot(manifest, os.path.join(self.root, manifest["dir"]))
+                    print(f"✓ Loaded index v{snapshot.version} ({snapshot.ntotal} chunks, mmap)")
+                # Swap in one assignment; in-flight queries keep their old reference
+                self._snapshot = snapshot
+                self._manifest_stat = stamp
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        snapshot = self.current()
+        return snapshot.version if snapshot else 0
+
+    @property
+    def ntotal(self) -> int:
+        snapshot = self.current()
+        return snapshot.ntotal if snapshot else 0
+
+    def search(self, query_vectors: np.ndarray, k: int = 3) -> List[str]:
+        snapshot = self.current()
+        if snapshot is None:
+            return []
+        return snapshot.search(query_vectors, k)
+
+    def search_batch(self, query_vectors: np.ndarray, k: int = 3) -> List[List[str]]:
+        snapshot = self.current()
+        if snapshot is None:
+            return [[] for _ in range(len(query_vectors))]
+        return snapshot.search_batch(query_vectors, k)
+
+    def documents(self) -> Dict[str, int]:
+        snapshot = self.current()
+        return snapshot.documents() if snapshot else {}
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint of the current snapshot (mmapped vectors and texts included)"""
+        snapshot = self.current()
+        return snapshot.memory_bytes() if snapshot else 0
+
+    def info(self) -> dict:
+        snapshot = self.current()
+        return snapshot.info() if snapshot else {}
+
+    def save(self, path: str):
+        """Writes are published as they happen; nothing to flush (IndexManager store protocol)"""
+
+    # ----- writing -----
+    def rebuild(self, docs: DocChunks) -> int:
+        """Replace the whole index with the given documents"""
+        return self._apply(docs, [], reset=True)
+
+    def upsert(self, docs: DocChunks) -> int:
+        """Add documents, replacing any existing chunks with the same doc IDs"""
+        return self._apply(docs, [], reset=False)
+
+    def delete(self, doc_ids: List[str]) -> int:
+        """Remove documents by ID"""
+        return self._apply({}, doc_ids, reset=False)
+
+    def _apply(self, upserts: DocChunks, deletes: List[str], reset: bool) -> int:
+        with self._write_lock():
+            manifest = self._read_manifest()
+            version = (manifest["version"] if manifest else 0) + 1
+            base = manifest if manifest and not reset else None
+            base_path = os.path.join(self.root, base["dir"]) if base else None
+
+            if base:
+                index = faiss.read_index(os.path.join(base_path, "vectors.faiss"))
+                ids = np.load(os.path.join(base_path, "ids.npy"))
+                offsets = np.load(os.path.join(base_path, "offsets.npy"))
+                tombstones = set(np.load(os.path.join(base_path, "tombstones.npy")).tolist())
+                with open(os.path.join(base_path, "docs.json")) as f:
+                    docs = json.load(f)
+                next_id = base["next_id"]
+                spec = base.get("index", LEGACY_SPEC)
+            else:
+                index, ids, offsets = None, np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+                tombstones, docs, next_id, spec = set(), {}, 0, None
+
+            # Replaced and deleted documents only tombstone their old chunks
+            for doc_id in list(deletes) + list(upserts):
+                tombstones.update(docs.pop(doc_id, []))
+
+            new_ids, new_texts, new_vectors = [], [], []
+            for doc_id, (vectors, texts) in upserts.items():
+                chunk_ids = list(range(next_id, next_id + len(texts)))
+                next_id += len(texts)
+                docs[doc_id] = chunk_ids
+                new_ids.extend(chunk_ids)
+                new_texts.extend(texts)
+                if len(texts):
+                    new_vectors.append(np.asarray(vectors, dtype=np.float32))
+
+            if index is None and not new_texts:
+                return manifest["version"] if manifest else 0
+            vectors = np.ascontiguousarray(np.vstack(new_vectors), dtype=np.float32) if new_texts else None
+            dim = int(index.d) if index is not None else vectors.shape[1]
+
+            # Pick the index for the corpus size after this write; a new type, quantization or
+            # outgrown training means training a fresh index from the raw vectors
+            count = len(ids) - len(tombstones) + len(new_ids)
+            target = choose_index(count, dim)
+            rebuild = index is None or needs_rebuild(spec, target, index, count)
+            compact = bool(tombstones) and (rebuild or len(tombstones) >= COMPACT_RATIO * index.ntotal)
+            if compact and spec["type"] == "hnsw":
+                rebuild = True  # HNSW graphs cannot drop vectors
+
+            tmp = os.path.join(self.root, f".v{version:08d}.tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+
+            try:
+                if compact:
+                    dead = np.array(sorted(tombstones), dtype=np.int64)
+                    keep = ~np.isin(ids, dead)
+                    # Copy the kept rows out first: indexes without vectors.f32 reconstruct them from
+                    # the index, whose rows no longer line up with ids once remove_ids has run
+                    offsets = self._compact_texts(base_path, tmp, offsets, keep)
+                    self._write_rows(tmp, self._base_rows(base_path, index, ids), keep)
+                    if not rebuild:
+                        index.remove_ids(dead)
+                    ids, tombstones = ids[keep], set()
+                    print(f"✓ Compacted index: dropped {len(dead)} deleted chunks")
+                else:
+                    self._link_texts(base_path, tmp)
+                    self._link_rows(base_path, tmp, index, ids)
+
+                offsets = self._append_texts(tmp, offsets, new_texts)
+                ids = np.concatenate([ids, np.array(new_ids, dtype=np.int64)])
+                if vectors is not None:
+                    self._write_rows(tmp, vectors)
+
+                if rebuild:
+                    spec = target
+                    rows = np.memmap(os.path.join(tmp, "vectors.f32"), dtype=np.float32, mode="r",
+                                     shape=(len(ids), dim)) if len(ids) else np.zeros((0, dim), dtype=np.float32)
+                    index = self._train(spec, rows, ids)
+                    print(f"✓ Trained {factory_string(spec)} index over {len(ids)} chunks")
+                elif vectors is not None:
+                    index.add_with_ids(vectors, np.array(new_ids, dtype=np.int64))
+
+                faiss.write_index(index, os.path.join(tmp, "vectors.faiss"))
+                np.save(os.path.join(tmp, "ids.npy"), ids)
+                np.save(os.path.join(tmp, "offsets.npy"), offsets)
+                np.save(os.path.join(tmp, "tombstones.npy"), np.array(sorted(tombstones), dtype=np.int64))
+                with open(os.path.join(tmp, "docs.json"), "w") as f:
+                    json.dump(docs, f)
+
+                dirname = f"v{version:08d}"
+                os.rename(tmp, os.path.join(self.root, dirname))
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)  # Leave no half-written version behind
+                raise
+
+            self._write_manifest({
+                "format": FORMAT_VERSION,
+                "version": version,
+                "dir": dirname,
+                "dim": int(index.d),
+                "count": int(index.ntotal - len(tombstones)),
+                "next_id": next_id,
+                "index": spec,
+            })
+            self._remove_old_versions(version)
+        return version
+
+    # ----- index training and raw vectors -----
+    @staticmethod
+    def _train(spec: dict, rows: np.ndarray, ids: np.ndarray):
+        """Build the index described by spec over all rows, training it on a sample first"""
+        inner = faiss.index_factory(spec["dim"], factory_string(spec))
+        if not inner.is_trained and len(rows):
+            sample = np.sort(np.random.default_rng(0).choice(len(rows), min(len(rows), TRAIN_MAX), replace=False))
+            inner.train(np.ascontiguousarray(rows[sample], dtype=np.float32))
+            spec["trained_on"] = len(rows)
+        index = faiss.IndexIDMap2(inner)
+        for start in range(0, len(rows), ADD_BATCH):
+            index.add_with_ids(np.ascontiguousarray(rows[start:start + ADD_BATCH], dtype=np.float32),
+                               np.ascontiguousarray(ids[start:start + ADD_BATCH]))
+        return index
+
+    @staticmethod
+    def _base_rows(base_path: Optional[str], index, ids: np.ndarray) -> np.ndarray:
+        """Raw vectors of the previous version, row-aligned with ids"""
+        if base_path is None or not len(ids):
+            return np.zeros((0, index.d if index is not None else 0), dtype=np.float32)
+        raw_path = os.path.join(base_path, "vectors.f32")
+        if os.path.exists(raw_path):
+            return np.memmap(raw_path, dtype=np.float32, mode="r", shape=(len(ids), index.d))
+        # Written before raw vectors were kept: always an exact flat index, rows in insertion order
+        return faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+
+    @classmethod
+    def _link_rows(cls, base_path: Optional[str], path: str, index, ids: np.ndarray):
+        """Share the previous raw vector file, like texts.bin"""
+        target = os.path.join(path, "vectors.f32")
+        if base_path is not None and os.path.exists(os.path.join(base_path, "vectors.f32")):
+            try:
+                os.link(os.path.join(base_path, "vectors.f32"), target)
+            except OSError:
+                shutil.copyfile(os.path.join(base_path, "vectors.f32"), target)
+            # Drop rows left past the last published one by a crashed writer
+            with open(target, "r+b") as f:
+                f.truncate(len(ids) * index.d * 4)
+            return
+        open(target, "wb").close()
+        cls._write_rows(path, cls._base_rows(base_path, index, ids))
+
+    @staticmethod
+    def _write_rows(path: str, rows: np.ndarray, keep: Optional[np.ndarray] = None):
+        """Append float32 rows (only those where keep is set) to the version's raw vector file"""
+        with open(os.path.join(path, "vectors.f32"), "ab") as f:
+            for start in range(0, len(rows), ADD_BATCH):
+                batch = rows[start:start + ADD_BATCH]
+                if keep is not None:
+                    batch = batch[keep[start:start + ADD_BATCH]]
+                f.write(np.ascontiguousarray(batch, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ----- chunk text store -----
+    @staticmethod
+    def _link_texts(base_path: Optional[str], path: str):
+        """Share the previous text file; appends past its offsets are invisible to old readers"""
+        target = os.path.join(path, "texts.bin")
+        if base_path is None:
+            open(target, "wb").close()
+            return
+        try:
+            os.link(os.path.join(base_path, "texts.bin"), target)
+        except OSError:
+            shutil.copyfile(os.path.join(base_path, "texts.bin"), target)
+
+    @staticmethod
+    def _compact_texts(base_path: str, path: str, offsets: np.ndarray, keep: np.ndarray) -> np.ndarray:
+        """Write a fresh text file holding only the kept rows"""
+        new_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        with open(os.path.join(base_path, "texts.bin"), "rb") as src, \
+                open(os.path.join(path, "texts.bin"), "wb") as dst:
+            row = 0
+            for i in np.flatnonzero(keep):
+                src.seek(int(offsets[i]))
+                data = src.read(int(offsets[i + 1] - offsets[i]))
+                dst.write(data)
+                new_offsets[row + 1] = new_offsets[row] + len(data)
+                row += 1
+        return new_offsets
+
+    @staticmethod
+    def _append_texts(path: str, offsets: np.ndarray, texts: List[str]) -> np.ndarray:
+        """Append texts to the version's text file and return the extended offsets"""
+        new_offsets = np.zeros(len(texts), dtype=np.int64)
+        with open(os.path.join(path, "texts.bin"), "r+b") as f:
+            # Drop bytes left past the last row by a crashed writer; no published version references them
+            pos = int(offsets[-1])
+            f.truncate(pos)
+            f.seek(pos)
+            for i, text in enumerate(texts):
+                data = text.encode("utf-8")
+                f.write(data)
+                pos += len(data)
+                new_offsets[i] = pos
+            f.flush()
+            os.fsync(f.fileno())
+        return np.concatenate([offsets, new_offsets])
+
+    # ----- manifest helpers -----
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format in {self.root}: {manifest.get('format')}")
+        return manifest
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path())
+
+    def _remove_old_versions(self, version: int):
+        for name in os.listdir(self.root):
+            if name.startswith("v") and name[1:].isdigit() and int(name[1:]) <= version - KEEP_VERSIONS:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers across processes (and threads) via an exclusive file lock"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_NAME), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,210 @@
+# ingest.py - Streamed /upload_docs bodies (NDJSON or multipart text files), chunked and indexed as they arrive
+import os
+import re
+import json
+import time
+import uuid
+import codecs
+import sqlite3
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.sansio.multipart import Epilogue, File, MultipartDecoder, NeedData
+
+from documents import MIN_CHUNK_CHARS, iter_chunks, parse_docs
+from jobs import DONE, FAILED, JOB_TIMEOUT, JOB_TTL, RUNNING, make_store
+
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))  # Smallest index update (chunks embedded and published)
+INGEST_PUBLISH_MAX = int(os.getenv("INGEST_PUBLISH_MAX", "16384"))  # Largest index update; bounds upload memory
+READ_BYTES = 64 * 1024
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes while reading
+MAX_ERRORS = 100  # Per-document errors kept in the progress record
+UPLOAD_ID_HEADER = "X-Upload-Id"
+UPLOAD_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+TEXT_EXTENSIONS = (".txt", ".text", ".md", ".markdown", ".rst")
+
+uploads = make_store(table="uploads")  # Progress records shared by every worker, apart from analysis jobs
+
+DocStream = Iterator[Tuple[str, Iterable[str]]]  # (doc_id, text pieces)
+
+
+def is_streamed(req) -> bool:
+    """NDJSON and multipart uploads are streamed; a JSON body keeps the in-memory path"""
+    return "ndjson" in req.mimetype or "jsonlines" in req.mimetype or req.mimetype == "multipart/form-data"
+
+
+class CountingStream:
+    """Wraps the request body to count bytes read for progress"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self) -> bytes:
+        line = self.stream.readline()
+        self.bytes_read += len(line)
+        return line
+
+
+def iter_ndjson_docs(stream, errors: List[str]) -> DocStream:
+    """One document per line: {"id": "...", "text": "..."} or a JSON string"""
+    line_number = 0
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            (doc_id, text), = parse_docs([json.loads(line)])
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            errors.append(f"Line {line_number}: {e}")
+            continue
+        yield doc_id, [text]
+
+
+def iter_multipart_docs(stream, boundary: bytes, errors: List[str]) -> DocStream:
+    """One document per uploaded text/markdown file (ID = file name), decoded as its bytes arrive"""
+    decoder = MultipartDecoder(boundary)
+
+    def events():
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                decoder.receive_data(stream.read(READ_BYTES) or None)
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+    pending = events()
+
+    def pieces() -> Iterator[str]:
+        """The current part's text; whatever is left unread is skipped by the loop below"""
+        text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for event in pending:
+            yield text.decode(event.data, final=not event.more_data)
+            if not event.more_data:
+                return
+
+    for event in pending:
+        if not isinstance(event, File):
+            continue  # Form fields and the data of skipped parts
+        name = os.path.basename(event.filename or event.name)
+        content_type = event.headers.get("Content-Type", "")
+        if not name.lower().endswith(TEXT_EXTENSIONS) and not content_type.startswith("text/"):
+            errors.append(f"{name}: only plain text and markdown files are indexed (got {content_type or 'no type'})")
+            continue
+        yield name, pieces()
+
+
+def publish_size(indexed: int) -> int:
+    """Chunks to gather before the next index update: as many as are already indexed, within bounds"""
+    return min(max(indexed, INGEST_BATCH_CHUNKS), max(INGEST_PUBLISH_MAX, INGEST_BATCH_CHUNKS))
+
+
+def upload_id_from_request(req) -> str:
+    """Client-chosen ID (X-Upload-Id or ?upload_id=) so progress can be polled mid-upload, else a new one"""
+    upload_id = req.headers.get(UPLOAD_ID_HEADER) or req.args.get("upload_id") or uuid.uuid4().hex
+    if not UPLOAD_ID_RE.match(upload_id):
+        raise ValueError("Invalid upload ID: use 1-64 letters, digits, '.', '_' or '-'")
+    return upload_id
+
+
+def ingest_upload(req, namespace: str, upsert: Callable[[Dict[str, List[str]]], Optional[list]],
+                  delete: Callable[[List[str]], object], existing: Iterable[str]) -> dict:
+    """
+    Stream an NDJSON / multipart body into a namespace, in index updates that double in size
+    Every update rewrites the published index, so updates grow with what this upload has indexed
+    (INGEST_BATCH_CHUNKS up to INGEST_PUBLISH_MAX) to keep the rewriting linear in the upload size.
+    Like a JSON upload it replaces the namespace, but the old documents stay searchable until the
+    upload completes and are only removed then. Memory is bounded by the largest update and document.
+    """
+    upload_id = upload_id_from_request(req)
+    started = time.time()
+    uploads.purge(started - JOB_TTL)
+    try:
+        uploads.create({"id": upload_id, "status": RUNNING, "created_at": started})
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Upload ID {upload_id!r} was already used")
+
+    stream = CountingStream(req.stream)
+    errors: List[str] = []
+    progress = {"upload_id": upload_id, "namespace": namespace, "documents": 0, "chunks": 0,
+                "indexed_chunks": 0, "failed_chunks": 0, "bytes_read": 0, "bytes_total": req.content_length,
+                "errors": errors, "updated_at": started}
+
+    def report(status: str = RUNNING, **fields):
+        progress.update(bytes_read=stream.bytes_read, updated_at=time.time())
+        uploads.transition(upload_id, (RUNNING,), status, result=dict(progress, errors=errors[:MAX_ERRORS]), **fields)
+
+    report()
+    pending: Dict[str, List[str]] = {}
+
+    def flush():
+        failed = upsert(pending) or []
+        skipped = {f["doc_id"] for f in failed}  # Documents with a failed chunk keep their previous version
+        progress["indexed_chunks"] += sum(len(chunks) for doc_id, chunks in pending.items() if doc_id not in skipped)
+        progress["failed_chunks"] += len(failed)
+        pending.clear()
+        report()
+
+    try:
+        if req.mimetype == "multipart/form-data":
+            boundary = req.mimetype_params.get("boundary")
+            if not boundary:
+                raise ValueError("Multipart upload without a boundary")
+            docs = iter_multipart_docs(stream, boundary.encode("latin-1"), errors)
+        else:
+            docs = iter_ndjson_docs(stream, errors)
+
+        seen = set()
+        last_report = started
+        for doc_id, pieces in docs:
+            chunks = list(iter_chunks(pieces))  # One document at a time
+            if not chunks:
+                errors.append(f"{doc_id}: no text (documents need at least {MIN_CHUNK_CHARS} characters)")
+                continue
+            seen.add(doc_id)
+            pending[doc_id] = chunks
+            progress["documents"] += 1
+            progress["chunks"] += len(chunks)
+            if sum(map(len, pending.values())) >= publish_size(progress["indexed_chunks"]):
+                flush()
+                last_report = time.time()
+            elif time.time() - last_report > PROGRESS_INTERVAL:
+                report()
+                last_report = time.time()
+
+        if not seen:
+            raise ValueError("No valid documents in upload" + (f": {errors[0]}" if errors else ""))
+        if pending:
+            flush()
+        stale = [doc_id for doc_id in existing if doc_id not in seen]
+        if stale:
+            delete(stale)
+        progress["removed_documents"] = len(stale)
+        report(DONE, finished_at=time.time())
+    except Exception as e:
+        report(FAILED, finished_at=time.time(), error=str(e))
+        raise
+    return dict(progress, errors=errors[:MAX_ERRORS])
+
+
+def get_upload(upload_id: str) -> Optional[dict]:
+    """Progress of an upload; one whose worker stopped reporting is shown as failed"""
+    record = uploads.get(upload_id)
+    if record is None:
+        return None
+    status = {"upload_id": upload_id, **(record["result"] or {}), "status": record["status"],
+              "created_at": record["created_at"], "finished_at": record["finished_at"]}
+    if record["error"]:
+        status["error"] = record["error"]
+    if record["status"] == RUNNING and time.time() - status.get("updated_at", record["created_at"]) > JOB_TIMEOUT:
+        status.update(status=FAILED, error="Upload stopped reporting progress (worker restarted?)")
+    return status
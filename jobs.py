@@ -0,0 +1,214 @@
+# jobs.py - Background analysis jobs: bounded thread pool per web worker, pluggable job store
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+JOB_DB = os.getenv("JOB_DB", "jobs.sqlite3")  # SQLite path shared by all workers; empty = in-memory store
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Analyses running at once per web worker
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))  # Queued + running jobs per web worker
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))  # Running jobs older than this are reported failed
+JOB_TTL = float(os.getenv("JOB_TTL", "86400"))  # Finished jobs are purged after this many seconds
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised when this worker already holds JOB_QUEUE_MAX unfinished jobs"""
+
+
+class JobStore(ABC):
+    """Job persistence interface; a job is a dict with id, status, timestamps, result and error"""
+
+    @abstractmethod
+    def create(self, job: dict):
+        """Insert a new job"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job, or None if it does not exist (or was purged)"""
+
+    @abstractmethod
+    def transition(self, job_id: str, from_statuses, status: str, **fields) -> bool:
+        """Atomically move a job to status if it is currently in from_statuses"""
+
+    @abstractmethod
+    def purge(self, before: float):
+        """Drop finished jobs that finished before the given time"""
+
+
+class MemoryJobStore(JobStore):
+    """Per-process store: jobs are only visible to the worker that accepted them"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def transition(self, job_id: str, from_statuses, status: str, **fields) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in from_statuses:
+                return False
+            job.update(fields, status=status)
+            return True
+
+    def purge(self, before: float):
+        with self._lock:
+            for job_id in [j["id"] for j in self._jobs.values()
+                           if j["status"] in FINISHED and (j["finished_at"] or 0) < before]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Store shared by every gunicorn worker, so any worker can report on or cancel any job"""
+
+    COLUMNS = ("id", "status", "created_at", "started_at", "finished_at", "result", "error")
+
+    def __init__(self, path: str = JOB_DB, table: str = "jobs"):
+        self.path = path
+        self.table = table  # One table per kind of record, so their IDs and purges never mix
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        """Per-thread, per-process connection (sqlite3 connections must not cross threads or forks)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                         "created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def create(self, job: dict):
+        conn = self._db()
+        with conn:
+            conn.execute(f"INSERT INTO {self.table} (id, status, created_at) VALUES (?, ?, ?)",
+                         (job["id"], job["status"], job["created_at"]))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._db().execute(f"SELECT {', '.join(self.COLUMNS)} FROM {self.table} WHERE id = ?",
+                                 (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def transition(self, job_id: str, from_statuses, status: str, **fields) -> bool:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in ("status", *fields))
+        conn = self._db()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE {self.table} SET {assignments} "
+                f"WHERE id = ? AND status IN ({','.join('?' * len(from_statuses))})",
+                [status, *fields.values(), job_id, *from_statuses])
+        return cursor.rowcount == 1
+
+    def purge(self, before: float):
+        conn = self._db()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} "
+                         f"WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished_at < ?",
+                         (*FINISHED, before))
+
+
+def make_store(path: str = JOB_DB, table: str = "jobs") -> JobStore:
+    return SQLiteJobStore(path, table) if path else MemoryJobStore()
+
+
+class JobQueue:
+    """
+    Runs fn(**payload) on a bounded thread pool so the web worker returns immediately
+    Analyses are I/O-bound API calls, so threads keep the worker free to serve requests.
+    """
+
+    def __init__(self, fn: Callable[..., dict], store: Optional[JobStore] = None,
+                 workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_MAX):
+        self.fn = fn
+        self.store = store or make_store()
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """This process's pool (created lazily, so a pre-forking server gives each worker its own)"""
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._pid = os.getpid()
+            self._futures = {}
+        return self._executor
+
+    def submit(self, **payload) -> dict:
+        job = {"id": uuid.uuid4().hex, "status": QUEUED, "created_at": time.time(),
+               "started_at": None, "finished_at": None, "result": None, "error": None}
+        with self._lock:
+            pool = self._pool()
+            if len(self._futures) >= self.max_pending:
+                raise QueueFull(f"Too many pending jobs ({self.max_pending}), try again later")
+            self.store.create(job)
+            future = pool.submit(self._run, job["id"], payload)
+            self._futures[job["id"]] = future
+        future.add_done_callback(lambda _, job_id=job["id"]: self._forget(job_id))
+        if random.random() < 0.05:  # Amortized cleanup of old finished jobs
+            self.store.purge(time.time() - JOB_TTL)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job and job["status"] == RUNNING and time.time() - (job["started_at"] or job["created_at"]) > JOB_TIMEOUT:
+            # The worker running it died (restart, OOM kill); nobody will finish it
+            self.store.transition(job_id, (RUNNING,), FAILED, finished_at=time.time(), error="Job timed out")
+            job = self.store.get(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued or running job; a running analysis finishes but its result is discarded"""
+        if self.store.transition(job_id, (QUEUED, RUNNING), CANCELLED, finished_at=time.time()):
+            with self._lock:
+                future = self._futures.get(job_id)
+            if future is not None:
+                future.cancel()  # Frees the queue slot if it has not started yet
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(not f.done() for f in self._futures.values())
+        return {"workers": self.workers, "pending": pending, "max_pending": self.max_pending}
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str, payload: dict):
+        # Jobs cancelled while queued (possibly from another worker) never start
+        if not self.store.transition(job_id, (QUEUED,), RUNNING, started_at=time.time()):
+            return
+        try:
+            result = self.fn(**payload)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.transition(job_id, (RUNNING,), FAILED, finished_at=time.time(), error=str(e))
+            return
+        self.store.transition(job_id, (RUNNING,), DONE, finished_at=time.time(), result=result)
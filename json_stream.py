@@ -0,0 +1,110 @@
+# json_stream.py - Incremental parser that emits top-level JSON fields as soon as they complete
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+WHITESPACE = " \t\r\n"
+
+
+class StreamingJSONParser:
+    """
+    Feed model output piece by piece; get (key, value) events for the top-level object.
+    Scalar fields are emitted once complete ("summary", "..."); array fields are emitted
+    element by element ("action_items", {...}), so a UI can render each item as it arrives.
+    Text before the first '{' (preambles, code fences) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []  # Open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None  # Current top-level key
+        self._expect_key = False
+        self._token_start: Optional[int] = None  # Start of the key/value being read
+        self._array_key: Optional[str] = None  # Top-level key whose array we are inside
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self.buffer += text
+        return list(self._scan())
+
+    def _scan(self) -> Iterator[Tuple[str, Any]]:
+        buf = self.buffer
+        while self._pos < len(buf) and not self.done:
+            ch = buf[self._pos]
+            i = self._pos
+            self._pos += 1
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    yield from self._string_closed(i, depth)
+                continue
+
+            if depth == 0:
+                if ch == "{":
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._token_start is None and depth in (1, 2):
+                    self._token_start = i
+            elif ch in "{[":
+                if self._token_start is None and depth in (1, 2):
+                    self._token_start = i
+                if depth == 1 and ch == "[" and self._token_start == i:
+                    # A top-level array: its elements are emitted individually
+                    self._array_key, self._token_start = self._key, None
+                self._stack.append(ch)
+            elif ch in "}]":
+                yield from self._flush_primitive(i, depth)
+                self._stack.pop()
+                depth -= 1
+                if depth == 0:
+                    self.done = True
+                elif depth == 1 and ch == "]" and self._array_key is not None:
+                    self._array_key = None
+                elif self._token_start is not None and depth in (1, 2) and self._closes_token(depth):
+                    yield from self._emit(self._token_start, i + 1, depth)
+            elif ch == ",":
+                yield from self._flush_primitive(i, depth)
+                if depth == 1:
+                    self._expect_key = True
+            elif ch == ":":
+                pass
+            elif ch not in WHITESPACE and self._token_start is None and depth in (1, 2):
+                self._token_start = i  # number / true / false / null
+
+    def _closes_token(self, depth: int) -> bool:
+        """True if the container just closed is the value that started at the token start"""
+        return depth == 1 or self._array_key is not None
+
+    def _string_closed(self, i: int, depth: int) -> Iterator[Tuple[str, Any]]:
+        if depth == 1 and self._expect_key:
+            self._key = json.loads(self.buffer[self._token_start:i + 1])
+            self._token_start = None
+            self._expect_key = False
+        elif self._token_start is not None and (depth == 1 or (depth == 2 and self._array_key is not None)):
+            yield from self._emit(self._token_start, i + 1, depth)
+
+    def _flush_primitive(self, i: int, depth: int) -> Iterator[Tuple[str, Any]]:
+        if self._token_start is not None and self.buffer[self._token_start] not in '"{[':
+            yield from self._emit(self._token_start, i, depth)
+
+    def _emit(self, start: int, end: int, depth: int) -> Iterator[Tuple[str, Any]]:
+        key = self._key if depth == 1 else self._array_key
+        self._token_start = None
+        try:
+            value = json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            return
+        if key is not None:
+            yield key, value
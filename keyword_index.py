@@ -0,0 +1,169 @@
+# keyword_index.py - Incremental inverted index with BM25 scoring
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+K1 = 1.5
+B = 0.75
+STORE_FILE = "chunks.json"
+POSTING_BYTES = 100  # Rough cost of one postings entry (dict slot + int objects)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Postings lists (term -> {chunk_id: tf}) kept up to date as documents come and go"""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._bounds: Dict[str, Tuple[int, int]] = {}  # term -> (max tf, min chunk length), for score upper bounds
+        self._lengths: Dict[int, int] = {}  # chunk_id -> token count
+        self._texts: Dict[int, str] = {}
+        self._doc_chunks: Dict[str, List[int]] = {}  # doc_id -> chunk_ids
+        self._total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self.version = 0  # Bumped on every change
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def clear(self):
+        with self._lock:
+            self._postings, self._bounds, self._lengths, self._texts, self._doc_chunks = {}, {}, {}, {}, {}
+            self._total_length = 0
+            self.version += 1
+
+    def rebuild(self, texts: List[str], doc_ids: List[str]):
+        """Atomically replace the whole index"""
+        with self._lock:
+            self.clear()
+            self.add(texts, doc_ids)
+
+    def add(self, texts: List[str], doc_ids: List[str], replace=()):
+        """Index chunks; rows of documents listed in `replace` are dropped in the same step"""
+        with self._lock:
+            if replace:
+                self.remove_docs(replace)
+            for text, doc_id in zip(texts, doc_ids):
+                chunk_id = self._next_id
+                self._next_id += 1
+                tokens = tokenize(text)
+                for term, tf in Counter(tokens).items():
+                    self._postings.setdefault(term, {})[chunk_id] = tf
+                    max_tf, min_len = self._bounds.get(term, (0, len(tokens)))
+                    self._bounds[term] = (max(max_tf, tf), min(min_len, len(tokens)))
+                self._lengths[chunk_id] = len(tokens)
+                self._total_length += len(tokens)
+                self._texts[chunk_id] = text
+                self._doc_chunks.setdefault(doc_id, []).append(chunk_id)
+            if texts:
+                self.version += 1
+
+    def remove_docs(self, doc_ids) -> List[str]:
+        """Drop every chunk owned by the given documents, returning the IDs that existed"""
+        with self._lock:
+            removed = [d for d in dict.fromkeys(doc_ids) if d in self._doc_chunks]
+            for doc_id in removed:
+                for chunk_id in self._doc_chunks.pop(doc_id):
+                    for term in set(tokenize(self._texts.pop(chunk_id))):
+                        postings = self._postings[term]
+                        del postings[chunk_id]
+                        if not postings:
+                            # Bounds are left as-is otherwise: stale bounds are still valid upper bounds
+                            del self._postings[term]
+                            del self._bounds[term]
+                    self._total_length -= self._lengths.pop(chunk_id)
+            if removed:
+                self.version += 1
+            return removed
+
+    def documents(self) -> Dict[str, int]:
+        """Return {doc_id: chunk count} for every indexed document"""
+        return {doc_id: len(chunk_ids) for doc_id, chunk_ids in self._doc_chunks.items()}
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint of postings, lengths and chunk texts"""
+        postings = sum(len(p) for p in self._postings.values())
+        return POSTING_BYTES * (postings + len(self._texts)) + sum(len(t) for t in self._texts.values())
+
+    def save(self, path: str):
+        """Write chunk texts and owners to path/chunks.json (atomic replace); postings are rebuilt on load"""
+        with self._lock:
+            texts, doc_ids = [], []
+            for doc_id, chunk_ids in self._doc_chunks.items():
+                texts.extend(self._texts[c] for c in chunk_ids)
+                doc_ids.extend([doc_id] * len(chunk_ids))
+            os.makedirs(path, exist_ok=True)
+            tmp = os.path.join(path, STORE_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "texts": texts, "doc_ids": doc_ids}, f)
+            os.replace(tmp, os.path.join(path, STORE_FILE))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Index saved at path, or an empty one if nothing was saved there"""
+        index = cls()
+        try:
+            with open(os.path.join(path, STORE_FILE), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return index
+        index.add(data["texts"], data["doc_ids"])
+        index.version = data["version"]
+        return index
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[float, str]]:
+        """
+        Top-k (score, text) by BM25 with MaxScore-style early termination.
+        Terms are visited from highest to lowest score upper bound. Once the k-th best score
+        beats everything the remaining terms could add, no new chunk can enter the top-k:
+        the remaining terms only rescore the surviving candidates, which are pruned as they
+        fall out of reach.
+        """
+        with self._lock:
+            n = len(self._texts)
+            if n == 0 or k <= 0:
+                return []
+            avgdl = self._total_length / n or 1.0
+
+            terms = []
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings:
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    max_tf, min_len = self._bounds[term]
+                    upper = idf * max_tf * (K1 + 1) / (max_tf + K1 * (1 - B + B * min_len / avgdl))
+                    terms.append((upper, idf, postings))
+            terms.sort(key=lambda t: t[0], reverse=True)
+
+            remaining = sum(t[0] for t in terms)
+            scores: Dict[int, float] = {}
+            closed = False  # Once true, no chunk outside `scores` can reach the top-k
+            for upper, idf, postings in terms:
+                if closed:
+                    items = [(c, postings[c]) for c in scores if c in postings]
+                else:
+                    items = postings.items()
+                for chunk_id, tf in items:
+                    norm = K1 * (1 - B + B * self._lengths[chunk_id] / avgdl)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                remaining = max(remaining - upper, 0.0)
+                if len(scores) >= k:
+                    threshold = heapq.nlargest(k, scores.values())[-1]
+                    if threshold >= remaining:
+                        closed = True
+                        # Drop candidates that can no longer catch up with the current k-th best
+                        scores = {c: s for c, s in scores.items() if s + remaining >= threshold}
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(score, self._texts[chunk_id]) for chunk_id, score in best]
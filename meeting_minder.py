@@ -1,56 +1,181 @@
 # meeting_minder.py
-from flask import Flask, request, jsonify
+from startup import profile  # First import: starts the startup clock
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-import requests
+import gc
 import json
-import re
-from typing import List
+import time
+import threading
+from typing import Dict, List, Optional
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+
+import http_client
+from batch import BATCH_CONCURRENCY, parse_batch, run_batch
+from documents import batched, chunk_docs, parse_docs
+from embedding_cache import EmbeddingCache
+from index_manager import DEFAULT_NAMESPACE, IndexManager, namespace_from_request
+from ingest import get_upload, ingest_upload, is_streamed
+from jobs import JobQueue, QueueFull
+from metrics import CONTENT_TYPE, INDEX_BYTES, INDEX_CHUNKS, instrument, record_tokens, registry, timed
+from model_output import ANALYSIS_KEYS, analysis_fields, bullet_items, extract_json, split_sections
+from profiling import instrument_timing
+from prompt_budget import CONTEXT_SHARE, TokenCounter, fit_prompt
+from response_cache import ResultCache, cache_key
+from retrieval import multi_query
+from segments import SEGMENT_TOKENS, estimate_tokens, format_summaries, map_reduce, segment_transcript
+from index_store import IndexStore
+
+profile.mark("imports")
 
 # Configuration
 HF_TOKEN = os.getenv("HF_TOKEN")
-HF_BASE = "https://api-inference.huggingface.co/models"
+HF_BASE = os.getenv("HF_BASE", "https://api-inference.huggingface.co/models")
 GEN_MODEL = "facebook/bart-large-cnn"  # Updated: Using BART for summarization
 EMBED_MODEL = "BAAI/bge-large-en-v1.5"  # Updated: Using BGE for embeddings
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "1024"))  # bart-large-cnn reads at most 1024 input tokens
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", GEN_MODEL)  # Tokenizer used to count them; empty = estimate
+INDEX_DIR = os.getenv("INDEX_DIR", "index_store")  # One subdirectory per namespace, shared by all gunicorn workers
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))  # Chunks embedded (and held in flight) at once
+EMBED_PRELOAD = os.getenv("EMBED_PRELOAD", "0") == "1"  # Load the model at import (for gunicorn --preload)
 
 HEADERS = {"Authorization": f"Bearer {HF_TOKEN}"}
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend access
-
-# ----------------- Simple in-memory FAISS (for RAG) -----------------
-embedder = SentenceTransformer(EMBED_MODEL)
-index = None
-index_texts = []
-
-def build_index(text_chunks: List[str]):
-    """Build FAISS index from text chunks"""
-    global index, index_texts
-    if not text_chunks:
-        return
+CORS(app, expose_headers=["Server-Timing", "X-Cache", "X-Profile"])  # Enable CORS for frontend access
+instrument(app)  # Request latency histograms for /metrics
+instrument_timing(app)  # Server-Timing on /summarize and /upload_docs, sampling profiler if enabled
+
+# ----------------- Persistent FAISS indexes (for RAG) -----------------
+# Each namespace (team) has its own index on disk, memory-mapped by every worker, so an upload
+# handled by one gunicorn worker is visible to all of them (and survives restarts).
+# IndexStore reloads itself when another worker publishes, so the manager need not watch files.
+indexes = IndexManager(INDEX_DIR, IndexStore, watch=False)
+embedding_cache = EmbeddingCache(EMBED_MODEL)
+
+# ----------------- Embedding model (lazy) -----------------
+# Loading bge-large (and importing torch) takes seconds and ~1.3 GB, so it happens on first use,
+# or once in the gunicorn master with EMBED_PRELOAD=1 + --preload so workers share it copy-on-write.
+_embedder = None
+_embedder_lock = threading.Lock()
+_embedder_loading = False
+_embedder_error: Optional[str] = None
+
+def get_embedder():
+    """Return the SentenceTransformer, loading it on first call"""
+    global _embedder, _embedder_error
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                started = time.perf_counter()
+                try:
+                    from sentence_transformers import SentenceTransformer  # Imports torch, so deferred too
+                    model = SentenceTransformer(EMBED_MODEL)
+                except Exception as e:
+                    _embedder_error = str(e)
+                    raise
+                profile.record("model_load", time.perf_counter() - started)
+                print(f"✓ Loaded {EMBED_MODEL} in {time.perf_counter() - started:.1f}s")
+                _embedder, _embedder_error = model, None
+    return _embedder
+
+def load_embedder_in_background():
+    """Start loading the model without blocking the caller (no-op if loaded or already loading)"""
+    global _embedder_loading
+    with _embedder_lock:
+        if _embedder is not None or _embedder_loading:
+            return
+        _embedder_loading = True
+    
+    def load():
+        global _embedder_loading
+        try:
+            get_embedder()
+        except Exception as e:
+            print(f"⚠️  Embedding model failed to load: {e}")
+        finally:
+            _embedder_loading = False
     
-    vectors = embedder.encode(text_chunks, show_progress_bar=False, convert_to_numpy=True)
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
-    index_texts = text_chunks.copy()
-    print(f"✓ Built FAISS index with {len(text_chunks)} chunks")
-
-def query_index(query: str, k=3):
+    threading.Thread(target=load, name="embedder-load", daemon=True).start()
+
+def encode_chunks(chunks: List[str]) -> np.ndarray:
+    """Embed chunks, encoding only texts that are not already in the embedding cache"""
+    vectors = embedding_cache.get_many(chunks)
+    missing = list(dict.fromkeys(c for c, v in zip(chunks, vectors) if v is None))
+    if missing:
+        with timed("embedding"):
+            fresh = get_embedder().encode(missing, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False,
+                                          convert_to_numpy=True)
+        embedding_cache.put_many(missing, fresh)
+        by_text = dict(zip(missing, fresh))
+        vectors = [v if v is not None else by_text[c] for c, v in zip(chunks, vectors)]
+    print(f"  Encoded {len(missing)} new chunks, {len(chunks) - len(missing)} from cache")
+    return np.vstack(vectors)
+
+def embed_docs(doc_chunks: Dict[str, List[str]]):
+    """Embed the chunks of several documents EMBED_BATCH_SIZE at a time, written straight into per-document arrays"""
+    vectors: Dict[str, np.ndarray] = {}
+    filled = dict.fromkeys(doc_chunks, 0)
+    pairs = ((doc_id, chunk) for doc_id, chunks in doc_chunks.items() for chunk in chunks)
+    for batch in batched(pairs, EMBED_BATCH_SIZE):
+        for (doc_id, _), vector in zip(batch, encode_chunks([chunk for _, chunk in batch])):
+            if doc_id not in vectors:
+                vectors[doc_id] = np.empty((len(doc_chunks[doc_id]), len(vector)), dtype=np.float32)
+            vectors[doc_id][filled[doc_id]] = vector
+            filled[doc_id] += 1
+    return {doc_id: (vectors.get(doc_id, np.zeros((0, 1))), chunks) for doc_id, chunks in doc_chunks.items()}
+
+def build_index(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Rebuild the FAISS index from per-document chunks and publish it to all workers"""
+    embedded = embed_docs(doc_chunks)
+    with timed("index_write"), indexes.edit(namespace) as index_store:
+        version = index_store.rebuild(embedded)
+    print(f"✓ Built FAISS index '{namespace}' v{version} with {sum(map(len, doc_chunks.values()))} chunks")
+
+def upsert_documents(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Embed only the given documents and add/replace them in the index"""
+    embedded = embed_docs(doc_chunks)
+    with timed("index_write"), indexes.edit(namespace) as index_store:
+        version = index_store.upsert(embedded)
+    print(f"✓ Updated FAISS index '{namespace}' v{version}: {len(doc_chunks)} document(s)")
+
+def delete_documents(doc_ids: List[str], namespace: str = DEFAULT_NAMESPACE) -> List[str]:
+    """Remove documents from the index, returning the IDs that existed"""
+    existing = [d for d in doc_ids if d in list_documents(namespace)]
+    if existing:
+        with indexes.edit(namespace) as index_store:
+            version = index_store.delete(existing)
+        print(f"✓ Updated FAISS index '{namespace}' v{version}: deleted {len(existing)} document(s)")
+    return existing
+
+def list_documents(namespace: str = DEFAULT_NAMESPACE) -> Dict[str, int]:
+    """Return {doc_id: chunk count} for every indexed document"""
+    return indexes.get(namespace).documents()
+
+def index_version(namespace: str = DEFAULT_NAMESPACE) -> int:
+    return indexes.get(namespace).version
+
+def query_index(query: str, k=3, namespace: str = DEFAULT_NAMESPACE):
     """Query FAISS index for top-k relevant chunks"""
-    if index is None or index.ntotal == 0:
+    index_store = indexes.get(namespace)
+    if index_store.ntotal == 0:
         return []
     
-    qv = embedder.encode([query], convert_to_numpy=True)
-    D, I = index.search(qv, k)
-    results = []
-    for idx in I[0]:
-        if idx < len(index_texts):
-            results.append(index_texts[idx])
-    return results
+    with timed("embedding"):
+        qv = get_embedder().encode([query], convert_to_numpy=True)
+    with timed("search"):
+        return index_store.search(qv, k)
+
+def query_index_batch(queries: List[str], k=3, namespace: str = DEFAULT_NAMESPACE) -> List[List[str]]:
+    """Top-k chunks for several queries: one batched encode and one FAISS search"""
+    index_store = indexes.get(namespace)
+    if index_store.ntotal == 0 or not queries:
+        return [[] for _ in queries]
+    
+    with timed("embedding"):
+        qv = get_embedder().encode(queries, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
+    with timed("search"):
+        return index_store.search_batch(qv, k)
 
 # ----------------- HF Inference helpers -----------------
 def hf_generate(prompt: str, max_new_tokens=400):
@@ -67,20 +192,113 @@ def hf_generate(prompt: str, max_new_tokens=400):
     }
     
     try:
-        r = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+        with timed("llm_call"):
+            r = http_client.post(url, read_timeout=60, headers=HEADERS, json=payload)
         r.raise_for_status()
         out = r.json()
         
         # Parse output; flan-t5 often returns list with 'generated_text'
         if isinstance(out, list) and len(out) > 0:
-            if "generated_text" in out[0]:
-                return out[0]["generated_text"]
-            return str(out[0])
-        return str(out)
+            generated = out[0]["generated_text"] if "generated_text" in out[0] else str(out[0])
+        else:
+            generated = str(out)
+        record_tokens(GEN_MODEL, estimate_tokens(prompt), estimate_tokens(generated))  # HF reports no usage
+        return generated
     except Exception as e:
         print(f"Error calling HF API: {e}")
         raise
 
+# ----------------- Analysis -----------------
+PROMPT_TEMPLATE = """You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+
+{context_block}
+Meeting Transcript:
+{transcript}
+
+Please analyze this meeting and provide:
+
+1. SUMMARY: A concise 3-4 sentence summary of the meeting
+2. ACTION_ITEMS: List of action items in this exact JSON format:
+   [{{"task": "description", "assignee": "person name", "due": "suggested date"}}]
+3. DECISIONS: Key decisions made during the meeting
+4. OPEN_QUESTIONS: Unresolved questions or topics for follow-up
+
+Format your response as valid JSON with these exact keys: summary, action_items, decisions, open_questions
+"""
+
+result_cache = ResultCache()
+prompt_tokens = TokenCounter(PROMPT_TOKENIZER)
+
+def render_prompt(transcript: str, chunks: List[str]) -> str:
+    """The generation prompt for a transcript and its ranked RAG context chunks"""
+    rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(chunks)])
+    context_block = f"Relevant context from company documents:\n{rag_context}\n" if rag_context else ""
+    return PROMPT_TEMPLATE.format(context_block=context_block, transcript=transcript)
+
+def segment_tokens() -> int:
+    """Transcript tokens per map-reduce segment: what fits one prompt next to its share of context"""
+    room = PROMPT_MAX_TOKENS - prompt_tokens.count(render_prompt("", []))
+    return max(100, int(room * (1 - CONTEXT_SHARE)))
+
+def analyze_segment(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Run RAG retrieval + generation + parsing for one transcript (or one segment of it)"""
+    # Retrieve RAG context if enabled
+    top = []
+    if include_docs and indexes.get(namespace).ntotal > 0:
+        # One query per transcript segment, fused by rank: long transcripts aren't truncated or blurred
+        with timed("retrieval"):
+            top = multi_query(transcript, lambda queries, depth: query_index_batch(queries, depth, namespace), k=3)
+    
+    # Construct prompt for the model, compressed to fit its input window (the model would silently cut the rest)
+    with timed("prompt_build"):
+        compact, chunks, tokens = fit_prompt(render_prompt, transcript, top, PROMPT_MAX_TOKENS, prompt_tokens)
+        prompt = render_prompt(compact, chunks)
+
+    # Call HF Inference API
+    print(f"Calling HF Inference API ({tokens['prompt']} prompt tokens, {tokens['saved']} saved)...")
+    generated = hf_generate(prompt, max_new_tokens=500)
+    print(f"Generated response: {generated[:200]}...")
+    
+    # Try to extract JSON from response
+    with timed("parse"):
+        result = parse_model_output(generated, transcript)
+    result["tokens"] = tokens
+    return result
+
+def combine_summaries(summaries: List[str]) -> str:
+    """Condense per-segment summaries into one"""
+    return hf_generate(format_summaries(summaries), max_new_tokens=200)
+
+def analyze_transcript(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Single pass for short transcripts; map-reduce over speaker-turn segments for long ones"""
+    segments = segment_transcript(transcript, min(SEGMENT_TOKENS, segment_tokens()))
+    if len(segments) == 1:
+        result = analyze_segment(transcript, include_docs, namespace)
+    else:
+        print(f"Long transcript: analyzing {len(segments)} segments in parallel...")
+        result = map_reduce(segments, lambda segment: analyze_segment(segment, include_docs, namespace), combine_summaries)
+    
+    # Add email-ready summary
+    with timed("email"):
+        result["email_summary"] = generate_email_summary(result)
+    return result
+
+def analyze_cached(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE):
+    """analyze_transcript() behind the result cache; returns (result, cache_hit)"""
+    key = cache_key(transcript, include_docs, [namespace, index_version(namespace)], GEN_MODEL, f"{PROMPT_TEMPLATE}|{PROMPT_MAX_TOKENS}")
+    result = result_cache.get(key)
+    if result is not None:
+        return result, True
+    result = analyze_transcript(transcript, include_docs, namespace)
+    result_cache.set(key, result)
+    return result, False
+
+def run_analysis_job(transcript: str, include_docs: bool, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Job body for async /summarize requests"""
+    return analyze_cached(transcript, include_docs, namespace)[0]
+
+job_queue = JobQueue(run_analysis_job)
+
 # ----------------- API Endpoints -----------------
 @app.route("/", methods=["GET"])
 def home():
@@ -88,40 +306,156 @@ def home():
     return jsonify({
         "status": "running",
         "service": "Meeting Minder API",
-        "endpoints": ["/upload_docs", "/summarize"]
+        "endpoints": ["/ready", "/upload_docs", "/uploads/<upload_id>", "/docs", "/docs/<doc_id>", "/namespaces", "/summarize", "/summarize_batch", "/jobs/<job_id>", "/cache_stats", "/metrics"]
     })
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness check, separate from the "/" liveness check: 200 once the embedding model is loaded
+    The first call starts loading it in the background; until then this answers 503.
+    """
+    if _embedder is None:
+        load_embedder_in_background()
+    body = {"ready": _embedder is not None, "model": EMBED_MODEL, "startup": profile.report()}
+    if _embedder_error:
+        body["error"] = _embedder_error
+    return jsonify(body), 200 if body["ready"] else 503
+
 @app.route("/upload_docs", methods=["POST"])
 def upload_docs():
     """
-    Upload documents for RAG context
-    Expects JSON: { "docs": ["text1", "text2", ...] }
+    Upload documents for RAG context (replaces the whole index of the request's namespace)
+    Expects JSON: { "docs": ["text1", {"id": "handbook", "text": "text2"}, ...] }
+    Or stream NDJSON (one {"id", "text"} per line) or multipart text/markdown files: documents are
+    indexed as they arrive and progress is at /uploads/<upload_id> (choose the ID with X-Upload-Id).
     """
     try:
-        docs = request.json.get("docs", [])
+        namespace = namespace_from_request(request)
+        if is_streamed(request):
+            upload = ingest_upload(request, namespace,
+                                   upsert=lambda doc_chunks: upsert_documents(doc_chunks, namespace),
+                                   delete=lambda doc_ids: delete_documents(doc_ids, namespace),
+                                   existing=list(list_documents(namespace)))
+            return jsonify({**upload, "status": "indexed", "index_version": index_version(namespace)})
+        docs = parse_docs(request.json.get("docs", []))
         
         if not docs:
             return jsonify({"error": "No documents provided"}), 400
         
-        # Chunk docs (naive: split by paragraphs)
-        chunks = []
-        for d in docs:
-            # Split by double newlines (paragraphs)
-            for p in d.split("\n\n"):
-                p = p.strip()
-                if p and len(p) > 20:  # Ignore very short chunks
-                    chunks.append(p)
+        doc_chunks = chunk_docs(docs)
+        chunk_count = sum(map(len, doc_chunks.values()))
+        if not chunk_count:
+            return jsonify({"error": "No valid chunks extracted"}), 400
         
-        if not chunks:
+        build_index(doc_chunks, namespace)
+        return jsonify({
+            "status": "indexed",
+            "chunks": chunk_count,
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items()},
+            "namespace": namespace,
+            "index_version": index_version(namespace),
+            "message": f"Successfully indexed {chunk_count} document chunks"
+        })
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Progress of a streamed /upload_docs: documents, chunks indexed, bytes read"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload)
+
+@app.route("/docs", methods=["GET"])
+def list_docs():
+    """List indexed documents with their chunk counts"""
+    try:
+        namespace = namespace_from_request(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"documents": list_documents(namespace), "namespace": namespace,
+                    "index_version": index_version(namespace), "index": indexes.get(namespace).info()})
+
+@app.route("/namespaces", methods=["GET"])
+def list_namespaces():
+    """Known document namespaces, plus which are loaded in this worker and their memory footprint"""
+    return jsonify({"namespaces": indexes.namespaces(), **indexes.stats()})
+
+@app.route("/docs", methods=["POST"])
+def add_docs():
+    """
+    Append documents without rebuilding the index (same doc ID replaces the old version)
+    Expects JSON: { "docs": [{"id": "handbook", "text": "..."}, "plain text", ...] }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        docs = parse_docs(request.json.get("docs", []))
+        if not docs:
+            return jsonify({"error": "No documents provided"}), 400
+        
+        doc_chunks = chunk_docs(docs)
+        if not any(doc_chunks.values()):
             return jsonify({"error": "No valid chunks extracted"}), 400
         
-        build_index(chunks)
+        upsert_documents(doc_chunks, namespace)
         return jsonify({
             "status": "indexed",
-            "chunks": len(chunks),
-            "message": f"Successfully indexed {len(chunks)} document chunks"
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items()},
+            "namespace": namespace,
+            "index_version": index_version(namespace)
         })
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["PUT"])
+def replace_doc(doc_id):
+    """
+    Replace (or create) a single document
+    Expects JSON: { "text": "..." }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        text = request.json.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return jsonify({"error": "No text provided"}), 400
+        
+        doc_chunks = chunk_docs([(doc_id, text)])
+        if not doc_chunks[doc_id]:
+            return jsonify({"error": "No valid chunks extracted"}), 400
+        
+        upsert_documents(doc_chunks, namespace)
+        return jsonify({
+            "status": "indexed",
+            "documents": {doc_id: len(doc_chunks[doc_id])},
+            "namespace": namespace,
+            "index_version": index_version(namespace)
+        })
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["DELETE"])
+def delete_doc(doc_id):
+    """Remove a single document from the index"""
+    try:
+        namespace = namespace_from_request(request)
+        if not delete_documents([doc_id], namespace):
+            return jsonify({"error": f"Unknown document: {doc_id}"}), 404
+        return jsonify({"status": "deleted", "id": doc_id, "namespace": namespace,
+                        "index_version": index_version(namespace)})
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -131,7 +465,8 @@ def summarize():
     Analyze meeting transcript and extract insights
     Expects JSON: {
         "transcript": "meeting text...",
-        "use_docs": true/false (optional, default: true)
+        "use_docs": true/false (optional, default: true),
+        "async": true/false (optional, default: false - true returns 202 with a job_id to poll at /jobs/<id>)
     }
     """
     try:
@@ -141,120 +476,121 @@ def summarize():
         
         if not transcript:
             return jsonify({"error": "No transcript provided"}), 400
+        try:
+            namespace = namespace_from_request(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Retrieve RAG context if enabled
-        rag_context = ""
-        if include_docs and index is not None and index.ntotal > 0:
-            top = query_index(transcript, k=3)
-            if top:
-                rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(top)])
+        if data.get("async"):
+            job = job_queue.submit(transcript=transcript, include_docs=include_docs, namespace=namespace)
+            response = jsonify({"job_id": job["id"], "status": job["status"]})
+            response.headers["Location"] = f"/jobs/{job['id']}"
+            return response, 202
         
-        # Construct prompt for the model
-        prompt = f"""You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+        result, hit = analyze_cached(transcript, include_docs, namespace)
+        response = jsonify(result)
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        return response
+    
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Error in summarize: {e}")
+        return jsonify({"error": str(e)}), 500
 
-{f"Relevant context from company documents:\n{rag_context}\n" if rag_context else ""}
-Meeting Transcript:
-{transcript}
+@app.route("/summarize_batch", methods=["POST"])
+def summarize_batch():
+    """
+    Analyze many transcripts in one request
+    Body: JSON {"items": [{"id": "...", "transcript": "...", "use_docs": true}, ...], "use_docs": true}
+          (or a bare list), or NDJSON with one item per line (Content-Type: application/x-ndjson)
+    Streams NDJSON back as items finish: {"id", "index", "status": "ok", "cached", "result"} or
+    {"id", "index", "status": "error", "error"}, then {"status": "complete", "items", "ok", "failed"}
+    """
+    try:
+        namespace = namespace_from_request(request)
+        items = parse_batch(request.get_data(), request.content_type or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        concurrency = int(request.args.get("concurrency", BATCH_CONCURRENCY))
+    except ValueError:
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+    
+    print(f"Batch of {len(items)} transcripts, concurrency {concurrency}")
+    def analyze(transcript, include_docs):
+        return analyze_cached(transcript, include_docs, namespace)
+    
+    lines = (json.dumps(record) + "\n" for record in run_batch(items, analyze, concurrency))
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
 
-Please analyze this meeting and provide:
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Status of an async /summarize job
+    status: queued | running | done | failed | cancelled; "result" holds the /summarize response once done
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
 
-1. SUMMARY: A concise 3-4 sentence summary of the meeting
-2. ACTION_ITEMS: List of action items in this exact JSON format:
-   [{{"task": "description", "assignee": "person name", "due": "suggested date"}}]
-3. DECISIONS: Key decisions made during the meeting
-4. OPEN_QUESTIONS: Unresolved questions or topics for follow-up
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job (a running analysis is left to finish, its result is discarded)"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
 
-Format your response as valid JSON with these exact keys: summary, action_items, decisions, open_questions
-"""
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Result cache hit/miss counters for this worker"""
+    return jsonify(result_cache.stats())
 
-        # Call HF Inference API
-        print("Calling HF Inference API...")
-        generated = hf_generate(prompt, max_new_tokens=500)
-        print(f"Generated response: {generated[:200]}...")
-        
-        # Try to extract JSON from response
-        result = parse_model_output(generated, transcript)
-        
-        # Add email-ready summary
-        result["email_summary"] = generate_email_summary(result)
-        
-        return jsonify(result)
-    
-    except Exception as e:
-        print(f"Error in summarize: {e}")
-        return jsonify({"error": str(e)}), 500
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms and upstream / retry / cache / token counters,
+    summed over all workers, plus the size of each index loaded in this worker
+    """
+    INDEX_CHUNKS.clear()
+    INDEX_BYTES.clear()
+    for namespace, store in indexes.loaded().items():
+        INDEX_CHUNKS.set(store.ntotal, namespace=namespace)
+        INDEX_BYTES.set(store.memory_bytes(), namespace=namespace)
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
 def parse_model_output(generated: str, transcript: str):
     """Parse model output and extract structured data"""
-    # Try to find JSON in the response
-    json_match = re.search(r'\{[\s\S]*\}', generated)
-    
-    if json_match:
-        try:
-            result = json.loads(json_match.group(0))
-            # Validate required keys
-            if all(k in result for k in ["summary", "action_items", "decisions", "open_questions"]):
-                return result
-        except json.JSONDecodeError:
-            pass
+    # One linear scan for the JSON object; output cut off mid-object is repaired, not thrown away
+    found = analysis_fields(extract_json(generated))
+    if all(k in found for k in ANALYSIS_KEYS):
+        return found
     
-    # Fallback: parse manually
+    # Fallback: the well-formed keys the JSON did have, the rest from headed sections ("SUMMARY: ...")
+    sections = split_sections(generated)
     result = {
-        "summary": extract_section(generated, ["SUMMARY", "Summary"], default="Meeting analysis completed."),
-        "action_items": extract_action_items(generated),
-        "decisions": extract_list(generated, ["DECISIONS", "Decisions"]),
-        "open_questions": extract_list(generated, ["OPEN_QUESTIONS", "Open Questions", "QUESTIONS"])
+        "summary": found.get("summary") or sections.get("summary") or "Meeting analysis completed.",
+        "action_items": found.get("action_items") or extract_action_items(generated, sections),
+        "decisions": found.get("decisions") or bullet_items(sections.get("decisions", "")),
+        "open_questions": found.get("open_questions") or bullet_items(sections.get("open_questions", ""))
     }
     
     return result
 
-def extract_section(text: str, headers: List[str], default: str = "") -> str:
-    """Extract text under a specific header"""
-    for header in headers:
-        pattern = rf"{header}:?\s*(.+?)(?=\n[A-Z_]+:|$)"
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            return match.group(1).strip()
-    return default
-
-def extract_list(text: str, headers: List[str]) -> List[str]:
-    """Extract bullet list under a header"""
-    for header in headers:
-        pattern = rf"{header}:?\s*(.+?)(?=\n[A-Z_]+:|$)"
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            content = match.group(1).strip()
-            # Extract bullet points
-            items = re.findall(r'[-•*]\s*(.+)', content)
-            if items:
-                return [item.strip() for item in items]
-            # Fallback: split by newlines
-            return [line.strip() for line in content.split('\n') if line.strip()]
-    return []
-
-def extract_action_items(text: str) -> List[dict]:
+def extract_action_items(text: str, sections: Dict[str, str]) -> List[dict]:
     """Extract action items from text"""
-    # Try to find JSON array
-    json_match = re.search(r'\[[\s\S]*?\]', text)
-    if json_match:
-        try:
-            items = json.loads(json_match.group(0))
-            if isinstance(items, list) and all(isinstance(i, dict) for i in items):
-                return items
-        except json.JSONDecodeError:
-            pass
-    
-    # Fallback: extract from bullet points
-    action_items = []
-    items = extract_list(text, ["ACTION_ITEMS", "Action Items", "ACTIONS"])
-    for item in items:
-        action_items.append({
-            "task": item,
-            "assignee": "TBD",
-            "due": "TBD"
-        })
+    # Try to find JSON array (in the action items section if there is one)
+    section = sections.get("action_items", "")
+    items = extract_json(section or text, "[")
+    if isinstance(items, list) and items and all(isinstance(i, dict) for i in items):
+        return items
     
-    return action_items
+    # Fallback: bullet points under the action items header
+    return [{"task": item, "assignee": "TBD", "due": "TBD"} for item in bullet_items(section)]
 
 def generate_email_summary(result: dict) -> str:
     """Generate email-ready summary"""
@@ -283,6 +619,14 @@ Action Items:
     return email
 
 # ----------------- Main -----------------
+profile.mark("app_setup")
+if EMBED_PRELOAD:
+    # With `gunicorn --preload` this runs once in the master and forked workers share the weights.
+    # No inference here: torch's thread pools must not be started before the fork.
+    get_embedder()
+    gc.freeze()  # Keep each worker's garbage collector from touching (and so copying) the shared objects
+profile.print_report()
+
 if __name__ == "__main__":
     if not HF_TOKEN:
         print("⚠️  WARNING: HF_TOKEN environment variable not set!")
@@ -292,7 +636,7 @@ if __name__ == "__main__":
     
     print("✓ Loading sentence transformer model...")
     # Warm up the embedder
-    _ = embedder.encode(["test"], show_progress_bar=False)
+    _ = get_embedder().encode(["test"], show_progress_bar=False)
     print("✓ Model loaded successfully")
     
     print("\n🚀 Starting Meeting Minder API on http://localhost:5000")
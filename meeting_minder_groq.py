@@ -1,52 +1,103 @@
 # meeting_minder_groq.py - Free version using Groq API
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-import requests
 import json
-import re
-from typing import List
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import http_client
+from batch import BATCH_CONCURRENCY, parse_batch, run_batch
+from documents import chunk_docs, flatten_chunks, parse_docs
+from hashed_embeddings import HashedIndex
+from index_manager import DEFAULT_NAMESPACE, IndexManager, namespace_from_request
+from ingest import get_upload, ingest_upload, is_streamed
+from jobs import JobQueue, QueueFull
+from json_stream import StreamingJSONParser
+from keyword_index import BM25Index
+from metrics import (CONTENT_TYPE, INDEX_BYTES, INDEX_CHUNKS, instrument, observe_stage, record_tokens,
+                     registry, timed)
+from model_output import ANALYSIS_KEYS, analysis_fields, bullet_items, extract_json, split_sections
+from profiling import RequestTimings, collect_timings, instrument_timing
+from prompt_budget import CONTEXT_SHARE, TokenCounter, fit_prompt
+from rate_limiter import RateLimiter, RateLimitTimeout, estimate_tokens
+from response_cache import ResultCache, cache_key
+from retrieval import multi_query
+from segments import SEGMENT_TOKENS, format_summaries, map_reduce, segment_transcript
 
 # Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_BASE = "https://api.groq.com/openai/v1"
+GROQ_BASE = os.getenv("GROQ_BASE", "https://api.groq.com/openai/v1")
 MODEL = "llama-3.3-70b-versatile"  # Fast and free on Groq
+INDEX_DIR = os.getenv("INDEX_DIR", "index_store")  # One subdirectory per namespace, shared by all workers
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "bm25")  # "bm25" keyword index or "hashed" TF-IDF vectors, both local
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))  # Account quota for MODEL; 0 disables that bucket
+GROQ_TPM = float(os.getenv("GROQ_TPM", "12000"))
+GROQ_JSON_MODE = os.getenv("GROQ_JSON_MODE", "1") == "1"  # JSON mode (response_format) for analyses; not used when streaming
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))  # Per analysis prompt; keeps two requests a minute under GROQ_TPM
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")  # HF tokenizer to count with (the Llama one is gated); empty = estimate
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Server-Timing", "X-Cache", "X-Profile"])
+instrument(app)  # Request latency histograms for /metrics
+instrument_timing(app)  # Server-Timing on /summarize and /upload_docs, sampling profiler if enabled
+
+# ----------------- Local document stores (no embedding API or model) -----------------
+# BM25 over an inverted index that is updated incrementally, not rescanned per query, or
+# (RETRIEVAL_BACKEND=hashed) hashed TF-IDF vectors searched by cosine similarity.
+# Each namespace (team) has its own index, saved under INDEX_DIR and loaded on demand.
+indexes = IndexManager(INDEX_DIR, HashedIndex.load if RETRIEVAL_BACKEND == "hashed" else BM25Index.load)
 
-# ----------------- Simple document store (no embeddings for simplicity) -----------------
-doc_texts = []
+def build_index(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Index document chunks for local retrieval"""
+    with timed("index_write"), indexes.edit(namespace) as store:
+        store.rebuild(*flatten_chunks(doc_chunks))
+    print(f"✓ Stored {len(store)} document chunks in '{namespace}'")
 
-def build_index(text_chunks: List[str]):
-    """Store document chunks for keyword-based retrieval"""
-    global doc_texts
-    doc_texts = text_chunks.copy()
-    print(f"✓ Stored {len(doc_texts)} document chunks")
+def upsert_documents(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Add documents, replacing any existing chunks with the same doc IDs"""
+    with timed("index_write"), indexes.edit(namespace) as store:
+        store.add(*flatten_chunks(doc_chunks), replace=list(doc_chunks))
+    print(f"✓ Updated {len(doc_chunks)} document(s) in '{namespace}', {len(store)} chunks total")
 
-def query_index(query: str, k=3):
-    """Simple keyword-based retrieval"""
-    if not doc_texts:
+def delete_documents(doc_ids: List[str], namespace: str = DEFAULT_NAMESPACE) -> List[str]:
+    """Remove documents from the store, returning the IDs that existed"""
+    if not set(doc_ids) & set(indexes.get(namespace).documents()):
         return []
-    
-    # Simple keyword matching (case-insensitive)
-    query_words = set(query.lower().split())
-    
-    # Score each document by keyword overlap
-    scored_docs = []
-    for doc in doc_texts:
-        doc_words = set(doc.lower().split())
-        overlap = len(query_words & doc_words)
-        if overlap > 0:
-            scored_docs.append((overlap, doc))
-    
-    # Sort by score and return top-k
-    scored_docs.sort(reverse=True, key=lambda x: x[0])
-    return [doc for _, doc in scored_docs[:k]]
+    with indexes.edit(namespace) as store:
+        return store.remove_docs(doc_ids)
+
+def index_version(namespace: str = DEFAULT_NAMESPACE) -> int:
+    return indexes.get(namespace).version
+
+def list_documents(namespace: str = DEFAULT_NAMESPACE) -> Dict[str, int]:
+    """Return {doc_id: chunk count} for every indexed document"""
+    return indexes.get(namespace).documents()
+
+def query_index(query: str, k=3, namespace: str = DEFAULT_NAMESPACE):
+    """Local retrieval: top-k chunks by BM25 score (or TF-IDF cosine similarity)"""
+    with timed("search"):
+        return [doc for _, doc in indexes.get(namespace).search(query, k)]
+
+def query_index_batch(queries: List[str], k=3, namespace: str = DEFAULT_NAMESPACE) -> List[List[str]]:
+    """Top-k chunks per query: one batched lookup when the store has one, else one query after another"""
+    store = indexes.get(namespace)
+    with timed("search"):
+        if hasattr(store, "search_batch"):
+            return [[doc for _, doc in hits] for hits in store.search_batch(queries, k)]
+        return [[doc for _, doc in store.search(query, k)] for query in queries]
 
 # ----------------- Groq API helpers -----------------
-def groq_chat(messages: List[dict], max_tokens=1000):
-    """Call Groq Chat Completion API"""
+# Every Groq call is admitted through shared request/token buckets, so bursts queue instead of hitting 429s
+groq_limiter = RateLimiter("groq", GROQ_RPM, GROQ_TPM)
+
+def settle_usage(cost: int, usage: dict):
+    """Settle a call's quota reservation and count its tokens, from the usage Groq reported"""
+    groq_limiter.settle(cost, usage.get("total_tokens"))
+    record_tokens(MODEL, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+def groq_chat(messages: List[dict], max_tokens=1000, json_mode=False):
+    """Call Groq Chat Completion API (json_mode: constrain the reply to a JSON object)"""
     url = f"{GROQ_BASE}/chat/completions"
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
@@ -58,16 +109,183 @@ def groq_chat(messages: List[dict], max_tokens=1000):
         "max_tokens": max_tokens,
         "temperature": 0.7
     }
+    if json_mode and GROQ_JSON_MODE:
+        payload["response_format"] = {"type": "json_object"}
+    
+    cost = estimate_tokens(messages, max_tokens)
+    waited = groq_limiter.acquire(cost)
+    if waited > 0.05:
+        print(f"  Waited {waited:.1f}s for Groq quota")
     
     try:
-        r = requests.post(url, headers=headers, json=payload, timeout=30)
+        with timed("llm_call"):
+            r = http_client.post(url, read_timeout=30, headers=headers, json=payload)
+        if r.status_code == 400 and "response_format" in payload and "json" in r.headers.get("Content-Type", ""):
+            # Groq rejects a reply that isn't valid JSON but includes it: repair it locally, no second request
+            body = r.json()
+            failed = (body.get("error") or {}).get("failed_generation")
+            if failed:
+                # The tokens were spent all the same; without reported usage the reservation stands
+                settle_usage(cost, body.get("usage") or {"prompt_tokens": estimate_tokens(messages, 0),
+                                                         "completion_tokens": len(failed) // 4 + 1})
+                return failed
         r.raise_for_status()
         result = r.json()
+        settle_usage(cost, result.get("usage", {}))
         return result["choices"][0]["message"]["content"]
     except Exception as e:
         print(f"Error calling Groq API: {e}")
         raise
 
+def groq_chat_stream(messages: List[dict], max_tokens=1000) -> Iterator[str]:
+    """Call Groq Chat Completion API in streaming mode, yielding content deltas as they arrive"""
+    url = f"{GROQ_BASE}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "stream": True
+    }
+    
+    cost = estimate_tokens(messages, max_tokens)
+    groq_limiter.acquire(cost)
+    
+    started = time.perf_counter()
+    r = http_client.post(url, read_timeout=30, headers=headers, json=payload, stream=True)
+    usage = None
+    try:
+        r.raise_for_status()
+        r.encoding = "utf-8"
+        # OpenAI-compatible SSE: "data: {chunk}" lines, terminated by "data: [DONE]"
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage") or usage
+            if not chunk.get("choices"):
+                continue
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+    except Exception as e:
+        print(f"Error streaming from Groq API: {e}")
+        raise
+    finally:
+        r.close()
+        observe_stage("llm_call", time.perf_counter() - started)  # Until the last delta
+        settle_usage(cost, usage or {})
+
+# ----------------- Analysis -----------------
+SYSTEM_PROMPT = """You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+
+Your task is to analyze the meeting and provide a structured response in JSON format with these exact keys:
+- summary: A concise 3-4 sentence summary of the meeting
+- action_items: Array of objects with keys: task, assignee, due
+- decisions: Array of key decisions made
+- open_questions: Array of unresolved questions
+
+Return ONLY valid JSON, no other text."""
+
+USER_TEMPLATE = "{context_prefix}Meeting Transcript:\n{transcript}\n\nAnalyze this meeting and return a JSON response with: summary, action_items (with task/assignee/due), decisions, and open_questions."
+
+result_cache = ResultCache()
+prompt_tokens = TokenCounter(PROMPT_TOKENIZER)
+
+def render_messages(transcript: str, chunks: List[str]) -> List[dict]:
+    """The chat messages for a transcript and its ranked RAG context chunks"""
+    rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(chunks)])
+    context_prefix = ""
+    if rag_context:
+        context_prefix = "Relevant context from company documents:\n" + rag_context + "\n\n"
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_TEMPLATE.format(context_prefix=context_prefix, transcript=transcript)}
+    ]
+
+def render_prompt(transcript: str, chunks: List[str]) -> str:
+    """All of the messages' text, as counted against the prompt budget"""
+    return "\n\n".join(m["content"] for m in render_messages(transcript, chunks))
+
+def build_messages(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> Tuple[List[dict], dict]:
+    """Retrieve RAG context (if enabled) and build the chat messages for Groq, fitted to PROMPT_MAX_TOKENS"""
+    top = []
+    if include_docs and len(indexes.get(namespace)):
+        print("Retrieving context...")
+        # One query per transcript segment, fused by rank: a long transcript's topics aren't blurred together
+        with timed("retrieval"):
+            top = multi_query(transcript, lambda queries, depth: query_index_batch(queries, depth, namespace), k=3)
+    
+    # Fillers and duplicated context cost quota (GROQ_TPM) and latency without changing the answer
+    with timed("prompt_build"):
+        compact, chunks, tokens = fit_prompt(render_prompt, transcript, top, PROMPT_MAX_TOKENS, prompt_tokens)
+        return render_messages(compact, chunks), tokens
+
+def segment_tokens() -> int:
+    """Transcript tokens per map-reduce segment: what fits one prompt next to its share of context"""
+    room = PROMPT_MAX_TOKENS - prompt_tokens.count(render_prompt("", []))
+    return max(100, int(room * (1 - CONTEXT_SHARE)))
+
+def analyze_segment(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Run retrieval + Groq completion + parsing for one transcript (or one segment of it)"""
+    messages, tokens = build_messages(transcript, include_docs, namespace)
+    
+    # Call Groq API
+    print(f"Calling Groq API ({tokens['prompt']} prompt tokens, {tokens['saved']} saved)...")
+    generated = groq_chat(messages, max_tokens=1000, json_mode=True)
+    print(f"Generated response: {generated[:200]}...")
+    
+    # Parse the response
+    with timed("parse"):
+        result = parse_model_output(generated)
+    result["tokens"] = tokens
+    return result
+
+def combine_summaries(summaries: List[str]) -> str:
+    """Condense per-segment summaries into one"""
+    return groq_chat([{"role": "user", "content": format_summaries(summaries)}], max_tokens=300)
+
+def analyze_transcript(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Single pass for short transcripts; map-reduce over speaker-turn segments for long ones"""
+    segments = segment_transcript(transcript, min(SEGMENT_TOKENS, segment_tokens()))
+    if len(segments) == 1:
+        result = analyze_segment(transcript, include_docs, namespace)
+    else:
+        print(f"Long transcript: analyzing {len(segments)} segments in parallel...")
+        result = map_reduce(segments, lambda segment: analyze_segment(segment, include_docs, namespace), combine_summaries)
+    
+    # Add email-ready summary
+    with timed("email"):
+        result["email_summary"] = generate_email_summary(result)
+    return result
+
+def result_key(transcript: str, include_docs: bool, namespace: str = DEFAULT_NAMESPACE) -> str:
+    return cache_key(transcript, include_docs, [namespace, index_version(namespace)], MODEL, f"{SYSTEM_PROMPT}{USER_TEMPLATE}|{PROMPT_MAX_TOKENS}")
+
+def analyze_cached(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE):
+    """analyze_transcript() behind the result cache; returns (result, cache_hit)"""
+    key = result_key(transcript, include_docs, namespace)
+    result = result_cache.get(key)
+    if result is not None:
+        return result, True
+    result = analyze_transcript(transcript, include_docs, namespace)
+    result_cache.set(key, result)
+    return result, False
+
+def run_analysis_job(transcript: str, include_docs: bool, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Job body for async /summarize requests"""
+    return analyze_cached(transcript, include_docs, namespace)[0]
+
+job_queue = JobQueue(run_analysis_job)
+
 # ----------------- API Endpoints -----------------
 @app.route("/", methods=["GET"])
 def home():
@@ -75,43 +293,150 @@ def home():
     return jsonify({
         "status": "running",
         "service": "Meeting Minder API (Groq)",
-        "endpoints": ["/upload_docs", "/summarize"],
+        "endpoints": ["/upload_docs", "/uploads/<upload_id>", "/docs", "/docs/<doc_id>", "/namespaces", "/summarize", "/summarize_batch", "/summarize_stream", "/jobs/<job_id>", "/cache_stats", "/metrics"],
         "version": "groq-free"
     })
 
 @app.route("/upload_docs", methods=["POST"])
 def upload_docs():
-    """Upload documents for RAG context"""
+    """
+    Upload documents for RAG context (replaces the whole store of the request's namespace)
+    Expects JSON: { "docs": ["text1", {"id": "handbook", "text": "text2"}, ...] }
+    Or stream NDJSON (one {"id", "text"} per line) or multipart text/markdown files: documents are
+    indexed as they arrive and progress is at /uploads/<upload_id> (choose the ID with X-Upload-Id).
+    """
     try:
-        docs = request.json.get("docs", [])
+        namespace = namespace_from_request(request)
+        if is_streamed(request):
+            upload = ingest_upload(request, namespace,
+                                   upsert=lambda doc_chunks: upsert_documents(doc_chunks, namespace),
+                                   delete=lambda doc_ids: delete_documents(doc_ids, namespace),
+                                   existing=list(list_documents(namespace)))
+            return jsonify({**upload, "status": "indexed", "index_version": index_version(namespace)})
+        docs = parse_docs(request.json.get("docs", []))
         
         if not docs:
             return jsonify({"error": "No documents provided"}), 400
         
-        # Chunk docs (split by paragraphs)
-        chunks = []
-        for d in docs:
-            for p in d.split("\n\n"):
-                p = p.strip()
-                if p and len(p) > 20:
-                    chunks.append(p)
+        doc_chunks = chunk_docs(docs)
+        chunk_count = sum(map(len, doc_chunks.values()))
+        if not chunk_count:
+            return jsonify({"error": "No valid chunks extracted"}), 400
         
-        if not chunks:
+        build_index(doc_chunks, namespace)
+        return jsonify({
+            "status": "indexed",
+            "chunks": chunk_count,
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items()},
+            "namespace": namespace,
+            "index_version": index_version(namespace),
+            "message": f"Successfully indexed {chunk_count} document chunks"
+        })
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Progress of a streamed /upload_docs: documents, chunks indexed, bytes read"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload)
+
+@app.route("/docs", methods=["GET"])
+def list_docs():
+    """List indexed documents with their chunk counts"""
+    try:
+        namespace = namespace_from_request(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"documents": list_documents(namespace), "namespace": namespace,
+                    "index_version": index_version(namespace)})
+
+@app.route("/namespaces", methods=["GET"])
+def list_namespaces():
+    """Known document namespaces, plus which are loaded in this worker and their memory footprint"""
+    return jsonify({"namespaces": indexes.namespaces(), **indexes.stats()})
+
+@app.route("/docs", methods=["POST"])
+def add_docs():
+    """
+    Append documents without rebuilding the store (same doc ID replaces the old version)
+    Expects JSON: { "docs": [{"id": "handbook", "text": "..."}, "plain text", ...] }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        docs = parse_docs(request.json.get("docs", []))
+        if not docs:
+            return jsonify({"error": "No documents provided"}), 400
+        
+        doc_chunks = chunk_docs(docs)
+        if not any(doc_chunks.values()):
             return jsonify({"error": "No valid chunks extracted"}), 400
         
-        build_index(chunks)
+        upsert_documents(doc_chunks, namespace)
         return jsonify({
             "status": "indexed",
-            "chunks": len(chunks),
-            "message": f"Successfully indexed {len(chunks)} document chunks"
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items()},
+            "namespace": namespace,
+            "index_version": index_version(namespace)
         })
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["PUT"])
+def replace_doc(doc_id):
+    """
+    Replace (or create) a single document
+    Expects JSON: { "text": "..." }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        text = request.json.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return jsonify({"error": "No text provided"}), 400
+        
+        doc_chunks = chunk_docs([(doc_id, text)])
+        if not doc_chunks[doc_id]:
+            return jsonify({"error": "No valid chunks extracted"}), 400
+        
+        upsert_documents(doc_chunks, namespace)
+        return jsonify({
+            "status": "indexed",
+            "documents": {doc_id: len(doc_chunks[doc_id])},
+            "namespace": namespace,
+            "index_version": index_version(namespace)
+        })
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["DELETE"])
+def delete_doc(doc_id):
+    """Remove a single document from the store"""
+    try:
+        namespace = namespace_from_request(request)
+        if not delete_documents([doc_id], namespace):
+            return jsonify({"error": f"Unknown document: {doc_id}"}), 404
+        return jsonify({"status": "deleted", "id": doc_id, "namespace": namespace,
+                        "index_version": index_version(namespace)})
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/summarize", methods=["POST"])
 def summarize():
-    """Analyze meeting transcript"""
+    """Analyze meeting transcript ("async": true returns 202 with a job_id to poll at /jobs/<id>)"""
     try:
         data = request.json
         transcript = data.get("transcript", "").strip()
@@ -119,115 +444,207 @@ def summarize():
         
         if not transcript:
             return jsonify({"error": "No transcript provided"}), 400
+        try:
+            namespace = namespace_from_request(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Retrieve RAG context if enabled
-        rag_context = ""
-        if include_docs and doc_texts:
-            print("Retrieving context...")
-            top = query_index(transcript, k=3)
-            if top:
-                rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(top)])
+        if data.get("async"):
+            job = job_queue.submit(transcript=transcript, include_docs=include_docs, namespace=namespace)
+            response = jsonify({"job_id": job["id"], "status": job["status"]})
+            response.headers["Location"] = f"/jobs/{job['id']}"
+            return response, 202
         
-        # Construct messages for Groq
-        system_message = """You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+        result, hit = analyze_cached(transcript, include_docs, namespace)
+        response = jsonify(result)
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        return response
+    
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except RateLimitTimeout as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(int(e.retry_after) + 1)}
+    except Exception as e:
+        print(f"Error in summarize: {e}")
+        return jsonify({"error": str(e)}), 500
 
-Your task is to analyze the meeting and provide a structured response in JSON format with these exact keys:
-- summary: A concise 3-4 sentence summary of the meeting
-- action_items: Array of objects with keys: task, assignee, due
-- decisions: Array of key decisions made
-- open_questions: Array of unresolved questions
+# Top-level result fields streamed as SSE events, each list entry as its own event
+STREAM_EVENTS = {
+    "summary": "summary",
+    "action_items": "action_item",
+    "decisions": "decision",
+    "open_questions": "open_question",
+}
 
-Return ONLY valid JSON, no other text."""
+def sse(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        # Build user message with optional RAG context
-        context_prefix = ""
-        if rag_context:
-            context_prefix = "Relevant context from company documents:\n" + rag_context + "\n\n"
-        
-        user_message = f"{context_prefix}Meeting Transcript:\n{transcript}\n\nAnalyze this meeting and return a JSON response with: summary, action_items (with task/assignee/due), decisions, and open_questions."
+def replay_events(result: dict) -> Iterator[str]:
+    """SSE events for an already complete result"""
+    for field, event in STREAM_EVENTS.items():
+        values = result.get(field)
+        for value in (values if isinstance(values, list) else [values]):
+            yield sse(event, value)
+    yield sse("done", result)
 
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
-        ]
-        
-        # Call Groq API
-        print("Calling Groq API...")
-        generated = groq_chat(messages, max_tokens=1000)
-        print(f"Generated response: {generated[:200]}...")
-        
-        # Parse the response
-        result = parse_model_output(generated)
+def stream_analysis(transcript: str, include_docs: bool, namespace: str = DEFAULT_NAMESPACE) -> Iterator[str]:
+    """SSE events for one analysis: fields as soon as the model finishes them, then stage timings and the full result"""
+    with collect_timings() as timings:
+        yield from stream_events(transcript, include_docs, namespace, timings)
+
+def stream_events(transcript: str, include_docs: bool, namespace: str, timings: RequestTimings) -> Iterator[str]:
+    """The events of stream_analysis(); stages they run are collected in timings"""
+    key = result_key(transcript, include_docs, namespace)
+    result = result_cache.get(key)
+    if result is not None:
+        yield sse("timing", timings.as_dict())
+        yield from replay_events(result)
+        return
+    
+    try:
+        if len(segment_transcript(transcript, min(SEGMENT_TOKENS, segment_tokens()))) > 1:
+            # Long transcripts are merged from several completions, so there is no single stream to follow
+            result, _ = analyze_cached(transcript, include_docs, namespace)
+            yield sse("timing", timings.as_dict())
+            yield from replay_events(result)
+            return
         
-        # Add email-ready summary
-        result["email_summary"] = generate_email_summary(result)
+        messages, tokens = build_messages(transcript, include_docs, namespace)
+        print(f"Streaming from Groq API ({tokens['prompt']} prompt tokens)...")
+        parser = StreamingJSONParser()
+        for delta in groq_chat_stream(messages, max_tokens=1000):
+            for field, value in parser.feed(delta):
+                if field in STREAM_EVENTS:
+                    yield sse(STREAM_EVENTS[field], value)
         
-        return jsonify(result)
-    
+        # Final result goes through the regular parser so it matches /summarize exactly
+        with timed("parse"):
+            result = parse_model_output(parser.buffer)
+        result["tokens"] = tokens
+        with timed("email"):
+            result["email_summary"] = generate_email_summary(result)
+        result_cache.set(key, result)
+        yield sse("timing", timings.as_dict())
+        yield sse("done", result)
     except Exception as e:
-        print(f"Error in summarize: {e}")
-        return jsonify({"error": str(e)}), 500
+        print(f"Error in summarize_stream: {e}")
+        yield sse("error", {"error": str(e)})
+
+@app.route("/summarize_stream", methods=["POST"])
+def summarize_stream():
+    """
+    Streaming variant of /summarize over Server-Sent Events
+    Same request body; emits summary / action_item / decision / open_question events
+    as each one completes, then "timing" (ms per stage) and "done" with the full /summarize response (or "error")
+    """
+    data = request.json or {}
+    transcript = data.get("transcript", "").strip()
+    include_docs = data.get("use_docs", True)
+    
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+    try:
+        namespace = namespace_from_request(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return Response(
+        stream_with_context(stream_analysis(transcript, include_docs, namespace)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/summarize_batch", methods=["POST"])
+def summarize_batch():
+    """
+    Analyze many transcripts in one request
+    Body: JSON {"items": [{"id": "...", "transcript": "...", "use_docs": true}, ...], "use_docs": true}
+          (or a bare list), or NDJSON with one item per line (Content-Type: application/x-ndjson)
+    Streams NDJSON back as items finish: {"id", "index", "status": "ok", "cached", "result"} or
+    {"id", "index", "status": "error", "error"}, then {"status": "complete", "items", "ok", "failed"}
+    """
+    try:
+        namespace = namespace_from_request(request)
+        items = parse_batch(request.get_data(), request.content_type or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        concurrency = int(request.args.get("concurrency", BATCH_CONCURRENCY))
+    except ValueError:
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+    
+    print(f"Batch of {len(items)} transcripts, concurrency {concurrency}")
+    def analyze(transcript, include_docs):
+        return analyze_cached(transcript, include_docs, namespace)
+    
+    lines = (json.dumps(record) + "\n" for record in run_batch(items, analyze, concurrency))
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Status of an async /summarize job
+    status: queued | running | done | failed | cancelled; "result" holds the /summarize response once done
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job (a running analysis is left to finish, its result is discarded)"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Result cache hit/miss counters and Groq quota queueing for this worker"""
+    return jsonify({**result_cache.stats(), "rate_limit": groq_limiter.stats()})
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms and upstream / retry / cache / token counters,
+    summed over all workers, plus the size of each index loaded in this worker
+    """
+    INDEX_CHUNKS.clear()
+    INDEX_BYTES.clear()
+    for namespace, store in indexes.loaded().items():
+        INDEX_CHUNKS.set(len(store), namespace=namespace)
+        INDEX_BYTES.set(store.memory_bytes(), namespace=namespace)
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
 def parse_model_output(generated: str):
     """Parse model output and extract structured data"""
-    # Try to find JSON in the response
-    json_match = re.search(r'\{[\s\S]*\}', generated)
+    # One linear scan for the JSON object; output cut off mid-object is repaired, not thrown away
+    found = analysis_fields(extract_json(generated))
+    if all(k in found for k in ANALYSIS_KEYS):
+        return found
     
-    if json_match:
-        try:
-            result = json.loads(json_match.group(0))
-            # Validate required keys
-            if all(k in result for k in ["summary", "action_items", "decisions", "open_questions"]):
-                return result
-        except json.JSONDecodeError:
-            pass
-    
-    # Fallback: parse manually
+    # Fallback: the well-formed keys the JSON did have, the rest from headed sections ("SUMMARY: ...")
+    sections = split_sections(generated)
     result = {
-        "summary": extract_section(generated, ["summary", "Summary"], default="Meeting analysis completed."),
-        "action_items": extract_action_items(generated),
-        "decisions": extract_list(generated, ["decisions", "Decisions"]),
-        "open_questions": extract_list(generated, ["open_questions", "Open Questions", "questions"])
+        "summary": found.get("summary") or sections.get("summary") or "Meeting analysis completed.",
+        "action_items": found.get("action_items") or extract_action_items(generated, sections),
+        "decisions": found.get("decisions") or bullet_items(sections.get("decisions", "")),
+        "open_questions": found.get("open_questions") or bullet_items(sections.get("open_questions", ""))
     }
     
     return result
 
-def extract_section(text: str, headers: List[str], default: str = "") -> str:
-    """Extract text under a specific header"""
-    for header in headers:
-        pattern = rf'"{header}":\s*"([^"]*)"'
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
-    return default
-
-def extract_list(text: str, headers: List[str]) -> List[str]:
-    """Extract list under a header"""
-    for header in headers:
-        pattern = rf'"{header}":\s*\[(.*?)\]'
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            content = match.group(1)
-            # Extract quoted strings
-            items = re.findall(r'"([^"]*)"', content)
-            if items:
-                return items
-    return []
-
-def extract_action_items(text: str) -> List[dict]:
+def extract_action_items(text: str, sections: Dict[str, str]) -> List[dict]:
     """Extract action items from text"""
-    # Try to find JSON array
-    pattern = r'"action_items":\s*\[(.*?)\]'
-    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-    
-    if match:
-        try:
-            items_str = "[" + match.group(1) + "]"
-            items = json.loads(items_str)
-            if isinstance(items, list) and all(isinstance(i, dict) for i in items):
-                return items
-        except json.JSONDecodeError:
-            pass
+    # Try to find JSON array (in the action items section if there is one)
+    section = sections.get("action_items", "")
+    items = extract_json(section or text, "[")
+    if isinstance(items, list) and items and all(isinstance(i, dict) for i in items):
+        return items
     
     # Fallback
     return [{
@@ -1,82 +1,289 @@
 # meeting_minder_lite.py - Lightweight version using only HF Inference API
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-import requests
 import json
-import re
-from typing import List
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import numpy as np
+import requests
+
+import http_client
+from batch import BATCH_CONCURRENCY, parse_batch, run_batch
+from documents import batched, chunk_docs, flatten_chunks, parse_docs
+from embedding_cache import EmbeddingCache
+from hashed_embeddings import HashedIndex
+from index_manager import DEFAULT_NAMESPACE, IndexManager, namespace_from_request
+from ingest import get_upload, ingest_upload, is_streamed
+from jobs import JobQueue, QueueFull
+from metrics import CONTENT_TYPE, INDEX_BYTES, INDEX_CHUNKS, instrument, record_tokens, registry, timed
+from model_output import ANALYSIS_KEYS, analysis_fields, bullet_items, extract_json, split_sections
+from profiling import carry_context, instrument_timing
+from prompt_budget import CONTEXT_SHARE, TokenCounter, fit_prompt
+from response_cache import ResultCache, cache_key
+from retrieval import multi_query
+from segments import SEGMENT_TOKENS, estimate_tokens, format_summaries, map_reduce, segment_transcript
+from vector_store import VectorStore
 
 # Configuration
 HF_TOKEN = os.getenv("HF_TOKEN")
-HF_BASE = "https://api-inference.huggingface.co/models"
+HF_BASE = os.getenv("HF_BASE", "https://api-inference.huggingface.co/models")
 GEN_MODEL = "facebook/bart-large-cnn"  # Updated: Using BART for summarization
 EMBED_MODEL = "BAAI/bge-large-en-v1.5"  # Updated: Using BGE for embeddings
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "1024"))  # bart-large-cnn reads at most 1024 input tokens
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", GEN_MODEL)  # Tokenizer used to count them; empty = estimate
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # Chunks per HF request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))  # HF requests in flight
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "1"))  # Extra attempts per failed batch (HTTP 429/5xx are retried by http_client)
+SPLIT_STATUSES = {400, 413, 422}  # Rejections a particular input can cause: the batch is halved to find it
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "hf")  # "hf" = EMBED_MODEL via the API; "hashed" = local TF-IDF, no network
+
+INDEX_DIR = os.getenv("INDEX_DIR", "index_store")  # One subdirectory per namespace, shared by all workers
 
 HEADERS = {"Authorization": f"Bearer {HF_TOKEN}"}
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend access
+CORS(app, expose_headers=["Server-Timing", "X-Cache", "X-Profile"])  # Enable CORS for frontend access
+instrument(app)  # Request latency histograms for /metrics
+instrument_timing(app)  # Server-Timing on /summarize and /upload_docs, sampling profiler if enabled
+
+# ----------------- In-memory vector stores (no FAISS) -----------------
+# One contiguous, pre-normalized float32 matrix per namespace: a query is a single matrix-vector product.
+# With RETRIEVAL_BACKEND=hashed the rows are hashed TF-IDF vectors computed locally (no HF round trips).
+# Each namespace (team) is saved under INDEX_DIR and loaded on demand.
+indexes = IndexManager(INDEX_DIR, HashedIndex.load if RETRIEVAL_BACKEND == "hashed" else VectorStore.load)
+embedding_cache = EmbeddingCache(EMBED_MODEL)
 
-# ----------------- Simple in-memory vector store (no FAISS) -----------------
-doc_embeddings = []
-doc_texts = []
+def request_embeddings(texts: List[str]) -> np.ndarray:
+    """Embed a batch of texts with one HF Inference API call"""
+    url = f"{HF_BASE}/{EMBED_MODEL}"
+    payload = {"inputs": texts}
+    
+    r = http_client.post(url, read_timeout=30, headers=HEADERS, json=payload)
+    r.raise_for_status()
+    # HF returns one embedding per input (token-level models return one per token)
+    vectors = np.array(r.json(), dtype=np.float32)
+    if vectors.ndim == 3:
+        vectors = vectors.mean(axis=1)
+    if vectors.ndim != 2 or len(vectors) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got shape {vectors.shape}")
+    return vectors
+
+def blames_input(error: Exception) -> bool:
+    """Whether particular texts can cause this error, so splitting the batch may isolate them"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in SPLIT_STATUSES
+    return isinstance(error, ValueError) and not isinstance(error, requests.RequestException)  # Shape mismatch
+
+def embed_batch(texts: List[str], retries: int = EMBED_RETRIES, abort: Optional[threading.Event] = None):
+    """
+    Embed one batch, splitting it to isolate chunks the API rejects
+    Service errors (401/403, 429/5xx and connection errors, already retried by http_client) fail the
+    whole batch at once and set abort, so batches not yet sent fail without a request.
+    """
+    error: Exception = RuntimeError("Embedding skipped after an earlier batch failed")
+    for attempt in range(retries + 1):
+        if abort is not None and abort.is_set():
+            break
+        try:
+            return list(request_embeddings(texts)), {}
+        except Exception as e:
+            error = e
+            if isinstance(e, requests.RequestException) or blames_input(e):
+                break  # Retrying can't help: http_client has retried, or the same input fails again
+            if attempt < retries:
+                time.sleep(0.5 * 2 ** attempt + random.uniform(0, 0.25))
+    
+    if len(texts) == 1 or not blames_input(error):
+        if abort is not None and isinstance(error, requests.RequestException) and not blames_input(error):
+            abort.set()
+        print(f"Error getting embeddings for {len(texts)} chunk(s): {error}")
+        return [None] * len(texts), {i: str(error) for i in range(len(texts))}
+    # Halve the batch so one bad chunk doesn't sink its neighbours
+    mid = len(texts) // 2
+    left, left_errors = embed_batch(texts[:mid], retries=0, abort=abort)
+    right, right_errors = embed_batch(texts[mid:], retries=0, abort=abort)
+    errors = dict(left_errors)
+    errors.update({mid + i: e for i, e in right_errors.items()})
+    return left + right, errors
+
+def get_embeddings(texts: List[str]) -> Tuple[List[Optional[np.ndarray]], Dict[int, str]]:
+    """
+    Embed many texts in batches, with a bounded number of HF requests in flight
+    Returns embeddings in input order (None where a chunk failed) and {position: error}
+    """
+    if not texts:
+        return [], {}
+    batches = [(start, texts[start:start + EMBED_BATCH_SIZE]) for start in range(0, len(texts), EMBED_BATCH_SIZE)]
+    if len(batches) == 1:
+        return embed_batch(texts)
+    abort = threading.Event()
+    
+    embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+    errors: Dict[int, str] = {}
+    
+    with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as pool:
+        futures = [(start, pool.submit(carry_context(embed_batch), batch, abort=abort)) for start, batch in batches]
+        for start, future in futures:
+            batch_embeddings, batch_errors = future.result()
+            embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+            errors.update({start + i: e for i, e in batch_errors.items()})
+    return embeddings, errors
 
 def get_embedding(text: str):
     """Get embedding from HF Inference API"""
-    url = f"{HF_BASE}/{EMBED_MODEL}"
-    payload = {"inputs": text}
+    embeddings, _ = get_embeddings([text])
+    return embeddings[0]
+
+def embed_chunks(doc_chunks: Dict[str, List[str]]):
+    """
+    Embed chunks, returning (embedding, text, doc_id) for each one that succeeded
+    and a list of {doc_id, chunk, error} for each one that failed
+    Chunks are walked lazily, one window of concurrent HF batches at a time.
+    """
+    embedded, failed = [], []
+    flat = ((doc_id, pos, chunk) for doc_id, chunks in doc_chunks.items() for pos, chunk in enumerate(chunks))
+    for window in batched(flat, EMBED_BATCH_SIZE * EMBED_CONCURRENCY):
+        window_embedded, window_failed = embed_window(window)
+        embedded.extend(window_embedded)
+        failed.extend(window_failed)
+    print(f"  Embedded {len(embedded)}/{len(embedded) + len(failed)} chunks ({len(failed)} failed)")
+    return embedded, failed
+
+def embed_window(flat: List[Tuple[str, int, str]]):
+    """Embed one window of (doc_id, position, chunk), via the cache and then HF"""
+    texts = [chunk for _, _, chunk in flat]
+    embeddings = embedding_cache.get_many(texts)
     
-    try:
-        r = requests.post(url, headers=HEADERS, json=payload, timeout=30)
-        r.raise_for_status()
-        # HF returns embeddings as a list
-        return np.array(r.json())
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return None
-
-def cosine_similarity(a, b):
-    """Calculate cosine similarity between two vectors"""
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-def build_index(text_chunks: List[str]):
-    """Build simple vector store from text chunks"""
-    global doc_embeddings, doc_texts
-    doc_embeddings = []
-    doc_texts = []
+    # Only unseen texts go to HF (each distinct text once)
+    missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+    print(f"Embedding {len(missing)} chunks ({len(texts) - len(missing)} from cache)...")
+    with timed("embedding"):
+        fresh, fresh_errors = get_embeddings(missing)
+    embedding_cache.put_many([t for t, e in zip(missing, fresh) if e is not None], [e for e in fresh if e is not None])
     
-    print(f"Embedding {len(text_chunks)} chunks...")
-    for i, chunk in enumerate(text_chunks):
-        emb = get_embedding(chunk)
-        if emb is not None:
-            doc_embeddings.append(emb)
-            doc_texts.append(chunk)
-            print(f"  Embedded chunk {i+1}/{len(text_chunks)}")
+    by_text = dict(zip(missing, fresh))
+    errors_by_text = {missing[i]: e for i, e in fresh_errors.items()}
+    embeddings = [e if e is not None else by_text[t] for t, e in zip(texts, embeddings)]
+    errors = {i: errors_by_text[t] for i, t in enumerate(texts) if t in errors_by_text}
     
-    print(f"✓ Built index with {len(doc_texts)} chunks")
+    embedded = [(emb, chunk, doc_id) for emb, (doc_id, _, chunk) in zip(embeddings, flat) if emb is not None]
+    failed = [{"doc_id": flat[i][0], "chunk": flat[i][1], "error": e} for i, e in sorted(errors.items())]
+    return embedded, failed
+
+def build_index(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Build vector store from per-document chunks, returning any chunk failures"""
+    if RETRIEVAL_BACKEND == "hashed":
+        with timed("index_write"), indexes.edit(namespace) as store:
+            store.rebuild(*flatten_chunks(doc_chunks))
+        print(f"✓ Built hashed index '{namespace}' with {len(store)} chunks")
+        return []
+    embedded, failed = embed_chunks(doc_chunks)
+    complete, skipped = split_failed(embedded, failed)
+    if failed and not complete:
+        print(f"⚠️  Nothing embedded, index '{namespace}' left as it was")
+        return failed
+    with timed("index_write"), indexes.edit(namespace) as store:
+        # Documents with failed chunks keep their previous version; every other old document goes
+        stale = [doc_id for doc_id in store.documents() if doc_id not in skipped]
+        store.add(*unzip_embedded(complete), replace=stale)
+    print(f"✓ Built index '{namespace}' with {len(store)} chunks")
+    return failed
 
-def query_index(query: str, k=3):
+def upsert_documents(doc_chunks: Dict[str, List[str]], namespace: str = DEFAULT_NAMESPACE):
+    """Embed only the given documents and add/replace them in the store, returning any chunk failures"""
+    if RETRIEVAL_BACKEND == "hashed":
+        with timed("index_write"), indexes.edit(namespace) as store:
+            store.add(*flatten_chunks(doc_chunks), replace=list(doc_chunks))
+        print(f"✓ Updated hashed index '{namespace}': {len(doc_chunks)} document(s), {len(store)} chunks total")
+        return []
+    embedded, failed = embed_chunks(doc_chunks)
+    complete, skipped = split_failed(embedded, failed)
+    if failed and not complete:
+        print(f"⚠️  Nothing embedded, index '{namespace}' left as it was")
+        return failed
+    with timed("index_write"), indexes.edit(namespace) as store:
+        store.add(*unzip_embedded(complete), replace=[doc_id for doc_id in doc_chunks if doc_id not in skipped])
+    print(f"✓ Updated index '{namespace}': {len(doc_chunks) - len(skipped)} document(s), {len(store)} chunks total")
+    return failed
+
+def split_failed(embedded, failed):
+    """
+    Rows of the documents whose chunks all embedded, and the IDs of the others
+    A document is never replaced by a partial copy: one with a failed chunk keeps its previous version.
+    """
+    skipped = {f["doc_id"] for f in failed}
+    if skipped:
+        print(f"⚠️  {len(skipped)} document(s) with failed chunks not updated")
+    return [e for e in embedded if e[2] not in skipped], skipped
+
+def indexing_status(doc_chunks: Dict[str, List[str]], failed: List[dict]):
+    """("indexed" | "partial" | "failed", HTTP status, chunks indexed, IDs of documents left unchanged)"""
+    skipped = sorted({f["doc_id"] for f in failed})
+    indexed = sum(len(chunks) for doc_id, chunks in doc_chunks.items() if doc_id not in skipped)
+    if not skipped:
+        return "indexed", 200, indexed, skipped
+    if not indexed:
+        return "failed", 502, indexed, skipped
+    return "partial", 200, indexed, skipped
+
+def unzip_embedded(embedded):
+    """Split (embedding, text, doc_id) triples into a matrix and two lists"""
+    if not embedded:
+        return np.zeros((0, 0), dtype=np.float32), [], []
+    return np.vstack([e for e, _, _ in embedded]), [t for _, t, _ in embedded], [d for _, _, d in embedded]
+
+def index_version(namespace: str = DEFAULT_NAMESPACE) -> int:
+    return indexes.get(namespace).version
+
+def delete_documents(doc_ids: List[str], namespace: str = DEFAULT_NAMESPACE) -> List[str]:
+    """Remove documents from the store, returning the IDs that existed"""
+    if not set(doc_ids) & set(indexes.get(namespace).documents()):
+        return []
+    with indexes.edit(namespace) as store:
+        return store.remove_docs(doc_ids)
+
+def list_documents(namespace: str = DEFAULT_NAMESPACE) -> Dict[str, int]:
+    """Return {doc_id: chunk count} for every indexed document"""
+    return indexes.get(namespace).documents()
+
+def query_index(query: str, k=3, namespace: str = DEFAULT_NAMESPACE):
     """Query vector store for top-k relevant chunks"""
-    if not doc_embeddings:
+    store = indexes.get(namespace)
+    if not len(store):
         return []
+    if RETRIEVAL_BACKEND == "hashed":
+        with timed("search"):
+            return [text for _, text in store.search(query, k)]
     
-    query_emb = get_embedding(query)
+    with timed("embedding"):
+        query_emb = get_embedding(query)
     if query_emb is None:
         return []
+    with timed("search"):
+        return store.search(query_emb, k)
+
+def query_index_batch(queries: List[str], k=3, namespace: str = DEFAULT_NAMESPACE) -> List[List[str]]:
+    """Top-k chunks for several queries: one batched embedding call and one matrix product"""
+    store = indexes.get(namespace)
+    if not len(store) or not queries:
+        return [[] for _ in queries]
+    if RETRIEVAL_BACKEND == "hashed":
+        with timed("search"):
+            return [[text for _, text in hits] for hits in store.search_batch(queries, k)]
     
-    # Calculate similarities
-    similarities = []
-    for i, doc_emb in enumerate(doc_embeddings):
-        sim = cosine_similarity(query_emb, doc_emb)
-        similarities.append((sim, i))
-    
-    # Sort by similarity and get top-k
-    similarities.sort(reverse=True)
-    top_k = similarities[:k]
-    
-    results = [doc_texts[idx] for _, idx in top_k]
+    with timed("embedding"):
+        embeddings, _ = get_embeddings(queries)
+    ok = [i for i, e in enumerate(embeddings) if e is not None]
+    results: List[List[str]] = [[] for _ in queries]
+    if ok:
+        with timed("search"):
+            hits = store.search_batch(np.vstack([embeddings[i] for i in ok]), k)
+        for i, row in zip(ok, hits):
+            results[i] = [text for _, text in row]
     return results
 
 # ----------------- HF Inference helpers -----------------
@@ -94,20 +301,114 @@ def hf_generate(prompt: str, max_new_tokens=400):
     }
     
     try:
-        r = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+        with timed("llm_call"):
+            r = http_client.post(url, read_timeout=60, headers=HEADERS, json=payload)
         r.raise_for_status()
         out = r.json()
         
         # Parse output; flan-t5 often returns list with 'generated_text'
         if isinstance(out, list) and len(out) > 0:
-            if "generated_text" in out[0]:
-                return out[0]["generated_text"]
-            return str(out[0])
-        return str(out)
+            generated = out[0]["generated_text"] if "generated_text" in out[0] else str(out[0])
+        else:
+            generated = str(out)
+        record_tokens(GEN_MODEL, estimate_tokens(prompt), estimate_tokens(generated))  # HF reports no usage
+        return generated
     except Exception as e:
         print(f"Error calling HF API: {e}")
         raise
 
+# ----------------- Analysis -----------------
+PROMPT_TEMPLATE = """You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+
+{context_block}
+Meeting Transcript:
+{transcript}
+
+Please analyze this meeting and provide:
+
+1. SUMMARY: A concise 3-4 sentence summary of the meeting
+2. ACTION_ITEMS: List of action items in this exact JSON format:
+   [{{"task": "description", "assignee": "person name", "due": "suggested date"}}]
+3. DECISIONS: Key decisions made during the meeting
+4. OPEN_QUESTIONS: Unresolved questions or topics for follow-up
+
+Format your response as valid JSON with these exact keys: summary, action_items, decisions, open_questions
+"""
+
+result_cache = ResultCache()
+prompt_tokens = TokenCounter(PROMPT_TOKENIZER)
+
+def render_prompt(transcript: str, chunks: List[str]) -> str:
+    """The generation prompt for a transcript and its ranked RAG context chunks"""
+    rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(chunks)])
+    context_block = f"Relevant context from company documents:\n{rag_context}\n" if rag_context else ""
+    return PROMPT_TEMPLATE.format(context_block=context_block, transcript=transcript)
+
+def segment_tokens() -> int:
+    """Transcript tokens per map-reduce segment: what fits one prompt next to its share of context"""
+    room = PROMPT_MAX_TOKENS - prompt_tokens.count(render_prompt("", []))
+    return max(100, int(room * (1 - CONTEXT_SHARE)))
+
+def analyze_segment(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Run RAG retrieval + generation + parsing for one transcript (or one segment of it)"""
+    # Retrieve RAG context if enabled
+    top = []
+    if include_docs and len(indexes.get(namespace)):
+        print("Retrieving RAG context...")
+        # One query per transcript segment, fused by rank: long transcripts aren't truncated or blurred
+        with timed("retrieval"):
+            top = multi_query(transcript, lambda queries, depth: query_index_batch(queries, depth, namespace), k=3)
+    
+    # Construct prompt for the model, compressed to fit its input window (the model would silently cut the rest)
+    with timed("prompt_build"):
+        compact, chunks, tokens = fit_prompt(render_prompt, transcript, top, PROMPT_MAX_TOKENS, prompt_tokens)
+        prompt = render_prompt(compact, chunks)
+
+    # Call HF Inference API
+    print(f"Calling HF Inference API ({tokens['prompt']} prompt tokens, {tokens['saved']} saved)...")
+    generated = hf_generate(prompt, max_new_tokens=500)
+    print(f"Generated response: {generated[:200]}...")
+    
+    # Try to extract JSON from response
+    with timed("parse"):
+        result = parse_model_output(generated, transcript)
+    result["tokens"] = tokens
+    return result
+
+def combine_summaries(summaries: List[str]) -> str:
+    """Condense per-segment summaries into one"""
+    return hf_generate(format_summaries(summaries), max_new_tokens=200)
+
+def analyze_transcript(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Single pass for short transcripts; map-reduce over speaker-turn segments for long ones"""
+    segments = segment_transcript(transcript, min(SEGMENT_TOKENS, segment_tokens()))
+    if len(segments) == 1:
+        result = analyze_segment(transcript, include_docs, namespace)
+    else:
+        print(f"Long transcript: analyzing {len(segments)} segments in parallel...")
+        result = map_reduce(segments, lambda segment: analyze_segment(segment, include_docs, namespace), combine_summaries)
+    
+    # Add email-ready summary
+    with timed("email"):
+        result["email_summary"] = generate_email_summary(result)
+    return result
+
+def analyze_cached(transcript: str, include_docs: bool = True, namespace: str = DEFAULT_NAMESPACE):
+    """analyze_transcript() behind the result cache; returns (result, cache_hit)"""
+    key = cache_key(transcript, include_docs, [namespace, index_version(namespace)], GEN_MODEL, f"{PROMPT_TEMPLATE}|{PROMPT_MAX_TOKENS}")
+    result = result_cache.get(key)
+    if result is not None:
+        return result, True
+    result = analyze_transcript(transcript, include_docs, namespace)
+    result_cache.set(key, result)
+    return result, False
+
+def run_analysis_job(transcript: str, include_docs: bool, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Job body for async /summarize requests"""
+    return analyze_cached(transcript, include_docs, namespace)[0]
+
+job_queue = JobQueue(run_analysis_job)
+
 # ----------------- API Endpoints -----------------
 @app.route("/", methods=["GET"])
 def home():
@@ -115,41 +416,154 @@ def home():
     return jsonify({
         "status": "running",
         "service": "Meeting Minder API (Lite)",
-        "endpoints": ["/upload_docs", "/summarize"],
+        "endpoints": ["/upload_docs", "/uploads/<upload_id>", "/docs", "/docs/<doc_id>", "/namespaces", "/summarize", "/summarize_batch", "/jobs/<job_id>", "/cache_stats", "/metrics"],
         "version": "lite"
     })
 
 @app.route("/upload_docs", methods=["POST"])
 def upload_docs():
     """
-    Upload documents for RAG context
-    Expects JSON: { "docs": ["text1", "text2", ...] }
+    Upload documents for RAG context (replaces the whole store of the request's namespace)
+    Expects JSON: { "docs": ["text1", {"id": "handbook", "text": "text2"}, ...] }
+    Or stream NDJSON (one {"id", "text"} per line) or multipart text/markdown files: documents are
+    indexed as they arrive and progress is at /uploads/<upload_id> (choose the ID with X-Upload-Id).
     """
     try:
-        docs = request.json.get("docs", [])
+        namespace = namespace_from_request(request)
+        if is_streamed(request):
+            upload = ingest_upload(request, namespace,
+                                   upsert=lambda doc_chunks: upsert_documents(doc_chunks, namespace),
+                                   delete=lambda doc_ids: delete_documents(doc_ids, namespace),
+                                   existing=list(list_documents(namespace)))
+            status = "indexed" if not upload["failed_chunks"] else "partial" if upload["indexed_chunks"] else "failed"
+            return jsonify({**upload, "status": status, "index_version": index_version(namespace)})
+        docs = parse_docs(request.json.get("docs", []))
         
         if not docs:
             return jsonify({"error": "No documents provided"}), 400
         
-        # Chunk docs (naive: split by paragraphs)
-        chunks = []
-        for d in docs:
-            # Split by double newlines (paragraphs)
-            for p in d.split("\n\n"):
-                p = p.strip()
-                if p and len(p) > 20:  # Ignore very short chunks
-                    chunks.append(p)
+        doc_chunks = chunk_docs(docs)
+        chunk_count = sum(map(len, doc_chunks.values()))
+        if not chunk_count:
+            return jsonify({"error": "No valid chunks extracted"}), 400
         
-        if not chunks:
+        failed = build_index(doc_chunks, namespace)
+        status, code, indexed, skipped = indexing_status(doc_chunks, failed)
+        return jsonify({
+            "status": status,
+            "chunks": indexed,
+            "failed_chunks": failed,
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items() if doc_id not in skipped},
+            "unchanged_documents": skipped,
+            "namespace": namespace,
+            "index_version": index_version(namespace),
+            "message": f"Indexed {indexed} of {chunk_count} document chunks"
+        }), code
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Progress of a streamed /upload_docs: documents, chunks indexed, bytes read"""
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload)
+
+@app.route("/docs", methods=["GET"])
+def list_docs():
+    """List indexed documents with their chunk counts"""
+    try:
+        namespace = namespace_from_request(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"documents": list_documents(namespace), "namespace": namespace,
+                    "index_version": index_version(namespace)})
+
+@app.route("/namespaces", methods=["GET"])
+def list_namespaces():
+    """Known document namespaces, plus which are loaded in this worker and their memory footprint"""
+    return jsonify({"namespaces": indexes.namespaces(), **indexes.stats()})
+
+@app.route("/docs", methods=["POST"])
+def add_docs():
+    """
+    Append documents without rebuilding the store (same doc ID replaces the old version)
+    Expects JSON: { "docs": [{"id": "handbook", "text": "..."}, "plain text", ...] }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        docs = parse_docs(request.json.get("docs", []))
+        if not docs:
+            return jsonify({"error": "No documents provided"}), 400
+        
+        doc_chunks = chunk_docs(docs)
+        if not any(doc_chunks.values()):
             return jsonify({"error": "No valid chunks extracted"}), 400
         
-        build_index(chunks)
+        failed = upsert_documents(doc_chunks, namespace)
+        status, code, _, skipped = indexing_status(doc_chunks, failed)
         return jsonify({
-            "status": "indexed",
-            "chunks": len(chunks),
-            "message": f"Successfully indexed {len(chunks)} document chunks"
-        })
+            "status": status,
+            "documents": {doc_id: len(chunks) for doc_id, chunks in doc_chunks.items() if doc_id not in skipped},
+            "failed_chunks": failed,
+            "unchanged_documents": skipped,
+            "namespace": namespace,
+            "index_version": index_version(namespace)
+        }), code
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["PUT"])
+def replace_doc(doc_id):
+    """
+    Replace (or create) a single document
+    Expects JSON: { "text": "..." }
+    """
+    try:
+        namespace = namespace_from_request(request)
+        text = request.json.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return jsonify({"error": "No text provided"}), 400
+        
+        doc_chunks = chunk_docs([(doc_id, text)])
+        if not doc_chunks[doc_id]:
+            return jsonify({"error": "No valid chunks extracted"}), 400
+        
+        failed = upsert_documents(doc_chunks, namespace)
+        status, code, _, skipped = indexing_status(doc_chunks, failed)
+        return jsonify({
+            "status": status,
+            "documents": {} if skipped else {doc_id: len(doc_chunks[doc_id])},
+            "failed_chunks": failed,
+            "unchanged_documents": skipped,
+            "namespace": namespace,
+            "index_version": index_version(namespace)
+        }), code
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/docs/<doc_id>", methods=["DELETE"])
+def delete_doc(doc_id):
+    """Remove a single document from the store"""
+    try:
+        namespace = namespace_from_request(request)
+        if not delete_documents([doc_id], namespace):
+            return jsonify({"error": f"Unknown document: {doc_id}"}), 404
+        return jsonify({"status": "deleted", "id": doc_id, "namespace": namespace,
+                        "index_version": index_version(namespace)})
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -159,7 +573,8 @@ def summarize():
     Analyze meeting transcript and extract insights
     Expects JSON: {
         "transcript": "meeting text...",
-        "use_docs": true/false (optional, default: true)
+        "use_docs": true/false (optional, default: true),
+        "async": true/false (optional, default: false - true returns 202 with a job_id to poll at /jobs/<id>)
     }
     """
     try:
@@ -169,121 +584,121 @@ def summarize():
         
         if not transcript:
             return jsonify({"error": "No transcript provided"}), 400
+        try:
+            namespace = namespace_from_request(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Retrieve RAG context if enabled
-        rag_context = ""
-        if include_docs and doc_texts:
-            print("Retrieving RAG context...")
-            top = query_index(transcript, k=3)
-            if top:
-                rag_context = "\n\n".join([f"[Context {i+1}]: {chunk}" for i, chunk in enumerate(top)])
+        if data.get("async"):
+            job = job_queue.submit(transcript=transcript, include_docs=include_docs, namespace=namespace)
+            response = jsonify({"job_id": job["id"], "status": job["status"]})
+            response.headers["Location"] = f"/jobs/{job['id']}"
+            return response, 202
         
-        # Construct prompt for the model
-        prompt = f"""You are MeetingMinder, an AI assistant that analyzes meeting transcripts.
+        result, hit = analyze_cached(transcript, include_docs, namespace)
+        response = jsonify(result)
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        return response
+    
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Error in summarize: {e}")
+        return jsonify({"error": str(e)}), 500
 
-{f"Relevant context from company documents:\n{rag_context}\n" if rag_context else ""}
-Meeting Transcript:
-{transcript}
+@app.route("/summarize_batch", methods=["POST"])
+def summarize_batch():
+    """
+    Analyze many transcripts in one request
+    Body: JSON {"items": [{"id": "...", "transcript": "...", "use_docs": true}, ...], "use_docs": true}
+          (or a bare list), or NDJSON with one item per line (Content-Type: application/x-ndjson)
+    Streams NDJSON back as items finish: {"id", "index", "status": "ok", "cached", "result"} or
+    {"id", "index", "status": "error", "error"}, then {"status": "complete", "items", "ok", "failed"}
+    """
+    try:
+        namespace = namespace_from_request(request)
+        items = parse_batch(request.get_data(), request.content_type or "")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        concurrency = int(request.args.get("concurrency", BATCH_CONCURRENCY))
+    except ValueError:
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+    
+    print(f"Batch of {len(items)} transcripts, concurrency {concurrency}")
+    def analyze(transcript, include_docs):
+        return analyze_cached(transcript, include_docs, namespace)
+    
+    lines = (json.dumps(record) + "\n" for record in run_batch(items, analyze, concurrency))
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
 
-Please analyze this meeting and provide:
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Status of an async /summarize job
+    status: queued | running | done | failed | cancelled; "result" holds the /summarize response once done
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
 
-1. SUMMARY: A concise 3-4 sentence summary of the meeting
-2. ACTION_ITEMS: List of action items in this exact JSON format:
-   [{{"task": "description", "assignee": "person name", "due": "suggested date"}}]
-3. DECISIONS: Key decisions made during the meeting
-4. OPEN_QUESTIONS: Unresolved questions or topics for follow-up
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job (a running analysis is left to finish, its result is discarded)"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
 
-Format your response as valid JSON with these exact keys: summary, action_items, decisions, open_questions
-"""
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Result cache hit/miss counters for this worker"""
+    return jsonify(result_cache.stats())
 
-        # Call HF Inference API
-        print("Calling HF Inference API...")
-        generated = hf_generate(prompt, max_new_tokens=500)
-        print(f"Generated response: {generated[:200]}...")
-        
-        # Try to extract JSON from response
-        result = parse_model_output(generated, transcript)
-        
-        # Add email-ready summary
-        result["email_summary"] = generate_email_summary(result)
-        
-        return jsonify(result)
-    
-    except Exception as e:
-        print(f"Error in summarize: {e}")
-        return jsonify({"error": str(e)}), 500
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms and upstream / retry / cache / token counters,
+    summed over all workers, plus the size of each index loaded in this worker
+    """
+    INDEX_CHUNKS.clear()
+    INDEX_BYTES.clear()
+    for namespace, store in indexes.loaded().items():
+        INDEX_CHUNKS.set(len(store), namespace=namespace)
+        INDEX_BYTES.set(store.memory_bytes(), namespace=namespace)
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
 def parse_model_output(generated: str, transcript: str):
     """Parse model output and extract structured data"""
-    # Try to find JSON in the response
-    json_match = re.search(r'\{[\s\S]*\}', generated)
+    # One linear scan for the JSON object; output cut off mid-object is repaired, not thrown away
+    found = analysis_fields(extract_json(generated))
+    if all(k in found for k in ANALYSIS_KEYS):
+        return found
     
-    if json_match:
-        try:
-            result = json.loads(json_match.group(0))
-            # Validate required keys
-            if all(k in result for k in ["summary", "action_items", "decisions", "open_questions"]):
-                return result
-        except json.JSONDecodeError:
-            pass
-    
-    # Fallback: parse manually
+    # Fallback: the well-formed keys the JSON did have, the rest from headed sections ("SUMMARY: ...")
+    sections = split_sections(generated)
     result = {
-        "summary": extract_section(generated, ["SUMMARY", "Summary"], default="Meeting analysis completed."),
-        "action_items": extract_action_items(generated),
-        "decisions": extract_list(generated, ["DECISIONS", "Decisions"]),
-        "open_questions": extract_list(generated, ["OPEN_QUESTIONS", "Open Questions", "QUESTIONS"])
+        "summary": found.get("summary") or sections.get("summary") or "Meeting analysis completed.",
+        "action_items": found.get("action_items") or extract_action_items(generated, sections),
+        "decisions": found.get("decisions") or bullet_items(sections.get("decisions", "")),
+        "open_questions": found.get("open_questions") or bullet_items(sections.get("open_questions", ""))
     }
     
     return result
 
-def extract_section(text: str, headers: List[str], default: str = "") -> str:
-    """Extract text under a specific header"""
-    for header in headers:
-        pattern = rf"{header}:?\s*(.+?)(?=\n[A-Z_]+:|$)"
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            return match.group(1).strip()
-    return default
-
-def extract_list(text: str, headers: List[str]) -> List[str]:
-    """Extract bullet list under a header"""
-    for header in headers:
-        pattern = rf"{header}:?\s*(.+?)(?=\n[A-Z_]+:|$)"
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            content = match.group(1).strip()
-            # Extract bullet points
-            items = re.findall(r'[-•*]\s*(.+)', content)
-            if items:
-                return [item.strip() for item in items]
-            # Fallback: split by newlines
-            return [line.strip() for line in content.split('\n') if line.strip()]
-    return []
-
-def extract_action_items(text: str) -> List[dict]:
+def extract_action_items(text: str, sections: Dict[str, str]) -> List[dict]:
     """Extract action items from text"""
-    # Try to find JSON array
-    json_match = re.search(r'\[[\s\S]*?\]', text)
-    if json_match:
-        try:
-            items = json.loads(json_match.group(0))
-            if isinstance(items, list) and all(isinstance(i, dict) for i in items):
-                return items
-        except json.JSONDecodeError:
-            pass
-    
-    # Fallback: extract from bullet points
-    action_items = []
-    items = extract_list(text, ["ACTION_ITEMS", "Action Items", "ACTIONS"])
-    for item in items:
-        action_items.append({
-            "task": item,
-            "assignee": "TBD",
-            "due": "TBD"
-        })
+    # Try to find JSON array (in the action items section if there is one)
+    section = sections.get("action_items", "")
+    items = extract_json(section or text, "[")
+    if isinstance(items, list) and items and all(isinstance(i, dict) for i in items):
+        return items
     
-    return action_items
+    # Fallback: bullet points under the action items header
+    return [{"task": item, "assignee": "TBD", "due": "TBD"} for item in bullet_items(section)]
 
 def generate_email_summary(result: dict) -> str:
     """Generate email-ready summary"""
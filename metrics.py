@@ -0,0 +1,349 @@
+# metrics.py - Prometheus counters, gauges and histograms, summed across gunicorn workers for /metrics
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from profiling import record_stage
+
+METRICS_DB = os.getenv("METRICS_DB", "metrics.sqlite3")  # Shared by all workers; empty = this process only
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # Seconds between a worker's snapshots
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RETIRED = "retired"  # Snapshot row that absorbs the totals of workers that have exited
+
+Labels = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Labels, object] = {}
+        registry.register(self)
+
+    def key(self, labels: Dict[str, object]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def label_text(self, key: Labels, extra: str = "") -> str:
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """Monotonic total; summed over workers"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.registry.updating():
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values: Dict[Labels, float], other: Dict[Labels, float]):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def lines(self, values: Dict[Labels, float]) -> List[str]:
+        return [f"{self.name}{self.label_text(key)} {format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    """Current value, reported by the worker serving the scrape (e.g. index sizes read from disk)"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.registry.lock:
+            self.values[self.key(labels)] = value
+
+    def clear(self):
+        with self.registry.lock:
+            self.values.clear()
+
+
+class Histogram(Metric):
+    """Bucketed observations (per-bucket counts, sum, count); summed over workers"""
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.registry.updating():
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]  # buckets, +Inf, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, values: Dict[Labels, list], other: Dict[Labels, list]):
+        for key, entry in other.items():
+            if len(entry) != len(self.buckets) + 2:
+                continue  # Written by a worker running other bucket bounds (mid-deploy)
+            current = values.get(key)
+            values[key] = [a + b for a, b in zip(current, entry)] if current else list(entry)
+
+    def lines(self, values: Dict[Labels, list]) -> List[str]:
+        lines = []
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self.label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self.label_text(key)} {format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    This process's metrics, snapshotted to a SQLite row every METRICS_FLUSH_INTERVAL seconds
+    /metrics on any worker sums every worker's latest snapshot, so a scrape sees the whole service
+    and not just the worker that answered. Workers that exit are folded into one retired row, so
+    totals never go backwards when gunicorn replaces a worker.
+    """
+
+    def __init__(self, path: str = METRICS_DB, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._dirty = False
+        self._flusher: Optional[threading.Thread] = None
+        self._process = self._process_id()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @staticmethod
+    def _process_id() -> str:
+        return f"{os.getpid()}-{time.time():.0f}"
+
+    def _after_fork(self):
+        """A forked worker starts from zero: the parent's values are the parent's row"""
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            if not isinstance(metric, Gauge):
+                metric.values.clear()
+        self._dirty = False
+        self._flusher = None
+        self._process = self._process_id()
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+
+    @contextmanager
+    def updating(self):
+        with self.lock:
+            yield
+            self._dirty = True
+        if self._flusher is None and self.path:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except sqlite3.Error as e:
+                    print(f"Metrics snapshot failed: {e}")
+
+    def snapshot(self) -> Dict[str, list]:
+        """Counters and histograms of this process, as JSON-able [labels, value] pairs"""
+        with self.lock:
+            self._dirty = False
+            return {name: [[list(key), value] for key, value in metric.values.items()]
+                    for name, metric in self.metrics.items() if not isinstance(metric, Gauge) and metric.values}
+
+    def _db(self) -> sqlite3.Connection:
+        """Per-thread, per-process connection (sqlite3 connections must not cross threads or forks)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS metric_snapshots "
+                         "(process TEXT PRIMARY KEY, pid INTEGER, updated_at REAL NOT NULL, data TEXT NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def flush(self):
+        data = json.dumps(self.snapshot())
+        self._db().execute("INSERT OR REPLACE INTO metric_snapshots (process, pid, updated_at, data) "
+                           "VALUES (?, ?, ?, ?)", (self._process, os.getpid(), time.time(), data))
+
+    def _merge_into(self, totals: Dict[str, dict], snapshot: Dict[str, list]):
+        for name, pairs in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is not None and not isinstance(metric, Gauge):
+                metric.merge(totals.setdefault(name, {}), {tuple(key): value for key, value in pairs})
+
+    def _collect_shared(self) -> Dict[str, dict]:
+        """Every worker's latest snapshot summed; exited workers are folded into the retired row first"""
+        self.flush()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT process, pid, updated_at, data FROM metric_snapshots").fetchall()
+            totals: Dict[str, dict] = {}
+            retired: Dict[str, dict] = {}
+            exited = []
+            for process, pid, updated_at, data in rows:
+                snapshot = json.loads(data)
+                self._merge_into(totals, snapshot)
+                if process == RETIRED or (process != self._process and not pid_alive(pid)
+                                          and updated_at < time.time() - 2 * self.flush_interval):
+                    self._merge_into(retired, snapshot)
+                    exited.append(process)
+            if len(exited) > 1 or (exited and exited[0] != RETIRED):
+                data = json.dumps({name: [[list(key), value] for key, value in values.items()]
+                                   for name, values in retired.items()})
+                conn.executemany("DELETE FROM metric_snapshots WHERE process = ?", [(p,) for p in exited])
+                conn.execute("INSERT INTO metric_snapshots (process, pid, updated_at, data) VALUES (?, NULL, ?, ?)",
+                             (RETIRED, time.time(), data))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition of all workers' counters and histograms and this worker's gauges"""
+        totals = None
+        if self.path:
+            try:
+                totals = self._collect_shared()
+            except sqlite3.Error as e:
+                print(f"Metrics DB unavailable, reporting this worker only: {e}")
+        if totals is None:
+            totals = {}
+            self._merge_into(totals, self.snapshot())
+        lines = []
+        for name, metric in self.metrics.items():
+            with self.lock:
+                values = dict(metric.values) if isinstance(metric, Gauge) else totals.get(name, {})
+            lines.extend(metric.header())
+            lines.extend(metric.lines(values))
+        return "\n".join(lines) + "\n"
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+
+# ----------------- Metrics shared by all three apps -----------------
+STAGE_SECONDS = Histogram(registry, "meeting_minder_stage_seconds",
+                          "Time per stage (embedding, search, retrieval, prompt_build, llm_call, parse, email, "
+                          "index_write)", ["stage"])
+REQUEST_SECONDS = Histogram(registry, "meeting_minder_request_seconds", "HTTP request latency",
+                            ["endpoint", "status"])
+UPSTREAM_RESPONSES = Counter(registry, "meeting_minder_upstream_responses_total",
+                             "Responses from upstream APIs (HF, Groq) by status; 'error' = no response",
+                             ["host", "status"])
+UPSTREAM_RETRIES = Counter(registry, "meeting_minder_upstream_retries_total",
+                           "Upstream requests retried, by the status or error that caused the retry", ["host", "reason"])
+CACHE_LOOKUPS = Counter(registry, "meeting_minder_cache_lookups_total", "Cache lookups by cache and result",
+                        ["cache", "result"])
+LLM_TOKENS = Counter(registry, "meeting_minder_llm_tokens_total",
+                     "LLM tokens in (prompt) and out (completion); HF counts are estimated", ["model", "direction"])
+INDEX_CHUNKS = Gauge(registry, "meeting_minder_index_chunks", "Chunks in each loaded namespace's index",
+                     ["namespace"])
+INDEX_BYTES = Gauge(registry, "meeting_minder_index_bytes", "Memory of each loaded namespace's index",
+                    ["namespace"])
+
+
+def observe_stage(stage: str, seconds: float):
+    """One stage's time, in the histogram and in the running request's Server-Timing"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_stage(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """with timed("retrieval"): ... records the block under meeting_minder_stage_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def record_tokens(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, direction="in")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, model=model, direction="out")
+
+
+def observe_request(endpoint: Optional[str], status: int, seconds: float):
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint or "unmatched", status=str(status))
+
+
+def instrument(app):
+    """Time every request of a Flask app under meeting_minder_request_seconds (by route, not URL)"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            observe_request(request.url_rule.rule if request.url_rule else None, response.status_code,
+                            time.perf_counter() - started)
+        return response
@@ -0,0 +1,176 @@
+# model_output.py - Single-pass parsing of model output: the JSON object (repaired if cut off) or headed sections
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+ANALYSIS_KEYS = ("summary", "action_items", "decisions", "open_questions")
+CLOSERS = {"{": "}", "[": "]"}
+WHITESPACE = " \t\r\n"
+
+# "SUMMARY:", "2. ACTION_ITEMS:", "## Open Questions", "**Decisions:**" at the start of a line
+SECTION_RE = re.compile(r"^[ \t]*(?:\d+[.)][ \t]*)?[#*•-]*[ \t]*\**[ \t]*"
+                        r"(summary|action[ _]items|actions|decisions|open[ _]questions|questions)"
+                        r"[ \t]*\**[ \t]*(?::\**|[ \t]*$)", re.IGNORECASE | re.MULTILINE)
+SECTION_FIELDS = {"summary": "summary", "action items": "action_items", "actions": "action_items",
+                  "decisions": "decisions", "open questions": "open_questions", "questions": "open_questions"}
+BULLET_RE = re.compile(r"^[ \t]*(?:[-•*]|\d+[.)])[ \t]+(.+?)[ \t]*$", re.MULTILINE)
+
+
+class JSONSpan:
+    """
+    One scan of a JSON value starting at text[start]: tracks strings, escapes and nesting, and
+    remembers the last point where a value was complete so a truncated tail can be cut back to it
+    """
+
+    def __init__(self, text: str, start: int):
+        self.text = text
+        self.start = start
+        self.end: Optional[int] = None  # Index after the closing bracket; None if the text ran out first
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.safe = (start, 0)  # (cut index, containers open there); those are always stack[:depth]
+        self.commas: List[int] = []  # Trailing commas before a closing bracket
+        self._scan()
+
+    def _scan(self):
+        text, stack = self.text, self.stack
+        expect_key: List[bool] = []  # Per open container: an object waiting for its next key
+        string_is_key = False
+        primitive = False  # Inside a number / true / false / null
+        comma: Optional[int] = None
+        for i in range(self.start, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if not string_is_key:
+                        self.safe = (i + 1, len(stack))
+                continue
+
+            if primitive and (ch in WHITESPACE or ch in ",:]}"):
+                primitive = False
+                self.safe = (i, len(stack))
+            if ch in WHITESPACE:
+                continue
+            if comma is not None:
+                if ch in "]}":
+                    self.commas.append(comma)
+                comma = None
+
+            if ch == '"':
+                self.in_string = True
+                string_is_key = bool(expect_key) and expect_key[-1]
+            elif ch in CLOSERS:
+                stack.append(ch)
+                expect_key.append(ch == "{")
+                self.safe = (i + 1, len(stack))
+            elif ch in "]}":
+                stack.pop()
+                expect_key.pop()
+                if not stack:
+                    self.end = i + 1
+                    return
+                self.safe = (i + 1, len(stack))
+            elif ch == ":":
+                if expect_key:
+                    expect_key[-1] = False
+            elif ch == ",":
+                comma = i
+                if stack[-1] == "{":
+                    expect_key[-1] = True
+            else:
+                primitive = True
+
+    def _source(self, end: int) -> str:
+        """text[start:end] without the trailing commas JSON does not allow"""
+        commas = [c for c in self.commas if c < end]
+        if not commas:
+            return self.text[self.start:end]
+        pieces, pos = [], self.start
+        for c in commas:
+            pieces.append(self.text[pos:c])
+            pos = c + 1
+        pieces.append(self.text[pos:end])
+        return "".join(pieces)
+
+    def parse(self) -> Any:
+        """The value, or None if it can't be read even after repair"""
+        attempts = []
+        if self.end is not None:
+            attempts.append(self.text[self.start:self.end])
+            if self.commas:
+                attempts.append(self._source(self.end))
+        else:
+            # Cut off mid-output: close the open string and containers as they stand...
+            tail = self._source(len(self.text))
+            if self.in_string:
+                tail = (tail[:-1] if self.escape else tail) + '"'
+            tail = tail.rstrip(WHITESPACE + ",")
+            attempts.append(tail + "".join(CLOSERS[c] for c in reversed(self.stack)))
+            # ...or, if the cut fell inside a key or literal, back to the last complete value
+            cut, depth = self.safe
+            attempts.append(self._source(cut) + "".join(CLOSERS[c] for c in reversed(self.stack[:depth])))
+        for source in attempts:
+            try:
+                return json.loads(source)
+            except (ValueError, RecursionError):  # JSONDecodeError, or nesting deeper than json allows
+                continue
+        return None
+
+
+def extract_json(text: str, opener: str = "{") -> Any:
+    """
+    The first JSON object (or array, with opener="[") in text, in time linear in its length
+    Preambles and code fences are skipped, trailing commas dropped and output that was cut off
+    (e.g. by max_tokens) closed. Returns None if nothing parses.
+    """
+    start = text.find(opener)
+    while start != -1:
+        span = JSONSpan(text, start)
+        value = span.parse()
+        if value is not None:
+            return value
+        if span.end is None:
+            return None
+        start = text.find(opener, span.end)  # Resume after the unreadable span, never rescanning it
+    return None
+
+
+def analysis_fields(found: Any) -> Dict[str, Any]:
+    """
+    The analysis fields of a parsed reply that have the expected shape; the others are left out
+    A repaired reply can hold anything, e.g. action items as plain strings, and callers index into them.
+    """
+    if not isinstance(found, dict):
+        return {}
+    fields = {}
+    if isinstance(found.get("summary"), str):
+        fields["summary"] = found["summary"]
+    if isinstance(found.get("action_items"), list) and all(isinstance(i, dict) for i in found["action_items"]):
+        fields["action_items"] = found["action_items"]
+    for key in ("decisions", "open_questions"):
+        if isinstance(found.get(key), list) and all(isinstance(i, str) for i in found[key]):
+            fields[key] = found[key]
+    return fields
+
+
+def split_sections(text: str) -> Dict[str, str]:
+    """Headed sections of plain-text output ("SUMMARY: ...", "DECISIONS:" + bullets), field -> body"""
+    matches = list(SECTION_RE.finditer(text))
+    sections: Dict[str, str] = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        field = SECTION_FIELDS[match.group(1).lower().replace("_", " ")]
+        sections.setdefault(field, text[match.end():end].strip())
+    return sections
+
+
+def bullet_items(body: str) -> List[str]:
+    """Bulleted or numbered lines of a section, else its non-empty lines"""
+    items = BULLET_RE.findall(body)
+    return items or [line.strip() for line in body.splitlines() if line.strip()]
@@ -0,0 +1,218 @@
+# profiling.py - Per-request stage timings (Server-Timing header) and an opt-in sampling profiler
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Set
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of timed requests profiled; 0 = off
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # Seconds between stack samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Collapsed-stack files, one per profiled request
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Required for sampling and for X-Profile; empty = profiler disabled
+
+# Server-Timing order; stages not listed follow in the order they were first recorded
+STAGE_ORDER = ("embedding", "search", "retrieval", "prompt_build", "llm_call", "parse", "email", "index_write")
+TIMED_ENDPOINTS = ("summarize", "upload_docs")
+
+_current: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Time per stage for one request, summed over the threads working on it"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, list] = {}  # stage -> [seconds, calls]
+        self.threads: Set[int] = {threading.get_ident()}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def attach(self, ident: int):
+        with self._lock:
+            self.threads.add(ident)
+
+    def detach(self, ident: int):
+        with self._lock:
+            self.threads.discard(ident)
+
+    def thread_ids(self) -> Set[int]:
+        with self._lock:
+            return set(self.threads)
+
+    def as_dict(self) -> Dict[str, dict]:
+        """{stage: {"ms", "calls"}} in display order, plus the total so far"""
+        with self._lock:
+            stages = dict(self.stages)
+        names = [s for s in STAGE_ORDER if s in stages] + [s for s in stages if s not in STAGE_ORDER]
+        timings = {name: {"ms": round(stages[name][0] * 1000, 1), "calls": stages[name][1]} for name in names}
+        timings["total"] = {"ms": round((time.perf_counter() - self.started) * 1000, 1), "calls": 1}
+        return timings
+
+    def header(self) -> str:
+        """Server-Timing value, e.g. 'search;dur=3.1, llm_call;dur=812.4;desc="2 calls", total;dur=840.2'"""
+        entries = []
+        for name, timing in self.as_dict().items():
+            entry = f"{name};dur={timing['ms']}"
+            if timing["calls"] > 1:
+                entry += f';desc="{timing["calls"]} calls"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add to the current request's timings, if a timed request is running"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def collect_timings():
+    """Time the stages of a block outside the Flask hooks, e.g. a streamed response body"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def carry_context(fn: Callable) -> Callable:
+    """
+    fn for a worker thread, run in a copy of the caller's context
+    Stages it times count toward the caller's request, and the profiler samples its thread while it runs.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(_run_attached, fn, args, kwargs)
+    return run
+
+
+def _run_attached(fn: Callable, args, kwargs):
+    timings = _current.get()
+    if timings is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    timings.attach(ident)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings.detach(ident)
+
+
+def frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """One stack as 'outermost;...;innermost', the collapsed format flamegraph.pl and speedscope read"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Wall-clock samples of some threads' stacks every interval seconds (time blocked on I/O included)"""
+
+    def __init__(self, threads: Callable[[], Iterable[int]], interval: float = PROFILE_INTERVAL):
+        self.threads = threads
+        self.interval = interval
+        self.samples: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in self.threads():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = collapse(frame)
+                    self.samples[stack] = self.samples.get(stack, 0) + 1
+            del frames  # Don't keep other threads' frames alive until the next sample
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+
+def write_profile(samples: Dict[str, int], label: str, directory: str = PROFILE_DIR) -> str:
+    """Save 'stack count' lines; returns the file name (flamegraph.pl profile.folded > profile.svg)"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{os.getpid()}-{uuid.uuid4().hex[:6]}.folded"
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f"{stack} {count}\n")
+    return name
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def should_profile(headers) -> bool:
+    """X-Profile: 1 with the admin token forces a profile; otherwise PROFILE_SAMPLE_RATE, if an admin token is set"""
+    if not ADMIN_TOKEN:
+        return False
+    if headers.get("X-Profile") == "1":
+        return is_admin(headers.get("X-Admin-Token"))
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def instrument_timing(app, endpoints: Iterable[str] = TIMED_ENDPOINTS):
+    """Server-Timing on the given endpoints' responses, and the sampling profiler on some of their requests"""
+    from flask import g, request
+    endpoints = set(endpoints)
+
+    @app.before_request
+    def start_request_timings():
+        if request.endpoint not in endpoints:
+            return
+        timings = RequestTimings()
+        g.request_timings = (timings, _current.set(timings))
+        if should_profile(request.headers):
+            g.request_profiler = SamplingProfiler(timings.thread_ids).start()
+
+    @app.after_request
+    def add_server_timing(response):
+        state = g.get("request_timings")
+        if state is None:
+            return response
+        profiler = g.pop("request_profiler", None)
+        if profiler is not None:
+            try:
+                response.headers["X-Profile"] = write_profile(profiler.stop(), request.endpoint)
+            except OSError as e:
+                print(f"⚠️  Could not write profile: {e}")
+        response.headers["Server-Timing"] = state[0].header()
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+    @app.teardown_request
+    def end_request_timings(exc):
+        profiler = g.pop("request_profiler", None)
+        if profiler is not None:
+            profiler.stop()  # The response was never finalized
+        state = g.pop("request_timings", None)
+        if state is not None:
+            _current.reset(state[1])
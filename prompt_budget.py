@@ -0,0 +1,170 @@
+# prompt_budget.py - Prompt assembly under a token budget: compress the transcript, dedupe and fit RAG context
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from tokenizers import Tokenizer  # Installed with sentence-transformers; otherwise counts are estimated
+except ImportError:
+    Tokenizer = None
+
+from segments import SENTENCE_RE, estimate_tokens
+
+CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.25"))  # Budget kept for RAG context when both don't fit
+TRUNCATION_MARK = "[... transcript truncated to fit the model's input ...]"
+
+# Disfluencies only: whole filler words, "you know" / "I mean" set off by commas, stutters and doubled words.
+# "er" (ER, Er.) and "mm-hmm" (a reply on its own) can carry meaning, so they stay.
+# A filler goes with the punctuation around it: "we should, um, go" -> "we should go", "ship, uh." -> "ship."
+FILLER_RE = re.compile(r"(?P<comma>,[ \t]*)?(?<![\w-])(?:u+h*m+|u+h+|a+h+|hmm+)\b(?!-)(?:,|…|\.{2,})?"
+                       r"(?P<end>[.?!])?(?P<space>[ \t]*)", re.IGNORECASE)
+HEDGE_RE = re.compile(r",?[ \t]*\b(?:you know|I mean)\b,[ \t]*", re.IGNORECASE)
+STUTTER_RE = re.compile(r"\b([^\W\d_]{1,3})-(?=\1)", re.IGNORECASE)  # "I-I think", "w-we" -> "I think", "we"
+# Only function words that never double in a sentence are collapsed ("the the" -> "the"); "no, no",
+# "2 2", "very very" and "check in in person" are meant
+REPEAT_WORDS = ("the", "a", "an", "i", "to", "of", "and", "for", "we", "it", "my", "our")
+REPEAT_RE = re.compile(rf"\b({'|'.join(REPEAT_WORDS)})(?:[ \t]+\1\b)+", re.IGNORECASE)
+SPACES_RE = re.compile(r"[ \t]{2,}")
+WORD_GAP_RE = re.compile(r"\s+")
+ORPHAN_COMMA_RE = re.compile(r"(:[ \t]*|^[ \t]*),[ \t]*", re.MULTILINE)  # "Sarah: , so" after removals
+
+
+class TokenCounter:
+    """Counts tokens with the generation model's tokenizer when it can be loaded, else ~4 characters per token"""
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self.name = tokenizer_name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    if self.name and Tokenizer is not None:
+                        try:
+                            self._tokenizer = Tokenizer.from_pretrained(self.name)
+                        except Exception as e:
+                            print(f"⚠️  Tokenizer {self.name} unavailable, estimating token counts: {e}")
+                    self._loaded = True
+        return self._tokenizer
+
+    @property
+    def source(self) -> str:
+        return self.name if self._load() is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        tokenizer = self._load()
+        if tokenizer is None:
+            return estimate_tokens(text)
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def drop_filler(match: re.Match) -> str:
+    """What a FILLER_RE match leaves: a mid-sentence filler keeps a word gap or the sentence end it carried"""
+    if not match.group("comma"):
+        return ""  # Opens the turn or clause, or stands between words: its own spacing goes with it
+    return match.group("end") + match.group("space") if match.group("end") else " "
+
+
+def compress_transcript(transcript: str) -> str:
+    """Strip fillers and disfluencies; the words that carry meaning are left untouched"""
+    text = STUTTER_RE.sub("", transcript)
+    text = HEDGE_RE.sub(" ", text)
+    text = FILLER_RE.sub(drop_filler, text)
+    text = REPEAT_RE.sub(r"\1", text)
+    text = ORPHAN_COMMA_RE.sub(r"\1", text)
+    text = SPACES_RE.sub(" ", text)
+    return "\n".join(line.rstrip() for line in text.splitlines())
+
+
+def dedupe_context(chunks: List[str]) -> List[str]:
+    """Drop sentences an earlier (better ranked) chunk already contains, e.g. the overlap between neighbours"""
+    seen, kept = set(), []
+    for chunk in chunks:
+        sentences = []
+        for sentence in SENTENCE_RE.split(chunk):
+            key = " ".join(sentence.lower().split())
+            if key and key not in seen:
+                seen.add(key)
+                sentences.append(sentence)
+        if sentences:
+            kept.append(" ".join(sentences))
+    return kept
+
+
+def cut_at_word(text: str, max_tokens: int, counter: TokenCounter) -> str:
+    """Longest start of text that ends at a word boundary and fits in max_tokens (binary search over the gaps)"""
+    gaps = [m.start() for m in WORD_GAP_RE.finditer(text)]
+    lo, hi = 0, len(gaps)  # Invariant: the first lo gaps fit, the cut at gap hi (if any) does not
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if counter.count(text[:gaps[mid - 1]]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:gaps[lo - 1]] if lo else ""
+
+
+def truncate_lines(text: str, max_tokens: int, counter: TokenCounter) -> str:
+    """
+    Keep whole lines (speaker turns) from the start while they fit, then mark the cut
+    The first line that doesn't fit is cut at a word boundary to fill what is left, so a transcript
+    without line breaks (or one long turn) is shortened rather than dropped.
+    """
+    budget = max_tokens - counter.count(TRUNCATION_MARK) - 1
+    kept, used = [], 0
+    for line in text.splitlines():
+        size = counter.count(line) + 1
+        if used + size > budget:
+            partial = cut_at_word(line, budget - used - 1, counter)
+            if partial:
+                kept.append(partial)
+            break
+        kept.append(line)
+        used += size
+    return "\n".join(kept + [TRUNCATION_MARK])
+
+
+def fit_prompt(render: Callable[[str, List[str]], str], transcript: str, chunks: List[str], max_tokens: int,
+               counter: TokenCounter, context_share: float = CONTEXT_SHARE) -> Tuple[str, List[str], Dict]:
+    """
+    Compress the transcript and context and fit both into max_tokens of rendered prompt
+    render(transcript, chunks) must produce the full prompt text (all messages) so the template is counted.
+    When both don't fit, the context keeps at least context_share of the room and whole chunks are
+    dropped from the lowest ranked; the transcript is cut (at a line, else a word boundary) only as a last resort.
+    Returns (transcript, chunks, token counts).
+    """
+    original = counter.count(render(transcript, chunks))
+    transcript = compress_transcript(transcript)
+    chunks = dedupe_context(chunks)
+
+    room = max_tokens - counter.count(render("", []))
+    transcript_tokens = counter.count(transcript)
+    sizes = [counter.count(chunk) + 4 for chunk in chunks]  # + the "[Context n]: " label
+    truncated = False
+    if transcript_tokens + sum(sizes) > room:
+        context_room = max(int(room * context_share), room - transcript_tokens)
+        kept, used = [], 0
+        for chunk, size in zip(chunks, sizes):
+            if used + size <= context_room:
+                kept.append(chunk)
+                used += size
+        chunks = kept
+        if transcript_tokens > room - used:
+            transcript = truncate_lines(transcript, room - used, counter)
+            truncated = True
+
+    prompt_tokens = counter.count(render(transcript, chunks))
+    return transcript, chunks, {
+        "prompt": prompt_tokens,
+        "original": original,
+        "saved": max(0, original - prompt_tokens),
+        "budget": max_tokens,
+        "context_chunks": len(chunks),
+        "truncated": truncated,
+        "tokenizer": counter.source,
+    }
+
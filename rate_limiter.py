@@ -0,0 +1,131 @@
+# rate_limiter.py - Client-side request/token buckets for upstream LLM quotas, shared across workers
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "rate_limit.sqlite3")  # Shared by all workers; empty = per process
+RATE_LIMIT_WAIT = float(os.getenv("RATE_LIMIT_WAIT", "60"))  # Longest a request may queue for quota (seconds)
+
+
+class RateLimitTimeout(Exception):
+    """The request could not be admitted within its deadline"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages: List[dict], max_tokens: int) -> int:
+    """Quota cost of a chat request: prompt (~4 characters per token) plus the completion budget"""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // 4 + len(messages) * 4 + max_tokens
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets with reservation (virtual scheduling)
+    acquire() takes its cost at once, letting the balance go negative, and sleeps until the
+    reservation is covered. Waiters are served in arrival order, without polling, and
+    throughput stays at the configured ceiling.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float, path: str = RATE_LIMIT_DB):
+        self.name = name
+        self.limits = {"requests": rpm, "tokens": tpm}  # Bucket capacity = one minute of quota
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory: Dict[str, tuple] = {}  # bucket -> (level, updated_at) when there is no shared DB
+        self.waited = 0.0
+        self.admitted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit > 0 for limit in self.limits.values())
+
+    def _db(self) -> sqlite3.Connection:
+        """Per-thread, per-process connection (sqlite3 connections must not cross threads or forks)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _reserve(self, costs: Dict[str, float], now: float, max_wait: Optional[float], load, store) -> float:
+        """Refill, then reserve costs if they can be covered within max_wait; returns the wait (or -wait if refused)"""
+        levels, wait = {}, 0.0
+        for bucket, cost in costs.items():
+            limit = self.limits[bucket]
+            if limit <= 0:
+                continue
+            rate = limit / 60.0
+            level, updated_at = load(bucket) or (limit, now)
+            level = min(limit, level + (now - updated_at) * rate)
+            levels[bucket] = (level, cost)
+            wait = max(wait, (min(cost, limit) - level) / rate)
+        if max_wait is not None and wait > max_wait:
+            return -wait
+        for bucket, (level, cost) in levels.items():
+            store(bucket, level - cost, now)
+        return max(wait, 0.0)
+
+    def _reserve_shared(self, costs: Dict[str, float], max_wait: Optional[float]) -> float:
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")  # Serializes the read-modify-write across workers
+        try:
+            def load(bucket):
+                return conn.execute("SELECT level, updated_at FROM buckets WHERE name = ?",
+                                    (f"{self.name}:{bucket}",)).fetchone()
+
+            def store(bucket, level, updated_at):
+                conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                             (f"{self.name}:{bucket}", level, updated_at))
+
+            wait = self._reserve(costs, time.time(), max_wait, load, store)
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _reserve_local(self, costs: Dict[str, float], max_wait: Optional[float]) -> float:
+        with self._lock:
+            return self._reserve(costs, time.time(), max_wait, self._memory.get,
+                                 lambda bucket, level, at: self._memory.__setitem__(bucket, (level, at)))
+
+    def _apply(self, costs: Dict[str, float], max_wait: Optional[float]) -> float:
+        if self.path:
+            try:
+                return self._reserve_shared(costs, max_wait)
+            except sqlite3.Error as e:
+                print(f"Rate limiter DB unavailable, limiting per process: {e}")
+        return self._reserve_local(costs, max_wait)
+
+    def acquire(self, tokens: int, timeout: float = RATE_LIMIT_WAIT) -> float:
+        """Block until one request of the given token cost fits the quota; returns seconds waited"""
+        if not self.enabled:
+            return 0.0
+        wait = self._apply({"requests": 1, "tokens": tokens}, timeout)
+        if wait < 0:
+            raise RateLimitTimeout(f"{self.name} quota busy: next slot in {-wait:.0f}s "
+                                   f"exceeds the {timeout:.0f}s queue limit", retry_after=-wait)
+        if wait > 0:
+            time.sleep(wait)
+        self.waited += wait
+        self.admitted += 1
+        return wait
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Return (or charge) the difference once the provider reports the real token usage"""
+        if actual is None or not self.enabled or self.limits["tokens"] <= 0:
+            return
+        self._apply({"tokens": actual - estimated}, None)
+
+    def stats(self) -> dict:
+        return {"admitted": self.admitted, "waited_seconds": round(self.waited, 2),
+                "rpm": self.limits["requests"], "tpm": self.limits["tokens"], "shared": bool(self.path)}
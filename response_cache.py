@@ -0,0 +1,142 @@
+# response_cache.py - Content-addressed /summarize result cache (in-memory LRU+TTL, optional SQLite tier)
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import CACHE_LOOKUPS
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))  # In-memory entries per worker
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))  # Seconds
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")  # SQLite path shared by all workers; empty disables
+RESULT_CACHE_DB_MAX = int(os.getenv("RESULT_CACHE_DB_MAX", "10000"))  # Rows kept in the SQLite tier
+
+
+def normalize_transcript(text: str) -> str:
+    """Collapse whitespace so trivially reformatted re-submissions hit the cache"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(transcript: str, use_docs: bool, index_version, model: str, template: str) -> str:
+    """SHA-256 over everything that determines the analysis result"""
+    parts = {
+        "transcript": normalize_transcript(transcript),
+        "use_docs": bool(use_docs),
+        "index_version": index_version if use_docs else None,
+        "model": model,
+        "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """LRU+TTL dict in front of an optional SQLite table shared across processes"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL,
+                 db_path: str = RESULT_CACHE_DB, db_max_rows: int = RESULT_CACHE_DB_MAX):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_rows = db_max_rows
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache="result", result="hit")
+                return json.loads(entry[1])
+            if entry:
+                del self._entries[key]
+
+        value = self._db_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="result", result="miss")
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            CACHE_LOOKUPS.inc(cache="result", result="disk_hit")
+            self._remember(key, value[1], value[0])
+        return json.loads(value[1])
+
+    def set(self, key: str, result: dict):
+        # Stored serialized: callers get a fresh copy on every hit
+        payload = json.dumps(result)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, payload, expires_at)
+        self._db_set(key, payload, expires_at)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "disk_tier": bool(self.db_path),
+        }
+
+    def _remember(self, key: str, payload: str, expires_at: float):
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ----- SQLite tier -----
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Per-thread, per-process connection (sqlite3 connections must not cross threads or forks)"""
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _db_get(self, key: str, now: float):
+        try:
+            conn = self._db()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT expires_at, value FROM results WHERE key = ? AND expires_at > ?",
+                               (key, now)).fetchone()
+            return row
+        except sqlite3.Error as e:
+            print(f"Result cache read failed: {e}")
+            return None
+
+    def _db_set(self, key: str, payload: str, expires_at: float):
+        try:
+            conn = self._db()
+            if conn is None:
+                return
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                             (key, payload, expires_at))
+                if random.random() < 0.05:  # Amortized cleanup: expire, then trim to the newest rows
+                    conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+                    conn.execute("DELETE FROM results WHERE key NOT IN "
+                                 "(SELECT key FROM results ORDER BY expires_at DESC LIMIT ?)", (self.db_max_rows,))
+        except sqlite3.Error as e:
+            print(f"Result cache write failed: {e}")
@@ -0,0 +1,52 @@
+# retrieval.py - Multi-query RAG retrieval: one query per transcript segment, merged by reciprocal-rank fusion
+import os
+from typing import Callable, Dict, List
+
+from segments import estimate_tokens, item_words, segment_transcript, similar
+
+QUERY_TOKENS = int(os.getenv("RETRIEVAL_QUERY_TOKENS", "200"))  # Target size of each query segment
+MAX_QUERIES = int(os.getenv("RETRIEVAL_MAX_QUERIES", "8"))  # Longer transcripts get larger segments instead
+RRF_K = 60  # Standard reciprocal-rank fusion constant: damps the weight of any single list's top hit
+DEPTH_FACTOR = 2  # Each query fetches k * DEPTH_FACTOR candidates for fusion
+
+SearchMany = Callable[[List[str], int], List[List[str]]]  # (queries, k) -> top-k texts per query
+
+
+def split_queries(transcript: str, query_tokens: int = QUERY_TOKENS, max_queries: int = MAX_QUERIES) -> List[str]:
+    """Consecutive speaker turns packed into at most max_queries topical segments"""
+    size = max(query_tokens, estimate_tokens(transcript) // max(1, max_queries) + 1)
+    while True:
+        queries = [s for s in segment_transcript(transcript, max_tokens=size) if s.strip()]
+        if len(queries) <= max_queries:
+            return queries
+        size = size * 5 // 4  # Turns don't pack exactly; grow the segments until they fit
+
+
+def rrf_fuse(rankings: List[List[str]], k: int, rrf_k: int = RRF_K) -> List[str]:
+    """
+    Merge ranked lists by sum of 1 / (rrf_k + rank), dropping exact and near-duplicate chunks
+    Chunks found by several segments rise to the top without comparing scores across queries.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, text in enumerate(ranking, 1):
+            scores[text] = scores.get(text, 0.0) + 1.0 / (rrf_k + rank)
+    fused, seen = [], []
+    for text in sorted(scores, key=scores.get, reverse=True):
+        words = item_words(text)
+        if any(similar(words, other) for other in seen):
+            continue  # Overlapping chunks of the same passage
+        fused.append(text)
+        seen.append(words)
+        if len(fused) == k:
+            break
+    return fused
+
+
+def multi_query(transcript: str, search_many: SearchMany, k: int = 3) -> List[str]:
+    """Top-k context chunks for a transcript: batched search over its segments, fused by rank"""
+    queries = split_queries(transcript)
+    if not queries:
+        return []
+    rankings = search_many(queries, k * DEPTH_FACTOR if len(queries) > 1 else k)
+    return rrf_fuse(rankings, k)
@@ -0,0 +1,168 @@
+# segments.py - Map-reduce analysis for long transcripts: split by speaker turns, merge and dedupe results
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from profiling import carry_context
+
+SEGMENT_TOKENS = int(os.getenv("SEGMENT_TOKENS", "3000"))  # Transcripts longer than this are analyzed in segments
+SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", "4"))  # Segments analyzed at once
+DEDUP_SIMILARITY = 0.6  # Word-set Jaccard above which two extracted items are the same item
+
+SPEAKER_RE = re.compile(r"^[ \t]*[A-Z][\w .'()-]{0,40}:\s", re.MULTILINE)  # "Sarah: ..." / "John Martinez (PM): ..."
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+WORD_RE = re.compile(r"\w+")
+STOPWORDS = {"the", "a", "an", "and", "or", "to", "of", "for", "on", "in", "by", "with", "we", "is", "be", "will"}
+UNKNOWN = {"", "tbd", "n/a", "none", "unknown", "unassigned"}
+
+SUMMARY_REDUCE_PROMPT = """These are summaries of consecutive parts of one meeting:
+
+{summaries}
+
+Write a single concise 3-4 sentence summary of the whole meeting. Return only the summary text."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def split_turns(transcript: str) -> List[str]:
+    """Split at speaker turns; transcripts without speaker labels fall back to paragraphs"""
+    starts = [m.start() for m in SPEAKER_RE.finditer(transcript)]
+    if len(starts) < 2:
+        return [p for p in re.split(r"\n\s*\n", transcript) if p.strip()]
+    bounds = ([0] if starts[0] > 0 else []) + starts + [len(transcript)]
+    return [transcript[a:b] for a, b in zip(bounds, bounds[1:]) if transcript[a:b].strip()]
+
+
+def split_oversized(turn: str, max_tokens: int) -> List[str]:
+    """Break a single turn longer than the budget at sentence boundaries"""
+    pieces, current = [], ""
+    for sentence in SENTENCE_RE.split(turn):
+        if current and estimate_tokens(current + " " + sentence) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def segment_transcript(transcript: str, max_tokens: int = SEGMENT_TOKENS) -> List[str]:
+    """Pack consecutive turns into segments of at most max_tokens; short transcripts stay whole"""
+    if estimate_tokens(transcript) <= max_tokens:
+        return [transcript]
+    segments, current, used = [], [], 0
+    for turn in split_turns(transcript):
+        for piece in split_oversized(turn, max_tokens) if estimate_tokens(turn) > max_tokens else [turn]:
+            size = estimate_tokens(piece)
+            if current and used + size > max_tokens:
+                segments.append("".join(current).strip())
+                current, used = [], 0
+            current.append(piece if piece.endswith("\n") else piece + "\n")
+            used += size
+    if current:
+        segments.append("".join(current).strip())
+    return segments
+
+
+def item_words(text: str) -> frozenset:
+    return frozenset(w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS)
+
+
+def similar(a: frozenset, b: frozenset) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= DEDUP_SIMILARITY
+
+
+def dedupe_strings(items: List) -> List[str]:
+    """Drop near-duplicate entries, keeping the first (earliest) wording"""
+    kept, seen = [], []
+    for item in items:
+        text = str(item).strip()
+        words = item_words(text)
+        if text and not any(similar(words, other) for other in seen):
+            kept.append(text)
+            seen.append(words)
+    return kept
+
+
+def merge_action_items(items: List) -> List[dict]:
+    """Dedupe action items by task; a duplicate fills in an assignee/due the first mention lacked"""
+    kept, seen = [], []
+    for item in items:
+        item = dict(item) if isinstance(item, dict) else {"task": str(item)}
+        task = str(item.get("task", "")).strip()
+        if not task:
+            continue
+        words = item_words(task)
+        for existing, other in zip(kept, seen):
+            if similar(words, other):
+                for field in ("assignee", "due"):
+                    if str(existing.get(field, "")).strip().lower() in UNKNOWN and item.get(field):
+                        existing[field] = item[field]
+                break
+        else:
+            kept.append(item)
+            seen.append(words)
+    return kept
+
+
+def merge_results(results: List[dict]) -> dict:
+    """Combine per-segment analyses (in transcript order) into the /summarize schema"""
+    def collect(key):
+        values = []
+        for result in results:
+            value = result.get(key) or []
+            values.extend(value if isinstance(value, list) else [value])
+        return values
+
+    merged = {
+        "summary": " ".join(str(r.get("summary", "")).strip() for r in results if r.get("summary")),
+        "action_items": merge_action_items(collect("action_items")),
+        "decisions": dedupe_strings(collect("decisions")),
+        "open_questions": dedupe_strings(collect("open_questions")),
+    }
+    counts = [r["tokens"] for r in results if r.get("tokens")]
+    if counts:
+        merged["tokens"] = sum_token_counts(counts)
+    return merged
+
+
+def sum_token_counts(counts: List[Dict]) -> Dict:
+    """Token counts of several prompts (map-reduce segments) added up"""
+    total = {"prompt": 0, "original": 0, "saved": 0, "context_chunks": 0, "truncated": False}
+    for c in counts:
+        for key in ("prompt", "original", "saved", "context_chunks"):
+            total[key] += c.get(key, 0)
+        total["truncated"] = total["truncated"] or bool(c.get("truncated"))
+    if counts:
+        total.update(budget=counts[0].get("budget"), tokenizer=counts[0].get("tokenizer"), prompts=len(counts))
+    return total
+
+
+def format_summaries(summaries: List[str]) -> str:
+    return SUMMARY_REDUCE_PROMPT.format(summaries="\n".join(f"Part {i+1}: {s}" for i, s in enumerate(summaries)))
+
+
+def map_reduce(segments: List[str], analyze: Callable[[str], dict],
+               combine_summaries: Optional[Callable[[List[str]], str]] = None,
+               concurrency: int = SEGMENT_CONCURRENCY) -> dict:
+    """
+    Analyze segments in parallel (latency tracks the slowest segment, not the total length), then merge
+    combine_summaries, if given, condenses the per-segment summaries with one short extra model call.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(segments)))) as pool:
+        results = list(pool.map(carry_context(analyze), segments))
+    merged = merge_results(results)
+    summaries = [str(r.get("summary", "")).strip() for r in results if r.get("summary")]
+    if combine_summaries and len(summaries) > 1:
+        try:
+            merged["summary"] = combine_summaries(summaries).strip() or merged["summary"]
+        except Exception as e:
+            print(f"Summary reduce failed, keeping per-segment summaries: {e}")
+    return merged
@@ -0,0 +1,53 @@
+# startup.py - Startup timing profile (import this first so the clock starts before heavy imports)
+import os
+import time
+from typing import Dict, Optional
+
+
+def memory_mb() -> Dict[str, Optional[float]]:
+    """Resident and proportional set size of this process (PSS shows how much copy-on-write sharing saves)"""
+    usage = {"rss_mb": None, "pss_mb": None}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    usage[f"{key.lower()}_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        try:
+            import resource  # Peak rather than current RSS; KiB on Linux, bytes on macOS
+            usage["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+    return usage
+
+
+class StartupProfile:
+    """Named stage timings since process start, e.g. imports / app setup / model load"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> float:
+        """Record the time since the previous mark under this stage name"""
+        now = time.perf_counter()
+        self.stages[stage] = round(now - self._last, 3)
+        self._last = now
+        return self.stages[stage]
+
+    def record(self, stage: str, seconds: float):
+        """Record a stage timed elsewhere (e.g. a lazy load that happens after startup)"""
+        self.stages[stage] = round(seconds, 3)
+
+    def report(self) -> dict:
+        return {"pid": os.getpid(), "stages": dict(self.stages),
+                "total_s": round(sum(self.stages.values()), 3), **memory_mb()}
+
+    def print_report(self):
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+        print(f"✓ Startup profile (pid {os.getpid()}): {stages}")
+
+
+profile = StartupProfile()
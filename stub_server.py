@@ -0,0 +1,210 @@
+# stub_server.py - Local stand-in for the Groq and HF Inference APIs, for offline benchmarks
+#
+#   python stub_server.py --port 8900 --latency 0.2 --tokens-per-second 300 --error-rate 0.02
+#   GROQ_BASE=http://127.0.0.1:8900/openai/v1 HF_BASE=http://127.0.0.1:8900/models python meeting_minder_groq.py
+#
+# Serves chat completions (plain and streamed), HF feature extraction (one vector per input) and HF
+# text generation. Replies are a fixed analysis JSON. Embeddings are seeded by the text, so indexes
+# and caches behave as they would with a real model. GET /stats returns request counts.
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPLY = {
+    "summary": "The team reviewed the release plan, agreed on the launch date and assigned follow-ups "
+               "for documentation, testing and the customer announcement.",
+    "action_items": [
+        {"task": "Finish the API documentation", "assignee": "Sarah", "due": "Friday"},
+        {"task": "Run the load tests against staging", "assignee": "John", "due": "Wednesday"},
+        {"task": "Draft the customer announcement", "assignee": "Lisa", "due": "Next Monday"},
+    ],
+    "decisions": ["Launch on the 15th", "Freeze features after Wednesday"],
+    "open_questions": ["Do we need a staged rollout?"],
+}
+CHARS_PER_TOKEN = 4
+
+
+class StubConfig:
+    """Latency model and fault injection, shared by all handler threads"""
+
+    def __init__(self, latency: float = 0.1, jitter: float = 0.05, tokens_per_second: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, dim: int = 1024, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second  # Generation pace; 0 = the whole reply at once
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.dim = dim
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"chat": 0, "chat_stream": 0, "embeddings": 0, "embedded_texts": 0, "generate": 0,
+                       "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.counts[key] += value
+
+    def wait(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+    def fail(self) -> bool:
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+def embed(text: str, dim: int) -> list:
+    """Unit vector seeded by the text: the same text always gets the same embedding"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def reply_tokens(reply: str) -> list:
+    """The reply split into ~token-sized pieces for streaming"""
+    return [reply[i:i + CHARS_PER_TOKEN] for i in range(0, len(reply), CHARS_PER_TOKEN)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the apps' pooled sessions expect
+    config: StubConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.config.lock:
+                self.send_json(200, dict(self.config.counts))
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.config.wait()
+        if self.config.fail():
+            self.config.count(errors=1)
+            self.send_json(self.config.error_status, {"error": {"message": "Injected failure"}},
+                           {"Retry-After": "0"})
+        elif self.path.endswith("/chat/completions"):
+            self.chat(payload)
+        elif self.path.startswith("/models/"):
+            if "parameters" in payload:
+                self.generate(payload)
+            else:
+                self.embeddings(payload)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def pace(self, tokens: int):
+        if self.config.tokens_per_second > 0:
+            time.sleep(tokens / self.config.tokens_per_second)
+
+    def chat(self, payload: dict):
+        """OpenAI-compatible chat completion; JSON replies whatever the prompt"""
+        prompt = sum(len(str(m.get("content", ""))) for m in payload.get("messages", [])) // CHARS_PER_TOKEN
+        reply = json.dumps(REPLY)
+        pieces = reply_tokens(reply)
+        usage = {"prompt_tokens": prompt, "completion_tokens": len(pieces), "total_tokens": prompt + len(pieces)}
+        self.config.count(prompt_tokens=prompt, completion_tokens=len(pieces))
+        if not payload.get("stream"):
+            self.config.count(chat=1)
+            self.pace(len(pieces))
+            self.send_json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                              "finish_reason": "stop"}], "usage": usage})
+            return
+
+        self.config.count(chat_stream=1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")  # No length up front: the end of the body is the close
+        self.end_headers()
+        self.close_connection = True
+        for piece in pieces:
+            self.pace(1)
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+    def generate(self, payload: dict):
+        """HF text generation: [{"generated_text": ...}]"""
+        reply = json.dumps(REPLY)
+        tokens = len(reply_tokens(reply))
+        self.config.count(generate=1, prompt_tokens=len(str(payload.get("inputs", ""))) // CHARS_PER_TOKEN,
+                          completion_tokens=tokens)
+        self.pace(tokens)
+        self.send_json(200, [{"generated_text": reply}])
+
+    def embeddings(self, payload: dict):
+        """HF feature extraction: one vector per input"""
+        inputs = payload.get("inputs", [])
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        self.config.count(embeddings=1, embedded_texts=len(texts))
+        vectors = [embed(str(text), self.config.dim) for text in texts]
+        self.send_json(200, vectors if isinstance(inputs, list) else vectors[0])
+
+
+def make_server(port: int, config: StubConfig) -> ThreadingHTTPServer:
+    handler = type("Handler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Stub options, shared with benchmark.py"""
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds before every reply (default 0.1)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra random delay up to this many seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Generation pace for completions; 0 returns them at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimension (bge-large: 1024)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for jitter and failure injection")
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                      error_rate=args.error_rate, error_status=args.error_status, dim=args.dim, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Groq and HF Inference APIs")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(args.port, config_from_args(args))
+    print(f"✓ Stub Groq/HF server on http://127.0.0.1:{args.port}", file=sys.stderr)
+    print(f"   GROQ_BASE=http://127.0.0.1:{args.port}/openai/v1", file=sys.stderr)
+    print(f"   HF_BASE=http://127.0.0.1:{args.port}/models", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
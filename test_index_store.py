@@ -0,0 +1,67 @@
+# test_index_store.py - Upgrade checks for on-disk indexes (python test_index_store.py, or pytest)
+import os
+import json
+import tempfile
+
+import numpy as np
+
+from index_store import IndexStore, MANIFEST_NAME
+
+DIM = 8
+
+
+def doc(seed: int, rows: int = 4):
+    vectors = np.random.default_rng(seed).random((rows, DIM), dtype=np.float32)
+    return vectors, [f"doc{seed} chunk{i}" for i in range(rows)]
+
+
+def make_legacy(root: str, docs: dict):
+    """An index as written before index selection: flat, no vectors.f32, no "index" in the manifest"""
+    IndexStore(root).rebuild(docs)
+    with open(os.path.join(root, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    manifest.pop("index")
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    os.remove(os.path.join(root, manifest["dir"], "vectors.f32"))
+
+
+def test_compacts_legacy_index():
+    with tempfile.TemporaryDirectory() as root:
+        docs = {f"d{i}": doc(i) for i in range(5)}
+        make_legacy(root, docs)
+
+        # Deleting 2 of 5 documents crosses the compaction ratio
+        store = IndexStore(root)
+        store.delete(["d0", "d2"])
+        assert not [name for name in os.listdir(root) if name.endswith(".tmp")]
+        assert store.documents() == {"d1": 4, "d3": 4, "d4": 4}
+
+        # Every kept chunk still finds itself, so its raw vector stayed with its ID
+        for doc_id in ("d1", "d3", "d4"):
+            vectors, texts = docs[doc_id]
+            assert [hits[0] for hits in store.search_batch(vectors, k=1)] == texts
+        raw = np.fromfile(os.path.join(store.current().path, "vectors.f32"), dtype=np.float32).reshape(-1, DIM)
+        assert np.allclose(raw, np.vstack([docs[d][0] for d in ("d1", "d3", "d4")]))
+
+        # And the upgraded index keeps taking writes
+        store.upsert({"d5": doc(5)})
+        store.delete(["d1"])
+        assert store.documents() == {"d3": 4, "d4": 4, "d5": 4}
+
+
+def test_appends_to_legacy_index():
+    with tempfile.TemporaryDirectory() as root:
+        make_legacy(root, {"d0": doc(0)})
+        store = IndexStore(root)
+        store.upsert({"d1": doc(1)})
+        vectors, texts = doc(0)
+        assert [hits[0] for hits in store.search_batch(vectors, k=1)] == texts
+        assert store.documents() == {"d0": 4, "d1": 4}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✓ {name}")
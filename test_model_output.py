@@ -0,0 +1,38 @@
+# test_model_output.py - Parsing of truncated model replies (python test_model_output.py, or pytest)
+from model_output import analysis_fields, extract_json
+
+import meeting_minder_groq
+
+# Cut off by max_tokens inside the decisions list, with action items as plain strings
+TRUNCATED_STRING_ITEMS = '{"summary": "S", "action_items": ["Email the client", "Fix bug"], "decisions": ["ship'
+
+
+def test_analysis_fields_drop_wrong_shapes():
+    found = extract_json(TRUNCATED_STRING_ITEMS)
+    assert found["action_items"] == ["Email the client", "Fix bug"]  # Repaired, but not usable as-is
+    assert analysis_fields(found) == {"summary": "S", "decisions": ["ship"]}
+    assert analysis_fields({"summary": 3, "decisions": [{"x": 1}], "open_questions": "Why?"}) == {}
+    assert analysis_fields(["not", "an", "object"]) == {}
+
+
+def test_truncated_string_items_fall_back():
+    result = meeting_minder_groq.parse_model_output(TRUNCATED_STRING_ITEMS)
+    assert result["summary"] == "S"
+    assert result["decisions"] == ["ship"]
+    assert all(isinstance(item, dict) for item in result["action_items"])
+    assert "Review meeting transcript" in meeting_minder_groq.generate_email_summary(result)
+
+
+def test_complete_reply_kept():
+    reply = ('{"summary": "S", "action_items": [{"task": "Fix bug", "assignee": "Ann", "due": "Fri"}], '
+             '"decisions": [], "open_questions": ["When?"]}')
+    result = meeting_minder_groq.parse_model_output(reply)
+    assert result == extract_json(reply)
+    assert "Fix bug (Assignee: Ann, Due: Fri)" in meeting_minder_groq.generate_email_summary(result)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✓ {name}")
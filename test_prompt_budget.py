@@ -0,0 +1,58 @@
+# test_prompt_budget.py - Transcript compression and prompt fitting (python test_prompt_budget.py, or pytest)
+from prompt_budget import TRUNCATION_MARK, TokenCounter, compress_transcript, fit_prompt
+
+counter = TokenCounter()  # No tokenizer name: ~4 characters per token, no download
+
+
+def render(transcript, chunks):
+    return "Analyze this meeting:\n" + transcript + "".join(f"\n[Context {i}]: {c}" for i, c in enumerate(chunks, 1))
+
+
+def test_fillers_removed_with_their_punctuation():
+    assert compress_transcript("we should, um, go") == "we should go"
+    assert compress_transcript("Sarah: Um, I-I think the the plan is fine, uh.") == "Sarah: I think the plan is fine."
+    assert compress_transcript("John: Hmm... we ship, uh, you know, on Friday") == "John: we ship on Friday"
+    assert compress_transcript("we should um go\nLisa: Ah, right.") == "we should go\nLisa: right."
+
+
+def test_meaningful_words_kept():
+    for line in ("Call 555 555 1234", "Call 555-555-1234", "Version 2 2", "No, no, we should not ship",
+                 "The ER visit", "A: Mm-hmm.", "Check in in person", "Plan A, a week later"):
+        assert compress_transcript(line) == line
+
+
+def test_compression_counted_as_saved():
+    transcript = "Ann: Um, so, uh, the the budget is, uh, done.\n" * 20
+    fitted, _, tokens = fit_prompt(render, transcript, [], 2000, counter)
+    assert fitted.splitlines()[0] == "Ann: so the budget is done."
+    assert tokens["saved"] > 0 and not tokens["truncated"]
+
+
+def test_single_line_transcript_cut_at_word():
+    transcript = " ".join(f"point{i % 50} was discussed" for i in range(600))  # ~3000 tokens, no line breaks
+    fitted, _, tokens = fit_prompt(render, transcript, [], 500, counter)
+    assert tokens["truncated"] and tokens["prompt"] <= 500
+    kept = fitted[:-len(TRUNCATION_MARK)].rstrip("\n")
+    assert len(kept) > 1500 and transcript.startswith(kept)
+    assert transcript[len(kept)] == " "  # Cut between words
+
+
+def test_whole_lines_kept_before_cut():
+    transcript = "Ann: Short opening.\nBob: " + "very long turn " * 400 + "\nAnn: Closing."
+    fitted, _, tokens = fit_prompt(render, transcript, [], 300, counter)
+    lines = fitted.splitlines()
+    assert lines[0] == "Ann: Short opening." and lines[1].startswith("Bob: very long turn")
+    assert lines[-1] == TRUNCATION_MARK and tokens["prompt"] <= 300
+
+
+def test_fits_without_cutting():
+    fitted, chunks, tokens = fit_prompt(render, "Ann: Hello.\nBob: Hi.", ["Budget is due Friday."], 500, counter)
+    assert fitted == "Ann: Hello.\nBob: Hi." and chunks == ["Budget is due Friday."]
+    assert not tokens["truncated"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✓ {name}")
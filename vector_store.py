@@ -0,0 +1,174 @@
+# vector_store.py - Contiguous in-memory vector store with BLAS-backed cosine search
+import os
+import json
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+INITIAL_CAPACITY = 256
+GROWTH_FACTOR = 2  # Amortized O(1) appends: capacity doubles when full
+STORE_FILE = "vectors.npz"
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so cosine similarity becomes a plain dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in each row, best first (argpartition, not a full sort)"""
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class VectorStore:
+    """Pre-normalized float32 matrix of chunk embeddings, with chunk texts and owning doc IDs"""
+
+    def __init__(self):
+        self._matrix = None  # (capacity, dim); rows [0, size) are live
+        self._size = 0
+        self._texts: List[str] = []
+        self._doc_ids: List[str] = []
+        self._lock = threading.RLock()
+        self.version = 0  # Bumped on every change
+        self.settings: Dict[str, object] = {}  # How the rows were embedded, saved with them
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[1]
+
+    def clear(self):
+        with self._lock:
+            self._matrix, self._size, self._texts, self._doc_ids = None, 0, [], []
+            self.version += 1
+
+    def rebuild(self, vectors: np.ndarray, texts: List[str], doc_ids: List[str]):
+        """Atomically replace the whole store"""
+        with self._lock:
+            self.clear()
+            self.add(vectors, texts, doc_ids)
+
+    def add(self, vectors: np.ndarray, texts: List[str], doc_ids: List[str], replace=()):
+        """
+        Append normalized rows, growing the matrix geometrically when full
+        Rows of documents listed in `replace` are dropped in the same step.
+        """
+        with self._lock:
+            if replace:
+                self.remove_docs(replace)
+            if not texts:
+                return
+            rows = normalize_rows(vectors)
+            if self._matrix is None:
+                self._matrix = np.empty((max(INITIAL_CAPACITY, len(rows)), rows.shape[1]), dtype=np.float32)
+            elif rows.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {rows.shape[1]} does not match store ({self.dim})")
+            needed = self._size + len(rows)
+            if needed > len(self._matrix):
+                capacity = len(self._matrix)
+                while capacity < needed:
+                    capacity *= GROWTH_FACTOR
+                grown = np.empty((capacity, self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size:needed] = rows
+            self._texts.extend(texts)
+            self._doc_ids.extend(doc_ids)
+            self._size = needed
+            self.version += 1
+
+    def remove_docs(self, doc_ids) -> List[str]:
+        """Drop every row owned by the given documents, returning the IDs that existed"""
+        doc_ids = set(doc_ids)
+        with self._lock:
+            keep = np.fromiter((d not in doc_ids for d in self._doc_ids), dtype=bool, count=self._size)
+            if keep.all():
+                return []
+            removed = sorted({d for d in self._doc_ids if d in doc_ids})
+            live = int(keep.sum())
+            self._matrix[:live] = self._matrix[:self._size][keep]
+            self._texts = [t for t, k in zip(self._texts, keep) if k]
+            self._doc_ids = [d for d, k in zip(self._doc_ids, keep) if k]
+            self._size = live
+            self.version += 1
+            return removed
+
+    def documents(self) -> Dict[str, int]:
+        """Return {doc_id: chunk count} for every stored document"""
+        counts: Dict[str, int] = {}
+        for doc_id in self._doc_ids:
+            counts[doc_id] = counts.get(doc_id, 0) + 1
+        return counts
+
+    def chunks(self) -> Tuple[List[str], List[str]]:
+        """Texts and doc IDs of the live rows, in row order"""
+        with self._lock:
+            return list(self._texts), list(self._doc_ids)
+
+    def document_frequencies(self) -> np.ndarray:
+        """Live rows with a non-zero value in each dimension (term document frequency for sparse features)"""
+        with self._lock:
+            if self._matrix is None:
+                return np.zeros(0, dtype=np.int64)
+            return np.count_nonzero(self._matrix[:self._size], axis=0)
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: the matrix (full capacity) plus chunk texts and list overhead"""
+        matrix = 0 if self._matrix is None else self._matrix.nbytes
+        return matrix + sum(len(t) for t in self._texts) + 120 * self._size
+
+    def save(self, path: str, filename: str = STORE_FILE):
+        """Write the live rows to path/vectors.npz (atomic replace)"""
+        with self._lock:
+            meta = json.dumps({"version": self.version, "settings": self.settings,
+                               "texts": self._texts, "doc_ids": self._doc_ids})
+            matrix = self._matrix[:self._size] if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+            os.makedirs(path, exist_ok=True)
+            tmp = os.path.join(path, filename + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(f, matrix=matrix, meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+            os.replace(tmp, os.path.join(path, filename))
+
+    @classmethod
+    def load(cls, path: str, filename: str = STORE_FILE) -> "VectorStore":
+        """Store saved at path, or an empty one if nothing was saved there"""
+        store = cls()
+        try:
+            with np.load(os.path.join(path, filename), allow_pickle=False) as data:
+                matrix, meta = data["matrix"], json.loads(data["meta"].tobytes().decode("utf-8"))
+        except FileNotFoundError:
+            return store
+        if len(matrix):
+            # Rows were normalized before saving; normalizing again is a no-op
+            store.add(matrix, meta["texts"], meta["doc_ids"])
+        store.version = meta["version"]
+        store.settings = meta.get("settings", {})
+        return store
+
+    def search_batch(self, queries: np.ndarray, k: int = 3) -> List[List[Tuple[float, str]]]:
+        """Top-k (score, text) per query, from one matrix-matrix product"""
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(len(queries))]
+            scores = normalize_rows(queries) @ self._matrix[:self._size].T
+            best = top_k(scores, k)
+            return [[(float(scores[q, i]), self._texts[i]) for i in row] for q, row in enumerate(best)]
+
+    def search(self, query: np.ndarray, k: int = 3) -> List[str]:
+        """Texts of the top-k chunks by cosine similarity to one query vector"""
+        return [text for _, text in self.search_batch(np.asarray(query)[None, :], k)[0]]